@@ -270,7 +270,8 @@ struct Provider: AppIntentTimelineProvider {
             }
             
             let baseCount = max(profileToUse?.builderCount ?? 5, 0)
-            let activeUpgrades = profileToUse?.activeUpgrades ?? []
+            let townHall = profileToUse?.cachedProfile?.townHallLevel ?? 0
+            let activeUpgrades = WidgetDataBundle(townHallLevel: townHall).withKnownDurations(profileToUse?.activeUpgrades ?? [])
             let activeBoosts = profileToUse?.activeBoosts ?? []
             let goblinActive = activeUpgrades.contains { $0.category == .builderVillage && $0.usesGoblin }
             let count = baseCount + (goblinActive ? 1 : 0)
@@ -281,9 +282,10 @@ struct Provider: AppIntentTimelineProvider {
         let appGroup = "group.Zachary-Buschmann.clash-widgets"
         let sharedDefaults = UserDefaults(suiteName: appGroup)
         guard let data = sharedDefaults?.data(forKey: "saved_upgrades"),
-                    let decoded = try? JSONDecoder().decode([BuildingUpgrade].self, from: data) else {
+                    let saved = try? JSONDecoder().decode([BuildingUpgrade].self, from: data) else {
                 return ([], 5, 0, [])
         }
+        let decoded = WidgetDataBundle(townHallLevel: 0).withKnownDurations(saved)
         let goblinActive = decoded.contains { $0.category == .builderVillage && $0.usesGoblin }
         let count = 5 + (goblinActive ? 1 : 0)
         return (prioritized(upgrades: decoded, builderCount: count), count, 0, [])
@@ -556,10 +558,8 @@ struct ClashDashWidgetEntryView : View {
         // Try direct sanitized name
         variations.append(sanitizedName)
 
-        for variant in variations {
-            if UIImage(named: variant) != nil {
-                return variant
-            }
+        if let resolved = resolvedIconName(variations) {
+            return resolved
         }
         
         return "\(folder)/\(sanitizedName)" // Default fallback
@@ -770,9 +770,7 @@ struct ClosestUpgradeWidgetEntryView: View {
         variations.append("\(folder)/\(sanitizedName)")
         variations.append(sanitizedName)
 
-        for variant in variations {
-            if UIImage(named: variant) != nil { return variant }
-        }
+        if let resolved = resolvedIconName(variations) { return resolved }
         return "\(folder)/\(sanitizedName)"
     }
 
@@ -1145,6 +1143,24 @@ struct ImportClipboardControl: ControlWidget {
 
 /// Calculate effective remaining time accounting for active boosts (potions, clock tower, helpers)
 /// This ensures widget timers match the boosted times shown in the app
+/// The first icon that exists, preferring the pre-trimmed, widget-sized copy
+/// that tools/asset_pipeline.py --thumbnails writes under thumbnails/ so the
+/// widget does not decode the full-size artwork.
+private func resolvedIconName(_ variations: [String]) -> String? {
+    for variant in variations {
+        let thumbnail = "thumbnails/\(variant)"
+        if UIImage(named: thumbnail) != nil {
+            return thumbnail
+        }
+    }
+    for variant in variations {
+        if UIImage(named: variant) != nil {
+            return variant
+        }
+    }
+    return nil
+}
+
 private func effectiveRemainingSeconds(for upgrade: BuildingUpgrade, activeBoosts: [ActiveBoost], referenceDate: Date) -> TimeInterval {
     let baseRemaining = max(0, upgrade.endTime.timeIntervalSince(referenceDate))
     
@@ -1340,7 +1356,8 @@ struct LabPetProvider: AppIntentTimelineProvider {
                 profileToUse = state.currentProfile
             }
             
-            let upgrades = profileToUse?.activeUpgrades ?? []
+            let townHall = profileToUse?.cachedProfile?.townHallLevel ?? 0
+            let upgrades = WidgetDataBundle(townHallLevel: townHall).withKnownDurations(profileToUse?.activeUpgrades ?? [])
             let activeBoosts = profileToUse?.activeBoosts ?? []
             return (filtered(upgrades: upgrades), activeBoosts)
         }
@@ -1350,7 +1367,7 @@ struct LabPetProvider: AppIntentTimelineProvider {
               let decoded = try? JSONDecoder().decode([BuildingUpgrade].self, from: data) else {
             return ([], [])
         }
-        return (filtered(upgrades: decoded), [])
+        return (filtered(upgrades: WidgetDataBundle(townHallLevel: 0).withKnownDurations(decoded)), [])
     }
 
     private func loadUpgrades(for configuration: WidgetProfileIntent) -> [BuildingUpgrade] {
@@ -2247,10 +2264,8 @@ struct LabPetWidgetEntryView: View {
         // Try direct sanitized name
         variations.append(sanitizedName)
 
-        for variant in variations {
-            if UIImage(named: variant) != nil {
-                return variant
-            }
+        if let resolved = resolvedIconName(variations) {
+            return resolved
         }
         
         return "\(folder)/\(sanitizedName)" // Default fallback
@@ -2546,10 +2561,8 @@ struct BuilderBaseWidgetEntryView: View {
         // Try direct sanitized name
         variations.append(sanitizedName)
 
-        for variant in variations {
-            if UIImage(named: variant) != nil {
-                return variant
-            }
+        if let resolved = resolvedIconName(variations) {
+            return resolved
         }
         
         return "\(folder)/\(sanitizedName)" // Default fallback
@@ -0,0 +1,176 @@
+//
+//  WidgetDataBundle.swift
+//  ClashDashWidget
+//
+//  Upgrade times for the widget, read from the per-Town-Hall bundles that
+//  data_extraction/town_hall_bundles.py writes to widget_bundles/.
+//
+
+import Foundation
+
+/// Upgrade times for one Town Hall level. The widget opens widget_bundles/index.json
+/// and the one thN.json it points to instead of decoding every level of every
+/// dataset in parsed_json_files. A level below the bundle's first row (a rushed
+/// account) or a Town Hall without a bundle falls back to the full files.
+/// Nothing is read until an upgrade actually needs a lookup.
+final class WidgetDataBundle {
+    static let folderName = "widget_bundles"
+    private static let buildingDatasets = ["buildings", "traps"]
+    private static let unitDatasets = ["characters", "spells", "pets", "heroes"]
+
+    private struct Index: Decodable {
+        struct Entry: Decodable {
+            let file: String
+        }
+        let townHallLevels: [Int]
+        let bundles: [String: Entry]
+    }
+
+    private struct Entity: Decodable {
+        let id: Int
+        let levels: [Level]
+    }
+
+    private struct Level: Decodable {
+        let level: Int
+        let buildTimeSeconds: Int?
+        let upgradeTimeSeconds: Int?
+    }
+
+    private struct Shard: Decodable {
+        let buildings: [Entity]?
+        let traps: [Entity]?
+        let characters: [Entity]?
+        let spells: [Entity]?
+        let pets: [Entity]?
+        let heroes: [Entity]?
+    }
+
+    /// Seconds to go from a level to the next, keyed by id and current level,
+    /// plus the lowest current level each entity covers.
+    private struct Durations {
+        var seconds: [Int: [Int: Int]] = [:]
+        var firstLevel: [Int: Int] = [:]
+
+        mutating func add(_ entities: [Entity]?, isUnit: Bool) {
+            for entity in entities ?? [] {
+                var byLevel: [Int: Int] = [:]
+                for row in entity.levels {
+                    // unit rows hold the time to leave their level, building rows the time to reach it
+                    guard let time = isUnit ? row.upgradeTimeSeconds : row.buildTimeSeconds, time > 0 else { continue }
+                    byLevel[isUnit ? row.level : row.level - 1] = time
+                }
+                seconds[entity.id] = byLevel
+                if let lowest = entity.levels.map({ $0.level }).min() {
+                    firstLevel[entity.id] = isUnit ? lowest : lowest - 1
+                }
+            }
+        }
+    }
+
+    let townHallLevel: Int
+    private lazy var shard: Durations? = Self.loadShard(townHallLevel: townHallLevel)
+    private lazy var fullFiles: Durations = Self.loadFullFiles()
+
+    /// `townHallLevel` is the account's current Town Hall; its bundle also
+    /// covers the next one. Pass 0 when it is unknown.
+    init(townHallLevel: Int) {
+        self.townHallLevel = townHallLevel
+    }
+
+    /// Seconds to upgrade `dataId` from `currentLevel` to the next level.
+    func upgradeSeconds(dataId: Int, currentLevel: Int) -> Int? {
+        if let shard = shard {
+            guard let first = shard.firstLevel[dataId] else { return nil }
+            if currentLevel >= first {
+                return shard.seconds[dataId]?[currentLevel]
+            }
+        }
+        return fullFiles.seconds[dataId]?[currentLevel]
+    }
+
+    /// Upgrades saved without a known total duration (it then equals the time
+    /// that was left when they were saved) get the canonical upgrade time, so
+    /// their progress bar does not start from zero.
+    func withKnownDurations(_ upgrades: [BuildingUpgrade]) -> [BuildingUpgrade] {
+        upgrades.map { upgrade in
+            guard upgrade.superchargeTargetLevel == nil,
+                  upgrade.category != .builderBase,
+                  upgrade.category != .starLab,
+                  let dataId = upgrade.dataId,
+                  upgrade.totalDuration <= upgrade.endTime.timeIntervalSince(upgrade.startTime) + 1,
+                  let seconds = upgradeSeconds(dataId: dataId, currentLevel: upgrade.targetLevel - 1),
+                  TimeInterval(seconds) > upgrade.totalDuration else {
+                return upgrade
+            }
+            return BuildingUpgrade(
+                id: upgrade.id,
+                dataId: dataId,
+                name: upgrade.name,
+                targetLevel: upgrade.targetLevel,
+                superchargeLevel: upgrade.superchargeLevel,
+                superchargeTargetLevel: upgrade.superchargeTargetLevel,
+                usesGoblin: upgrade.usesGoblin,
+                endTime: upgrade.endTime,
+                category: upgrade.category,
+                startTime: upgrade.startTime,
+                totalDuration: TimeInterval(seconds),
+                isSeasonalDefense: upgrade.isSeasonalDefense
+            )
+        }
+    }
+
+    private static func loadShard(townHallLevel: Int) -> Durations? {
+        let decoder = JSONDecoder()
+        guard townHallLevel > 0,
+              let folder = Bundle.main.url(forResource: folderName, withExtension: nil),
+              let indexData = try? Data(contentsOf: folder.appendingPathComponent("index.json")),
+              let index = try? decoder.decode(Index.self, from: indexData),
+              let entry = index.bundles[String(townHallLevel)],
+              let data = try? Data(contentsOf: folder.appendingPathComponent(entry.file)),
+              let shard = try? decoder.decode(Shard.self, from: data) else {
+            return nil
+        }
+        var durations = Durations()
+        durations.add(shard.buildings, isUnit: false)
+        durations.add(shard.traps, isUnit: false)
+        durations.add(shard.characters, isUnit: true)
+        durations.add(shard.spells, isUnit: true)
+        durations.add(shard.pets, isUnit: true)
+        durations.add(shard.heroes, isUnit: true)
+        return durations
+    }
+
+    private static func loadFullFiles() -> Durations {
+        var durations = Durations()
+        let decoder = JSONDecoder()
+        let datasets = buildingDatasets.map { ($0, false) } + unitDatasets.map { ($0, true) }
+        for (name, isUnit) in datasets {
+            for folder in parsedFolderURLs() {
+                guard let data = try? Data(contentsOf: folder.appendingPathComponent("\(name).json")),
+                      let entities = try? decoder.decode([Entity].self, from: data) else { continue }
+                durations.add(entities, isUnit: isUnit)
+                break
+            }
+        }
+        return durations
+    }
+
+    /// parsed_json_files in the widget, in the containing app (the widget lives
+    /// in Clashboard.app/PlugIns) and in the app group container.
+    private static func parsedFolderURLs() -> [URL] {
+        let bundle = Bundle.main
+        var urls: [URL] = []
+        if let url = bundle.url(forResource: "parsed_json_files", withExtension: nil) {
+            urls.append(url)
+        }
+        let appURL = bundle.bundleURL.deletingLastPathComponent().deletingLastPathComponent()
+        urls.append(appURL.appendingPathComponent("upgrade_info/parsed_json_files"))
+        let appGroup = "group.Zachary-Buschmann.clash-widgets"
+        if let container = FileManager.default.containerURL(forSecurityApplicationGroupIdentifier: appGroup) {
+            urls.append(container.appendingPathComponent("parsed_json_files"))
+            urls.append(container.appendingPathComponent("upgrade_info/parsed_json_files"))
+        }
+        return urls
+    }
+}
@@ -3889,7 +3889,7 @@ private struct ProfileDetailView: View {
             let currentLevel = dataService[keyPath: mapping.currentLevelKeyPath]
             let isUnlocked = currentLevel > 0
             
-            let availableLevels = helperData.levels.filter { Int($0.RequiredTownHallLevel) ?? 0 <= townHallLevel }
+            let availableLevels = helperData.levels.filter { ($0.RequiredTownHallLevel ?? 0) <= townHallLevel }
             guard !availableLevels.isEmpty else { continue }
             
             let maxLevel = availableLevels.last?.level ?? 0
@@ -3901,8 +3901,8 @@ private struct ProfileDetailView: View {
                 .map { level -> HelperLevelInfo in
                     HelperLevelInfo(
                         level: level.level,
-                        cost: Int(level.Cost) ?? 0,
-                        requiredTH: Int(level.RequiredTownHallLevel) ?? 9
+                        cost: level.Cost ?? 0,
+                        requiredTH: level.RequiredTownHallLevel ?? 9
                     )
                 }
             
@@ -4038,8 +4038,8 @@ private struct ProfileDetailView: View {
             // Find the max level available with this Hero Tavern level and town hall
             var maxLevel = 1
             for level in hero.levels {
-                if let tavernLevelRequired = Int(level.RequiredHeroTavernLevel),
-                   let thLevelRequired = Int(level.RequiredTownHallLevel),
+                if let tavernLevelRequired = level.RequiredHeroTavernLevel,
+                   let thLevelRequired = level.RequiredTownHallLevel,
                    tavernLevelRequired <= heroTavernLevel && thLevelRequired <= townHallLevel {
                     maxLevel = level.level
                 }
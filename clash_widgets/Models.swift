@@ -289,8 +289,8 @@ struct HelperData: Codable {
 
 struct HelperLevel: Codable {
     let level: Int
-    let RequiredTownHallLevel: String
-    let Cost: String
+    let RequiredTownHallLevel: Int?
+    let Cost: Int?
 }
 
 struct HelperLevelInfo {
@@ -329,8 +329,8 @@ struct HeroJSON: Codable {
 
 struct HeroLevelJSON: Codable {
     let level: Int
-    let RequiredHeroTavernLevel: String
-    let RequiredTownHallLevel: String
+    let RequiredHeroTavernLevel: Int?
+    let RequiredTownHallLevel: Int?
 }
 
 struct HeroMapping: Codable {
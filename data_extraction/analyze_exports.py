@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Batch analyzer for in-game player exports (the misc_files/sample.json shape).
+
+Streams exports from JSON files, directories of JSON files or JSONL files
+(one export per line), computes the remaining upgrade time and cost per
+category for each account's current Town Hall, and writes one summary row
+per account. Reference data (upgrade_index.json and townhall_levels.json) is
+loaded once per worker process.
+
+Category rules follow DataService+Progress.swift (buildings, walls, heroes,
+lab, pets), plus traps.
+
+Run:
+  python3 data_extraction/analyze_exports.py misc_files/sample.json misc_files/sample2.json
+  python3 data_extraction/analyze_exports.py exports/ --jobs 8 --output summary.csv
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from multiprocessing import Pool
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from upgrade_index import PARSED_DIR, UpgradeIndex
+
+CATEGORIES = ("buildings", "walls", "traps", "heroes", "lab", "pets")
+RESOURCE_KEYS = ("gold", "elixir", "darkElixir")
+TOWN_HALL_NAME = "Town Hall"
+
+# dataset in the index -> export arrays holding the player's levels
+UNIT_CATEGORIES = {
+    "characters": ("lab", ("units", "siege_machines")),
+    "spells": ("lab", ("spells",)),
+    "heroes": ("heroes", ("heroes",)),
+    "pets": ("pets", ("pets",)),
+}
+
+
+class ReferenceData:
+    def __init__(self, parsed_dir: str = PARSED_DIR) -> None:
+        self.index = UpgradeIndex.for_parsed_dir(parsed_dir)
+        with open(
+            os.path.join(parsed_dir, "townhall_levels.json"), "r", encoding="utf-8"
+        ) as in_file:
+            self.counts_by_town_hall: Dict[int, Dict[str, int]] = {
+                entry["townHallLevel"]: entry["counts"] for entry in json.load(in_file)
+            }
+
+        self.ids_by_dataset: Dict[str, List[int]] = {}
+        self.building_ids: Dict[str, int] = {}
+        self.trap_ids: Dict[str, int] = {}
+        for entity_id, entity in sorted(self.index.entities.items()):
+            dataset = entity["dataset"]
+            self.ids_by_dataset.setdefault(dataset, []).append(entity_id)
+            name = entity["internalName"].lower()
+            if dataset == "buildings":
+                self.building_ids.setdefault(name, entity_id)
+            elif dataset == "traps":
+                self.trap_ids.setdefault(name, entity_id)
+        self.town_hall_id = self.building_ids.get(TOWN_HALL_NAME.lower())
+
+
+def resource_bucket(resource: str) -> Optional[str]:
+    key = resource.lower()
+    if "dark" in key:
+        return "darkElixir"
+    if "elixir" in key:
+        return "elixir"
+    if "gold" in key:
+        return "gold"
+    return None
+
+
+def _empty_totals() -> Dict[str, Dict[str, int]]:
+    return {
+        category: {"seconds": 0, **{key: 0 for key in RESOURCE_KEYS}}
+        for category in CATEGORIES
+    }
+
+
+def _add(totals: Dict[str, int], seconds: int, cost: Dict[str, int], count: int = 1) -> None:
+    totals["seconds"] += seconds * count
+    for resource, amount in cost.items():
+        bucket = resource_bucket(resource)
+        if bucket:
+            totals[bucket] += amount * count
+
+
+def counts_by_level(items: Iterable[Dict[str, Any]]) -> Dict[int, Dict[int, int]]:
+    output: Dict[int, Dict[int, int]] = {}
+    for item in items:
+        level = item.get("lvl")
+        if level is None:
+            continue
+        levels = output.setdefault(item["data"], {})
+        levels[level] = levels.get(level, 0) + max(item.get("cnt") or 1, 1)
+    return output
+
+
+def levels_by_id(items: Iterable[Dict[str, Any]]) -> Dict[int, int]:
+    output: Dict[int, int] = {}
+    for item in items:
+        output[item["data"]] = max(output.get(item["data"], 0), item.get("lvl") or 0)
+    return output
+
+
+def export_town_hall_level(export: Dict[str, Any], reference: ReferenceData) -> int:
+    levels = [
+        item.get("lvl") or 0
+        for item in export.get("buildings") or []
+        if item.get("data") == reference.town_hall_id
+    ]
+    return max(levels, default=0)
+
+
+def analyze_export(export: Dict[str, Any], reference: ReferenceData) -> Dict[str, Any]:
+    index = reference.index
+    town_hall = export_town_hall_level(export, reference)
+    required = reference.counts_by_town_hall.get(town_hall, {})
+    totals = _empty_totals()
+
+    placed = counts_by_level(export.get("buildings") or [])
+    placed.update(counts_by_level(export.get("traps") or []))
+    for name, required_count in required.items():
+        lower = name.lower()
+        if lower in reference.building_ids:
+            entity_id = reference.building_ids[lower]
+            category = "walls" if "wall" in lower else "buildings"
+        elif lower in reference.trap_ids:
+            entity_id = reference.trap_ids[lower]
+            category = "traps"
+        else:
+            continue
+        cap = index.max_level(entity_id, town_hall)
+        if cap == 0:
+            continue
+        current = placed.get(entity_id, {})
+        for level, count in current.items():
+            seconds, cost = index.upgrade_between(entity_id, level, cap)
+            _add(totals[category], seconds, cost, count)
+        missing = max(required_count - sum(current.values()), 0)
+        if missing:
+            seconds, cost = index.upgrade_between(entity_id, 0, cap)
+            _add(totals[category], seconds, cost, missing)
+
+    for dataset, (category, export_keys) in UNIT_CATEGORIES.items():
+        current_levels: Dict[int, int] = {}
+        for key in export_keys:
+            current_levels.update(levels_by_id(export.get(key) or []))
+        for entity_id in reference.ids_by_dataset.get(dataset, []):
+            cap = index.max_level(entity_id, town_hall)
+            if cap <= 1:
+                continue
+            seconds, cost = index.upgrade_between(
+                entity_id, current_levels.get(entity_id, 0), cap
+            )
+            _add(totals[category], seconds, cost)
+
+    row: Dict[str, Any] = {
+        "tag": export.get("tag", ""),
+        "timestamp": export.get("timestamp", ""),
+        "townHallLevel": town_hall,
+    }
+    for category in CATEGORIES:
+        for key, value in totals[category].items():
+            row[f"{category}_{key}"] = value
+    row["total_seconds"] = sum(totals[c]["seconds"] for c in CATEGORIES)
+    for key in RESOURCE_KEYS:
+        row[f"total_{key}"] = sum(totals[c][key] for c in CATEGORIES)
+    return row
+
+
+def summary_columns() -> List[str]:
+    columns = ["source", "tag", "timestamp", "townHallLevel"]
+    for category in (*CATEGORIES, "total"):
+        columns.append(f"{category}_seconds")
+        columns.extend(f"{category}_{key}" for key in RESOURCE_KEYS)
+    columns.append("error")
+    return columns
+
+
+def iter_export_sources(paths: Sequence[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (source label, raw JSON text) without loading whole inputs."""
+    for path in paths:
+        if os.path.isdir(path):
+            for filename in sorted(os.listdir(path)):
+                if filename.endswith((".json", ".jsonl")):
+                    yield from iter_export_sources([os.path.join(path, filename)])
+            continue
+        if path.endswith(".jsonl"):
+            with open(path, "r", encoding="utf-8") as in_file:
+                for line_number, line in enumerate(in_file, start=1):
+                    if line.strip():
+                        yield f"{path}:{line_number}", line
+            continue
+        with open(path, "r", encoding="utf-8") as in_file:
+            yield path, in_file.read()
+
+
+_WORKER_REFERENCE: Optional[ReferenceData] = None
+
+
+def _init_worker(parsed_dir: str) -> None:
+    global _WORKER_REFERENCE
+    _WORKER_REFERENCE = ReferenceData(parsed_dir)
+
+
+def _analyze_source(source: Tuple[str, str]) -> Dict[str, Any]:
+    label, raw = source
+    assert _WORKER_REFERENCE is not None
+    try:
+        row = analyze_export(json.loads(raw), _WORKER_REFERENCE)
+    except (ValueError, KeyError, TypeError, AttributeError) as exc:
+        row = {"error": f"{type(exc).__name__}: {exc}"}
+    row["source"] = label
+    return row
+
+
+def analyze_exports(
+    paths: Sequence[str], parsed_dir: str = PARSED_DIR, jobs: int = 1
+) -> Iterator[Dict[str, Any]]:
+    sources = iter_export_sources(paths)
+    if jobs <= 1:
+        _init_worker(parsed_dir)
+        yield from map(_analyze_source, sources)
+        return
+    with Pool(jobs, initializer=_init_worker, initargs=(parsed_dir,)) as pool:
+        yield from pool.imap(_analyze_source, sources, chunksize=16)
+
+
+def write_summary(rows: Iterable[Dict[str, Any]], out_file: TextIO, output_format: str) -> int:
+    count = 0
+    if output_format == "jsonl":
+        for row in rows:
+            out_file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            count += 1
+        return count
+    writer = csv.DictWriter(out_file, fieldnames=summary_columns(), extrasaction="ignore")
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Summarize remaining upgrades for many player exports."
+    )
+    parser.add_argument("paths", nargs="+", help="export files, directories or .jsonl files")
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--output", help="write the summary here instead of stdout")
+    args = parser.parse_args(argv)
+
+    rows = analyze_exports(args.paths, args.parsed_dir, args.jobs)
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as out_file:
+            count = write_summary(rows, out_file, args.format)
+        print(f"Wrote {count} rows to {args.output}")
+    else:
+        write_summary(rows, sys.stdout, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,48 @@
 #!/usr/bin/env python3
+import argparse
 import csv
+import hashlib
 import json
 import os
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+from compact_tables import COMPACT_DIR, COMPACT_EXTENSION, write_compact_tables
+from id_store import DEFAULT_ID_STORE, IdStore
+from localization import DEFAULT_LOCALE, STRINGS_DIR, build_string_tables, string_table_files
+from logic_csv import open_logic_csv
+from pipeline_metrics import (
+    DatasetMetrics,
+    RunMetrics,
+    count_levels,
+    peak_rss_bytes,
+    print_report,
+    timed,
+    timed_rows,
+)
+from town_hall_bundles import BUNDLES_DIR, BUNDLES_INDEX_NAME, build_bundles, bundle_files
+from upgrade_index import (
+    UpgradeIndex,
+    build_upgrade_index,
+    derived_path,
+    encode_upgrade_index,
+    load_parsed_datasets,
+    upgrade_index_path,
+)
 
 
 WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -18,6 +58,19 @@ MAPS_DIR = os.path.join(
 DEFAULT_INPUT_CSV = os.path.join(EXTRACTED_DIR, "buildings.csv")
 DEFAULT_OUTPUT_JSON = os.path.join(PARSED_DIR, "buildings.json")
 DEFAULT_MAP_JSON = os.path.join(MAPS_DIR, "buildings_json_map.json")
+DEFAULT_MANIFEST_JSON = os.path.join(DATA_EXTRACTION_DIR, "build_manifest.json")
+JSON_FILES_DIR = os.path.join(WORKSPACE_ROOT, "json_files")
+EQUIPMENT_DATA_JSON = os.path.join(JSON_FILES_DIR, "equipment_data.json")
+ORE_COSTS_CSV = os.path.join(JSON_FILES_DIR, "ore_costs.csv")
+MAPPING_JSON = os.path.join(WORKSPACE_ROOT, "clash_widgets", "upgrade_info", "mapping.json")
+EQUIPMENT_OUTPUT_NAME = "equipment.json"
+EQUIPMENT_ID_PREFIX = 90
+# EquipmentRarity.maxLevel in Models.swift
+EQUIPMENT_MAX_LEVELS = {"common": 18, "epic": 27}
+
+# Bump when a builder changes its output for unchanged inputs, so incremental
+# runs do not keep serving stale files.
+PIPELINE_VERSION = 2
 
 
 def safe_int(value: str) -> int:
@@ -27,67 +80,187 @@ def safe_int(value: str) -> int:
         return 0
 
 
-def parse_build_time_seconds(row: Dict[str, str]) -> int:
-    days = safe_int(row.get("BuildTimeD", ""))
-    hours = safe_int(row.get("BuildTimeH", ""))
-    minutes = safe_int(row.get("BuildTimeM", ""))
-    seconds = safe_int(row.get("BuildTimeS", ""))
+def parse_build_time_seconds(row: "Row") -> int:
+    days = row.get("BuildTimeD") or 0
+    hours = row.get("BuildTimeH") or 0
+    minutes = row.get("BuildTimeM") or 0
+    seconds = row.get("BuildTimeS") or 0
     return days * 86400 + hours * 3600 + minutes * 60 + seconds
 
 
 def parse_upgrade_time_seconds(
-    hours_value: str, minutes_value: Optional[str] = None
+    hours_value: Optional[int], minutes_value: Optional[int] = None
 ) -> int:
-    hours = safe_int(hours_value)
-    minutes = safe_int(minutes_value) if minutes_value is not None else 0
-    return hours * 3600 + minutes * 60
+    return (hours_value or 0) * 3600 + (minutes_value or 0) * 60
+
+
+def _convert_int(value: str) -> Optional[int]:
+    return int(value) if value else None
+
+
+def _convert_bool(value: str) -> Optional[bool]:
+    return value.lower() == "true" if value else None
+
+
+def _convert_str(value: str) -> str:
+    return value
+
+
+# Column types declared in the second row of every logic CSV. Blank cells of
+# int and boolean columns decode to None so continuation rows stay visible.
+COLUMN_CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    "int": _convert_int,
+    "boolean": _convert_bool,
+    "string": _convert_str,
+}
+
+
+def compile_row_converter(
+    headers: Sequence[str], types: Sequence[str], selected: Sequence[str]
+) -> Callable[[List[str]], Tuple[Any, ...]]:
+    """Build a function turning one raw CSV row into typed ``selected`` values.
+
+    Converter lookup happens once per table; the returned function only
+    indexes and calls. Columns missing from the header read as "". A cell
+    missing because the row is short reads like a blank one (None for int and
+    boolean columns), however many trailing commas the row kept.
+    """
+    positions = {header: i for i, header in enumerate(headers)}
+    picks: List[Tuple[int, Callable[[str], Any], Any]] = []
+    for name in selected:
+        position = positions.get(name, -1)
+        declared = types[position].strip().lower() if 0 <= position < len(types) else ""
+        conv = COLUMN_CONVERTERS.get(declared, _convert_str)
+        picks.append((position, conv, conv("")))
+
+    def convert(raw: List[str]) -> Tuple[Any, ...]:
+        width = len(raw)
+        try:
+            return tuple(
+                conv(raw[p].strip()) if 0 <= p < width else blank for p, conv, blank in picks
+            )
+        except ValueError:
+            for (p, conv, _), name in zip(picks, selected):
+                if 0 <= p < width:
+                    try:
+                        conv(raw[p].strip())
+                    except ValueError:
+                        raise ValueError(
+                            f"Column {name!r} is declared {types[p]!r}"
+                            f" but holds {raw[p]!r}"
+                        ) from None
+            raise
+
+    return convert
+
 
+class CsvRow:
+    """One projected, typed CSV row; supports the ``row.get(name, default)``
+    lookups the builders already use on plain dict rows."""
 
-def read_csv_rows(csv_path: str) -> List[Dict[str, str]]:
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: Dict[str, int], values: Tuple[Any, ...]) -> None:
+        self._index = index
+        self._values = values
+
+    def get(self, key: str, default: Any = "") -> Any:
+        position = self._index.get(key)
+        if position is None:
+            return default
+        return self._values[position]
+
+    def __getitem__(self, key: str) -> Any:
+        return self._values[self._index[key]]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: self._values[i] for name, i in self._index.items()}
+
+
+Row = Union[Mapping[str, Any], CsvRow]
+
+
+def iter_csv_rows(
+    lines: Iterable[str], columns: Optional[Sequence[str]] = None
+) -> Tuple[List[str], Iterator[CsvRow]]:
+    """Read the header and types rows eagerly and return the data rows lazily.
+
+    Only ``columns`` are kept (all columns when None), stripped and converted
+    according to the types row; columns missing from the header, like cells
+    missing from short rows, read as "".
+    """
+    reader = csv.reader(lines)
+    headers = next(reader, None)
+    if headers is None:
+        return [], iter(())
+    types = next(reader, None) or []
+
+    selected = list(dict.fromkeys(headers if columns is None else columns))
+    index = {name: i for i, name in enumerate(selected)}
+    convert = compile_row_converter(headers, types, selected)
+
+    def generate() -> Iterator[CsvRow]:
+        for raw in reader:
+            if raw:
+                yield CsvRow(index, convert(raw))
+
+    return headers, generate()
+
+
+def stream_csv_rows(
+    csv_path: str, columns: Optional[Sequence[str]] = None
+) -> Iterator[CsvRow]:
+    with open(csv_path, newline="", encoding="utf-8") as csv_file:
+        _, rows = iter_csv_rows(csv_file, columns)
+        yield from rows
+
+
+def read_csv_rows(csv_path: str) -> List[Dict[str, Any]]:
     rows, _ = read_csv_rows_with_headers(csv_path)
     return rows
 
 
-def read_csv_rows_with_headers(csv_path: str) -> tuple[List[Dict[str, str]], List[str]]:
+def read_csv_rows_with_headers(csv_path: str) -> tuple[List[Dict[str, Any]], List[str]]:
     with open(csv_path, newline="", encoding="utf-8") as csv_file:
-        reader = csv.reader(csv_file)
-        try:
-            headers = next(reader)
-        except StopIteration:
-            return [], []
+        headers, rows = iter_csv_rows(csv_file)
+        return [row.as_dict() for row in rows], headers
 
-        # Skip the types row if present.
-        try:
-            next(reader)
-        except StopIteration:
-            return [], headers
 
-        rows: List[Dict[str, str]] = []
-        for raw in reader:
-            if not raw:
-                continue
-            if len(raw) < len(headers):
-                raw = raw + [""] * (len(headers) - len(raw))
-            row = {headers[i]: raw[i].strip() for i in range(len(headers))}
-            rows.append(row)
-        return rows, headers
+BUILDINGS_COLUMNS: Tuple[str, ...] = (
+    "Name",
+    "TID",
+    "BuildingClass",
+    "BuildingLevel",
+    "ExportName",
+    "BuildTimeD",
+    "BuildTimeH",
+    "BuildTimeM",
+    "BuildTimeS",
+    "BuildResource",
+    "BuildCost",
+    "TownHallLevel",
+)
+ARCHETYPES_COLUMNS: Tuple[str, ...] = ("Name", "SpecialAbility", "Modules")
 
 
-def build_buildings_json(rows: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+def build_buildings_json(
+    rows: Iterable[Row], id_prefix: int = 1
+) -> List[Dict[str, Any]]:
     buildings: List[Dict[str, Any]] = []
     current: Optional[Dict[str, Any]] = None
     non_blank_index = -1
+    base_id = id_prefix * 1_000_000
 
     for row in rows:
-        name = row.get("Name", "").strip()
+        name = row.get("Name", "")
         if name:
             non_blank_index += 1
-            building_id = 1_000_000 + non_blank_index
+            building_id = base_id + non_blank_index
             current = {
                 "id": building_id,
                 "internalName": name,
-                "tid": row.get("TID", "").strip(),
-                "buildingClass": row.get("BuildingClass", "").strip(),
+                "tid": row.get("TID", ""),
+                "buildingClass": row.get("BuildingClass", ""),
                 "levels": [],
             }
             buildings.append(current)
@@ -96,12 +269,12 @@ def build_buildings_json(rows: List[Dict[str, str]]) -> List[Dict[str, Any]]:
             continue
 
         level_entry = {
-            "level": safe_int(row.get("BuildingLevel", "")),
-            "exportName": row.get("ExportName", "").strip(),
+            "level": row.get("BuildingLevel") or 0,
+            "exportName": row.get("ExportName", ""),
             "buildTimeSeconds": parse_build_time_seconds(row),
-            "buildResource": row.get("BuildResource", "").strip(),
-            "buildCost": safe_int(row.get("BuildCost", "")),
-            "townHallLevel": safe_int(row.get("TownHallLevel", "")),
+            "buildResource": row.get("BuildResource", ""),
+            "buildCost": row.get("BuildCost") or 0,
+            "townHallLevel": row.get("TownHallLevel") or 0,
         }
         current["levels"].append(level_entry)
 
@@ -109,13 +282,14 @@ def build_buildings_json(rows: List[Dict[str, str]]) -> List[Dict[str, Any]]:
 
 
 def build_grouped_json(
-    rows: List[Dict[str, str]],
+    rows: Iterable[Row],
     id_prefix: Optional[int],
     level_field: Optional[str],
     level_fields: List[str],
     time_field_hours: Optional[str] = None,
     time_field_minutes: Optional[str] = None,
     include_tid: bool = True,
+    with_build_time: bool = False,
 ) -> List[Dict[str, Any]]:
     items: List[Dict[str, Any]] = []
     current: Optional[Dict[str, Any]] = None
@@ -124,7 +298,7 @@ def build_grouped_json(
 
     level_counter = 0
     for row in rows:
-        name = row.get("Name", "").strip()
+        name = row.get("Name", "")
         if name:
             non_blank_index += 1
             level_counter = 0
@@ -133,7 +307,7 @@ def build_grouped_json(
                 "levels": [],
             }
             if include_tid:
-                current["tid"] = row.get("TID", "").strip()
+                current["tid"] = row.get("TID", "")
             if base_id is not None:
                 current["id"] = base_id + non_blank_index
             items.append(current)
@@ -142,46 +316,45 @@ def build_grouped_json(
             continue
 
         if level_field:
-            level_value = safe_int(row.get(level_field, ""))
+            level_value = row.get(level_field) or 0
         else:
             level_counter += 1
             level_value = level_counter
 
         level_entry: Dict[str, Any] = {"level": level_value}
         for field in level_fields:
-            value = row.get(field, "").strip()
-            if value == "":
-                level_entry[field] = ""
-            else:
-                level_entry[field] = value
+            level_entry[field] = row.get(field, "")
 
         if time_field_hours:
             level_entry["upgradeTimeSeconds"] = parse_upgrade_time_seconds(
-                row.get(time_field_hours, ""),
-                row.get(time_field_minutes, "") if time_field_minutes else None,
+                row.get(time_field_hours),
+                row.get(time_field_minutes) if time_field_minutes else None,
             )
+        if with_build_time:
+            # Datasets without a BuildTimeS column fall back to 0 seconds.
+            level_entry["buildTimeSeconds"] = parse_build_time_seconds(row)
 
         current["levels"].append(level_entry)
 
     return items
 
 
-def build_seasonal_archetypes_json(rows: List[Dict[str, str]], id_prefix: int) -> List[Dict[str, Any]]:
+def build_seasonal_archetypes_json(rows: Iterable[Row], id_prefix: int) -> List[Dict[str, Any]]:
     items: List[Dict[str, Any]] = []
     non_blank_index = -1
     base_id = id_prefix * 1_000_000
 
     for row in rows:
-        name = row.get("Name", "").strip()
+        name = row.get("Name", "")
         if not name:
             continue
         non_blank_index += 1
-        modules_raw = row.get("Modules", "").strip()
+        modules_raw = row.get("Modules", "")
         modules = [m.strip() for m in modules_raw.split(";") if m.strip()]
         items.append({
             "id": base_id + non_blank_index,
             "internalName": name,
-            "specialAbility": row.get("SpecialAbility", "").strip(),
+            "specialAbility": row.get("SpecialAbility", ""),
             "modules": modules,
         })
 
@@ -201,10 +374,9 @@ def load_json_map(map_path: str) -> Dict[str, Dict[str, Any]]:
     return {}
 
 
-def update_id_map(
-    map_path: str, items: List[Dict[str, Any]]
+def merge_id_map(
+    map_data: Dict[str, Dict[str, Any]], items: List[Dict[str, Any]]
 ) -> Dict[str, Dict[str, Any]]:
-    map_data = load_json_map(map_path)
     for item in items:
         internal_name = item.get("internalName", "").strip()
         if not internal_name:
@@ -222,22 +394,105 @@ def update_id_map(
                 entry.setdefault("displayName", internal_name)
                 entry.setdefault("internalName", internal_name)
                 if "id" in item:
-                    entry.setdefault("id", item.get("id"))
-    os.makedirs(os.path.dirname(map_path), exist_ok=True)
-    with open(map_path, "w", encoding="utf-8") as map_file:
-        json.dump(map_data, map_file, indent=2, ensure_ascii=False)
-        map_file.write("\n")
+                    # Ids come from the stable id store, so this only
+                    # changes when the store itself was edited.
+                    entry["id"] = item.get("id")
     return map_data
 
 
-def write_buildings_json(output_path: str, buildings: List[Dict[str, Any]]) -> None:
+def update_id_map(
+    map_path: str, items: List[Dict[str, Any]]
+) -> Dict[str, Dict[str, Any]]:
+    map_data = merge_id_map(load_json_map(map_path), items)
+    write_json_if_changed(map_path, map_data)
+    return map_data
+
+
+def encode_json(data: Any) -> bytes:
+    return (json.dumps(data, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def write_json_if_changed(output_path: str, data: Any) -> bool:
+    return write_bytes_if_changed(output_path, encode_json(data))
+
+
+def write_bytes_if_changed(output_path: str, encoded: bytes) -> bool:
+    if os.path.exists(output_path):
+        with open(output_path, "rb") as existing_file:
+            if existing_file.read() == encoded:
+                return False
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, "w", encoding="utf-8") as out_file:
-        json.dump(buildings, out_file, indent=2, ensure_ascii=False)
-        out_file.write("\n")
+    with open(output_path, "wb") as out_file:
+        out_file.write(encoded)
+    return True
+
+
+def write_files_atomically(files: Dict[str, bytes]) -> List[str]:
+    """Write every changed file to a temporary sibling first, then move each
+    into place with os.replace. Each file is replaced atomically, so a reader
+    never sees a half-written file, and nothing is replaced until every file
+    has been written; a failure while replacing can still leave some files
+    new and others old. Temporary files are removed on any error. Returns the
+    paths that changed."""
+    staged: List[Tuple[str, str]] = []
+    replaced = 0
+    try:
+        for path, encoded in files.items():
+            if os.path.exists(path):
+                with open(path, "rb") as existing_file:
+                    if existing_file.read() == encoded:
+                        continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = path + ".tmp"
+            # staged before writing, so a failed write is cleaned up too
+            staged.append((temp_path, path))
+            with open(temp_path, "wb") as out_file:
+                out_file.write(encoded)
+        for temp_path, path in staged:
+            os.replace(temp_path, path)
+            replaced += 1
+    except BaseException:
+        for temp_path, _ in staged[replaced:]:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+        raise
+    return [path for _, path in staged]
+
 
+def write_buildings_json(output_path: str, buildings: List[Dict[str, Any]]) -> bool:
+    return write_json_if_changed(output_path, buildings)
 
-def build_townhall_levels(rows: List[Dict[str, str]], headers: List[str]) -> List[Dict[str, Any]]:
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as in_file:
+        for chunk in iter(lambda: in_file.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dataset_fingerprint(csv_paths: List[str], config: Dict[str, Any]) -> str:
+    digest = hashlib.sha256()
+    digest.update(str(PIPELINE_VERSION).encode("utf-8"))
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    for csv_path in csv_paths:
+        digest.update(os.path.basename(csv_path).encode("utf-8"))
+        digest.update(file_sha256(csv_path).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def load_manifest(manifest_path: str) -> Dict[str, str]:
+    manifest = load_json_map(manifest_path)
+    return {k: v for k, v in manifest.items() if isinstance(v, str)}
+
+
+def save_manifest(manifest_path: str, manifest: Dict[str, str]) -> None:
+    write_json_if_changed(manifest_path, dict(sorted(manifest.items())))
+
+
+def build_townhall_levels(rows: Iterable[Row], headers: List[str]) -> List[Dict[str, Any]]:
     if "Troop Housing" not in headers:
         return []
     start_index = headers.index("Troop Housing")
@@ -247,18 +502,17 @@ def build_townhall_levels(rows: List[Dict[str, str]], headers: List[str]) -> Lis
     previous_counts: Dict[str, int] = {}
 
     for row in rows:
-        name_value = row.get("Name", "").strip()
-        town_hall_level = safe_int(name_value)
+        town_hall_level = safe_int(row.get("Name", ""))
         if town_hall_level <= 0:
             continue
 
         counts: Dict[str, int] = {}
         for col in count_columns:
-            raw = row.get(col, "").strip()
-            if raw == "":
+            value = row.get(col)
+            if value is None or value == "":
                 counts[col] = previous_counts.get(col, 0)
             else:
-                counts[col] = safe_int(raw)
+                counts[col] = value if isinstance(value, int) else safe_int(value)
 
         previous_counts = counts
         levels.append({
@@ -269,18 +523,118 @@ def build_townhall_levels(rows: List[Dict[str, str]], headers: List[str]) -> Lis
     return levels
 
 
-def main() -> None:
-    buildings_rows = read_csv_rows(DEFAULT_INPUT_CSV)
-    buildings = build_buildings_json(buildings_rows)
-    write_buildings_json(DEFAULT_OUTPUT_JSON, buildings)
-    update_id_map(DEFAULT_MAP_JSON, buildings)
+def build_equipment_json(
+    equipment: Iterable[Dict[str, Any]],
+    ore_rows: Iterable[Row],
+    names_by_id: Mapping[int, str],
+) -> List[Dict[str, Any]]:
+    """Hero equipment with per-level ore costs.
+
+    The cost on level L is the ore spent to reach L, as in OreCostTable in
+    ContentView.swift; common equipment never costs starry ore. Ids come from
+    the equipment entries (prefix 90) of mapping.json.
+    """
+    ore_by_level: Dict[int, Tuple[int, int, int]] = {}
+    for row in ore_rows:
+        level = row.get("Level")
+        if isinstance(level, int):
+            ore_by_level[level] = (
+                row.get("ShinyOre") or 0,
+                row.get("GlowyOre") or 0,
+                row.get("StarryOre") or 0,
+            )
+    top_level = max(ore_by_level, default=0)
+    ids = {
+        name: entity_id
+        for entity_id, name in names_by_id.items()
+        if entity_id // 1_000_000 == EQUIPMENT_ID_PREFIX
+    }
+
+    items: List[Dict[str, Any]] = []
+    for entry in equipment:
+        name = entry.get("name", "")
+        rarity = entry.get("rarity", "")
+        levels = []
+        for level in range(1, EQUIPMENT_MAX_LEVELS.get(rarity, top_level) + 1):
+            shiny, glowy, starry = ore_by_level.get(level, (0, 0, 0))
+            levels.append({
+                "level": level,
+                "shinyOre": shiny,
+                "glowyOre": glowy,
+                "starryOre": starry if rarity == "epic" else 0,
+            })
+        item: Dict[str, Any] = {"internalName": name}
+        if name in ids:
+            item = {"id": ids[name], **item}
+        item.update({"hero": entry.get("hero", ""), "rarity": rarity, "levels": levels})
+        items.append(item)
+    items.sort(key=lambda item: (item.get("id", 1 << 62), item["internalName"]))
+    return items
+
+
+def load_equipment_sources(
+    equipment_path: str = EQUIPMENT_DATA_JSON,
+    ore_costs_path: str = ORE_COSTS_CSV,
+    mapping_path: str = MAPPING_JSON,
+) -> List[Dict[str, Any]]:
+    with open(equipment_path, "r", encoding="utf-8") as in_file:
+        equipment = json.load(in_file).get("equipment", [])
+    with open(mapping_path, "r", encoding="utf-8") as in_file:
+        names_by_id = {int(key): value for key, value in json.load(in_file).items()}
+    return build_equipment_json(equipment, stream_csv_rows(ore_costs_path), names_by_id)
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    name: str
+    builder: str = "grouped"
+    id_prefix: Optional[int] = None
+    level_field: Optional[str] = None
+    level_fields: Tuple[str, ...] = ()
+    time_field_hours: Optional[str] = None
+    time_field_minutes: Optional[str] = None
+    include_tid: bool = True
+    with_build_time: bool = False
+    write_map: bool = True
 
-    characters_rows = read_csv_rows(os.path.join(EXTRACTED_DIR, "characters.csv"))
-    characters = build_grouped_json(
-        characters_rows,
+    @property
+    def csv_name(self) -> str:
+        return f"{self.name}.csv"
+
+    @property
+    def output_name(self) -> str:
+        return f"{self.name}.json"
+
+    @property
+    def map_name(self) -> Optional[str]:
+        return f"{self.name}_json_map.json" if self.write_map else None
+
+    @property
+    def columns(self) -> Optional[Tuple[str, ...]]:
+        """CSV columns the builder reads; None means every column."""
+        if self.builder == "buildings":
+            return BUILDINGS_COLUMNS
+        if self.builder == "archetypes":
+            return ARCHETYPES_COLUMNS
+        if self.builder == "townhall":
+            return None
+        columns = ["Name"]
+        if self.include_tid:
+            columns.append("TID")
+        for field in (self.level_field, self.time_field_hours, self.time_field_minutes):
+            if field:
+                columns.append(field)
+        columns.extend(self.level_fields)
+        return tuple(dict.fromkeys(columns))
+
+
+DATASETS: Tuple[DatasetSpec, ...] = (
+    DatasetSpec(name="buildings", builder="buildings", id_prefix=1),
+    DatasetSpec(
+        name="characters",
         id_prefix=4,
         level_field="VisualLevel",
-        level_fields=[
+        level_fields=(
             "TID",
             "BarrackLevel",
             "LaboratoryLevel",
@@ -288,74 +642,56 @@ def main() -> None:
             "UpgradeTimeM",
             "UpgradeResource",
             "UpgradeCost",
-        ],
+        ),
         time_field_hours="UpgradeTimeH",
         time_field_minutes="UpgradeTimeM",
-    )
-    write_buildings_json(os.path.join(PARSED_DIR, "characters.json"), characters)
-    update_id_map(
-        os.path.join(MAPS_DIR, "characters_json_map.json"), characters
-    )
-
-    pets_rows = read_csv_rows(os.path.join(EXTRACTED_DIR, "pets.csv"))
-    pets = build_grouped_json(
-        pets_rows,
+    ),
+    DatasetSpec(
+        name="pets",
         id_prefix=73,
         level_field="TroopLevel",
-        level_fields=[
+        level_fields=(
             "TID",
             "LaboratoryLevel",
             "UpgradeTimeH",
             "UpgradeResource",
             "UpgradeCost",
-        ],
+        ),
         time_field_hours="UpgradeTimeH",
         time_field_minutes="UpgradeTimeM",
-    )
-    write_buildings_json(os.path.join(PARSED_DIR, "pets.json"), pets)
-    update_id_map(os.path.join(MAPS_DIR, "pets_json_map.json"), pets)
-
-    spells_rows = read_csv_rows(os.path.join(EXTRACTED_DIR, "spells.csv"))
-    spells = build_grouped_json(
-        spells_rows,
+    ),
+    DatasetSpec(
+        name="spells",
         id_prefix=26,
         level_field="Level",
-        level_fields=[
+        level_fields=(
             "TID",
             "LaboratoryLevel",
             "UpgradeTimeH",
             "UpgradeResource",
             "UpgradeCost",
-        ],
+        ),
         time_field_hours="UpgradeTimeH",
-    )
-    write_buildings_json(os.path.join(PARSED_DIR, "spells.json"), spells)
-    update_id_map(os.path.join(MAPS_DIR, "spells_json_map.json"), spells)
-
-    heroes_rows = read_csv_rows(os.path.join(EXTRACTED_DIR, "heroes.csv"))
-    heroes = build_grouped_json(
-        heroes_rows,
+    ),
+    DatasetSpec(
+        name="heroes",
         id_prefix=28,
         level_field="VisualLevel",
-        level_fields=[
+        level_fields=(
             "TID",
             "UpgradeTimeH",
             "UpgradeResource",
             "UpgradeCost",
             "RequiredTownHallLevel",
             "RequiredHeroTavernLevel",
-        ],
+        ),
         time_field_hours="UpgradeTimeH",
-    )
-    write_buildings_json(os.path.join(PARSED_DIR, "heroes.json"), heroes)
-    update_id_map(os.path.join(MAPS_DIR, "heroes_json_map.json"), heroes)
-
-    traps_rows = read_csv_rows(os.path.join(EXTRACTED_DIR, "traps.csv"))
-    traps = build_grouped_json(
-        traps_rows,
+    ),
+    DatasetSpec(
+        name="traps",
         id_prefix=12,
         level_field="Level",
-        level_fields=[
+        level_fields=(
             "TID",
             "ExportName",
             "BuildTimeD",
@@ -364,28 +700,13 @@ def main() -> None:
             "BuildResource",
             "BuildCost",
             "TownHallLevel",
-        ],
-        include_tid=True,
-    )
-    for trap in traps:
-        for level in trap.get("levels", []):
-            level["buildTimeSeconds"] = parse_build_time_seconds(
-                {
-                    "BuildTimeD": level.get("BuildTimeD", ""),
-                    "BuildTimeH": level.get("BuildTimeH", ""),
-                    "BuildTimeM": level.get("BuildTimeM", ""),
-                    "BuildTimeS": "0",
-                }
-            )
-    write_buildings_json(os.path.join(PARSED_DIR, "traps.json"), traps)
-    update_id_map(os.path.join(MAPS_DIR, "traps_json_map.json"), traps)
-
-    mini_rows = read_csv_rows(os.path.join(EXTRACTED_DIR, "mini_levels.csv"))
-    mini_levels = build_grouped_json(
-        mini_rows,
-        id_prefix=None,
+        ),
+        with_build_time=True,
+    ),
+    DatasetSpec(
+        name="mini_levels",
         level_field="Level",
-        level_fields=[
+        level_fields=(
             "RequiredTownHallLevel",
             "BuildTimeD",
             "BuildTimeH",
@@ -393,138 +714,359 @@ def main() -> None:
             "BuildTimeS",
             "BuildResource",
             "BuildCost",
-        ],
+        ),
         include_tid=False,
-    )
-    for mini in mini_levels:
-        for level in mini.get("levels", []):
-            level["buildTimeSeconds"] = parse_build_time_seconds(
-                {
-                    "BuildTimeD": level.get("BuildTimeD", ""),
-                    "BuildTimeH": level.get("BuildTimeH", ""),
-                    "BuildTimeM": level.get("BuildTimeM", ""),
-                    "BuildTimeS": level.get("BuildTimeS", ""),
-                }
-            )
-    write_buildings_json(os.path.join(PARSED_DIR, "mini_levels.json"), mini_levels)
-    update_id_map(os.path.join(MAPS_DIR, "mini_levels_json_map.json"), mini_levels)
-
-    seasonal_rows = read_csv_rows(
-        os.path.join(EXTRACTED_DIR, "seasonal_defense_modules.csv")
-    )
-    seasonal = build_grouped_json(
-        seasonal_rows,
+        with_build_time=True,
+    ),
+    DatasetSpec(
+        name="seasonal_defense_modules",
         id_prefix=102,
-        level_field=None,
-        level_fields=[
+        level_fields=(
             "BuildTimeD",
             "BuildTimeH",
             "BuildTimeM",
             "BuildTimeS",
             "BuildResource",
             "BuildCost",
-        ],
+        ),
         include_tid=False,
-    )
-    for module in seasonal:
-        for level in module.get("levels", []):
-            level["buildTimeSeconds"] = parse_build_time_seconds(
-                {
-                    "BuildTimeD": level.get("BuildTimeD", ""),
-                    "BuildTimeH": level.get("BuildTimeH", ""),
-                    "BuildTimeM": level.get("BuildTimeM", ""),
-                    "BuildTimeS": level.get("BuildTimeS", ""),
-                }
-            )
-    write_buildings_json(
-        os.path.join(PARSED_DIR, "seasonal_defense_modules.json"), seasonal
-    )
-    update_id_map(
-        os.path.join(MAPS_DIR, "seasonal_defense_modules_json_map.json"),
-        seasonal,
-    )
-
-    archetype_rows = read_csv_rows(
-        os.path.join(EXTRACTED_DIR, "seasonal_defense_archetypes.csv")
-    )
-    archetypes = build_seasonal_archetypes_json(archetype_rows, id_prefix=103)
-    write_buildings_json(
-        os.path.join(PARSED_DIR, "seasonal_defense_archetypes.json"), archetypes
-    )
-    update_id_map(
-        os.path.join(MAPS_DIR, "seasonal_defense_archetypes_json_map.json"),
-        archetypes,
-    )
-
-    villager_rows = read_csv_rows(
-        os.path.join(EXTRACTED_DIR, "villager_apprentices.csv")
-    )
-    villagers = build_grouped_json(
-        villager_rows,
-        id_prefix=None,
-        level_field=None,
-        level_fields=[
+        with_build_time=True,
+    ),
+    DatasetSpec(
+        name="seasonal_defense_archetypes", builder="archetypes", id_prefix=103
+    ),
+    DatasetSpec(
+        name="villager_apprentices",
+        level_fields=(
             "RequiredTownHallLevel",
             "Type",
             "BoostMultiplier",
             "CostResource",
             "Cost",
-        ],
+        ),
         include_tid=False,
-    )
-    write_buildings_json(
-        os.path.join(PARSED_DIR, "villager_apprentices.json"), villagers
-    )
-    update_id_map(
-        os.path.join(MAPS_DIR, "villager_apprentices_json_map.json"),
-        villagers,
-    )
-
-    guardians_rows = read_csv_rows(os.path.join(EXTRACTED_DIR, "guardians.csv"))
-    guardians = build_grouped_json(
-        guardians_rows,
-        id_prefix=107,
-        level_field="Level",
-        level_fields=[],
-        include_tid=True,
-    )
-    write_buildings_json(os.path.join(PARSED_DIR, "guardians.json"), guardians)
-    update_id_map(os.path.join(MAPS_DIR, "guardians_json_map.json"), guardians)
-
-    weapons_rows = read_csv_rows(os.path.join(EXTRACTED_DIR, "weapons.csv"))
-    weapons = build_grouped_json(
-        weapons_rows,
-        id_prefix=None,
+    ),
+    DatasetSpec(name="guardians", id_prefix=107, level_field="Level"),
+    DatasetSpec(
+        name="weapons",
         level_field="Level",
-        level_fields=[
+        level_fields=(
             "BuildTimeD",
             "BuildTimeH",
             "BuildTimeM",
             "BuildResource",
             "BuildCost",
-        ],
+        ),
         include_tid=False,
+        with_build_time=True,
+    ),
+    DatasetSpec(name="townhall_levels", builder="townhall", write_map=False),
+)
+
+
+def build_dataset(
+    spec: DatasetSpec,
+    input_dir: str,
+    raw_logic: bool = False,
+    metrics: Optional[DatasetMetrics] = None,
+    profile_dir: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    csv_path = os.path.join(input_dir, spec.csv_name)
+    if metrics is None:
+        with _open_dataset_csv(csv_path, raw_logic) as csv_file:
+            headers, rows = iter_csv_rows(csv_file, spec.columns)
+            return build_rows(spec, rows, headers)
+
+    with timed(metrics.seconds, "read"):
+        csv_file = _open_dataset_csv(csv_path, raw_logic)
+    with csv_file:
+        with timed(metrics.seconds, "read"):
+            headers, rows = iter_csv_rows(csv_file, spec.columns)
+        read_before = metrics.seconds["read"]
+        with timed(metrics.seconds, "build", profile_dir, spec.name):
+            items = build_rows(spec, timed_rows(rows, metrics), headers)
+        # Row decoding happens lazily inside the builder; count it as read.
+        metrics.seconds["build"] -= metrics.seconds["read"] - read_before
+    metrics.entities_out = len(items)
+    metrics.levels_out = count_levels(items)
+    metrics.peak_rss_bytes = peak_rss_bytes()
+    metrics.pid = os.getpid()
+    return items
+
+
+def _open_dataset_csv(csv_path: str, raw_logic: bool) -> TextIO:
+    if raw_logic:
+        return open_logic_csv(csv_path)
+    return open(csv_path, newline="", encoding="utf-8")
+
+
+def _build_dataset_job(
+    spec: DatasetSpec,
+    input_dir: str,
+    raw_logic: bool,
+    instrument: bool,
+    profile_dir: Optional[str],
+) -> Tuple[List[Dict[str, Any]], Optional[DatasetMetrics]]:
+    metrics = DatasetMetrics(spec.name) if instrument else None
+    return build_dataset(spec, input_dir, raw_logic, metrics, profile_dir), metrics
+
+
+def build_rows(
+    spec: DatasetSpec, rows: Iterable[Row], headers: List[str]
+) -> List[Dict[str, Any]]:
+    if spec.builder == "townhall":
+        return build_townhall_levels(rows, headers)
+    if spec.builder == "buildings":
+        return build_buildings_json(rows, id_prefix=spec.id_prefix or 1)
+    if spec.builder == "archetypes":
+        return build_seasonal_archetypes_json(rows, id_prefix=spec.id_prefix or 0)
+    if spec.builder != "grouped":
+        raise ValueError(f"Unknown builder {spec.builder!r} for dataset {spec.name}")
+
+    return build_grouped_json(
+        rows,
+        id_prefix=spec.id_prefix,
+        level_field=spec.level_field,
+        level_fields=list(spec.level_fields),
+        time_field_hours=spec.time_field_hours,
+        time_field_minutes=spec.time_field_minutes,
+        include_tid=spec.include_tid,
+        with_build_time=spec.with_build_time,
     )
-    for weapon in weapons:
-        for level in weapon.get("levels", []):
-            level["buildTimeSeconds"] = parse_build_time_seconds(
-                {
-                    "BuildTimeD": level.get("BuildTimeD", ""),
-                    "BuildTimeH": level.get("BuildTimeH", ""),
-                    "BuildTimeM": level.get("BuildTimeM", ""),
-                    "BuildTimeS": "0",
-                }
+
+
+def build_datasets(
+    specs: Sequence[DatasetSpec],
+    input_dir: str,
+    jobs: int = 1,
+    raw_logic: bool = False,
+    instrument: bool = False,
+    profile_dir: Optional[str] = None,
+) -> List[Tuple[List[Dict[str, Any]], Optional[DatasetMetrics]]]:
+    """Build every dataset; metrics are collected in whichever process built
+    it and returned alongside the items."""
+    count = len(specs)
+    args = (
+        specs,
+        [input_dir] * count,
+        [raw_logic] * count,
+        [instrument] * count,
+        [profile_dir] * count,
+    )
+    if jobs <= 1 or count <= 1:
+        return list(map(_build_dataset_job, *args))
+    with ProcessPoolExecutor(max_workers=min(jobs, count)) as pool:
+        return list(pool.map(_build_dataset_job, *args))
+
+
+def run_pipeline(
+    specs: Sequence[DatasetSpec] = DATASETS,
+    input_dir: str = EXTRACTED_DIR,
+    parsed_dir: str = PARSED_DIR,
+    maps_dir: str = MAPS_DIR,
+    jobs: int = 1,
+    incremental: bool = False,
+    manifest_path: str = DEFAULT_MANIFEST_JSON,
+    raw_logic: bool = False,
+    compact_dir: Optional[str] = None,
+    id_store_path: str = DEFAULT_ID_STORE,
+    run_metrics: Optional[RunMetrics] = None,
+    profile_dir: Optional[str] = None,
+    texts_paths: Sequence[str] = (),
+    strings_dir: str = STRINGS_DIR,
+    bundles_dir: str = BUNDLES_DIR,
+) -> List[str]:
+    previous_manifest = load_manifest(manifest_path) if incremental else {}
+    manifest: Dict[str, str] = {}
+    pending: List[DatasetSpec] = []
+
+    for spec in specs:
+        fingerprint = dataset_fingerprint(
+            [os.path.join(input_dir, spec.csv_name)], asdict(spec)
+        )
+        manifest[spec.name] = fingerprint
+        outputs = [os.path.join(parsed_dir, spec.output_name)]
+        if spec.map_name:
+            outputs.append(os.path.join(maps_dir, spec.map_name))
+        if compact_dir:
+            outputs.append(os.path.join(compact_dir, spec.name + COMPACT_EXTENSION))
+        if (
+            incremental
+            and previous_manifest.get(spec.name) == fingerprint
+            and all(os.path.exists(path) for path in outputs)
+        ):
+            print(f"Skipping {spec.name} (unchanged)")
+            continue
+        pending.append(spec)
+
+    id_store = IdStore.load(id_store_path)
+    staged: Dict[str, bytes] = {}
+    instrument = run_metrics is not None
+    built = build_datasets(pending, input_dir, jobs, raw_logic, instrument, profile_dir)
+
+    # Building runs in parallel; writes stay in registry order so repeated
+    # runs produce identical files regardless of --jobs.
+    for spec, (items, metrics) in zip(pending, built):
+        seconds: Dict[str, float] = metrics.seconds if metrics else {}
+        map_path = os.path.join(maps_dir, spec.map_name) if spec.map_name else None
+        with timed(seconds, "map", profile_dir, spec.name):
+            map_data = load_json_map(map_path) if map_path else {}
+            if spec.id_prefix is not None:
+                if not id_store.has_prefix(spec.id_prefix):
+                    id_store.seed(spec.id_prefix, map_data)
+                for name, stable, row_id in id_store.assign(spec.id_prefix, items):
+                    print(
+                        f"Keeping id {stable} for {spec.name}/{name}"
+                        f" (row order now gives {row_id})"
+                    )
+            if map_path:
+                staged[map_path] = encode_json(merge_id_map(map_data, items))
+        with timed(seconds, "write", profile_dir, spec.name):
+            encoded = encode_json(items)
+            write_bytes_if_changed(os.path.join(parsed_dir, spec.output_name), encoded)
+            written = len(encoded)
+            if compact_dir:
+                compact_path = os.path.join(compact_dir, spec.name + COMPACT_EXTENSION)
+                write_compact_tables(compact_path, items)
+                written += os.path.getsize(compact_path)
+        if map_path:
+            written += len(staged[map_path])
+        if metrics and run_metrics:
+            metrics.bytes_written = written
+            run_metrics.datasets.append(metrics)
+
+    run_seconds = run_metrics.seconds if run_metrics else {}
+    with timed(run_seconds, "commitMaps", profile_dir):
+        if id_store.changed:
+            staged[id_store_path] = id_store.encode()
+        write_files_atomically(staged)
+
+    index_path = upgrade_index_path(parsed_dir)
+    index_built = pending or not os.path.exists(index_path)
+    if index_built:
+        with timed(run_seconds, "upgradeIndex", profile_dir):
+            parsed_datasets = load_parsed_datasets(parsed_dir)
+            index = build_upgrade_index(parsed_datasets)
+            write_bytes_if_changed(index_path, encode_upgrade_index(index))
+
+    # per-Town-Hall widget bundles follow the index they are cut with
+    if index_built or not os.path.exists(os.path.join(bundles_dir, BUNDLES_INDEX_NAME)):
+        with timed(run_seconds, "bundles", profile_dir):
+            if index_built:
+                bundles = build_bundles(parsed_datasets, UpgradeIndex(index))
+            else:
+                bundles = build_bundles(load_parsed_datasets(parsed_dir))
+            write_files_atomically(bundle_files(bundles, bundles_dir))
+
+    if os.path.exists(EQUIPMENT_DATA_JSON) and os.path.exists(ORE_COSTS_CSV):
+        with timed(run_seconds, "equipment", profile_dir):
+            # only ore_planner.py reads it, so it stays out of the app bundle
+            write_json_if_changed(
+                derived_path(EQUIPMENT_OUTPUT_NAME, parsed_dir), load_equipment_sources()
             )
-    write_buildings_json(os.path.join(PARSED_DIR, "weapons.json"), weapons)
-    update_id_map(os.path.join(MAPS_DIR, "weapons_json_map.json"), weapons)
 
-    townhall_rows, townhall_headers = read_csv_rows_with_headers(
-        os.path.join(EXTRACTED_DIR, "townhall_levels.csv")
+    if texts_paths:
+        with timed(run_seconds, "strings", profile_dir):
+            tables, _, _ = build_string_tables(texts_paths, parsed_dir, raw_logic)
+            write_files_atomically(string_table_files(tables, strings_dir, DEFAULT_LOCALE))
+
+    save_manifest(manifest_path, manifest)
+    return [spec.name for spec in pending]
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Convert extracted Supercell logic CSVs into the app's parsed JSON files."
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only rebuild datasets whose CSV inputs or builder config changed",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=DEFAULT_MANIFEST_JSON,
+        help="manifest of input fingerprints used by --incremental",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="number of worker processes used to build datasets",
     )
-    townhall_levels = build_townhall_levels(townhall_rows, townhall_headers)
-    write_buildings_json(
-        os.path.join(PARSED_DIR, "townhall_levels.json"), townhall_levels
+    parser.add_argument(
+        "--input-dir",
+        default=EXTRACTED_DIR,
+        help="directory of extracted logic CSVs (one patch snapshot)",
+    )
+    parser.add_argument(
+        "--logic-dir",
+        help="read raw compressed logic/*.csv files directly instead of --input-dir",
+    )
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--maps-dir", default=MAPS_DIR)
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="also write packed columnar tables (see compact_tables.py)",
+    )
+    parser.add_argument("--compact-dir", default=COMPACT_DIR)
+    parser.add_argument(
+        "--id-store",
+        default=DEFAULT_ID_STORE,
+        help="persistent (id prefix, internalName) -> id assignments",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="print per-dataset read/build/write/map timings, sizes and peak RSS",
+    )
+    parser.add_argument(
+        "--texts",
+        action="append",
+        default=[],
+        help="texts CSV to join by TID into per-locale name tables (repeatable)",
+    )
+    parser.add_argument("--strings-dir", default=STRINGS_DIR)
+    parser.add_argument(
+        "--bundles-dir",
+        default=BUNDLES_DIR,
+        help="where the per-Town-Hall widget bundles and their index.json go",
+    )
+    parser.add_argument("--metrics-json", help="write the run metrics as JSON here")
+    parser.add_argument(
+        "--cprofile-dir",
+        help="also dump a cProfile of every stage of every dataset into this directory",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    args = parse_args(argv)
+    instrument = args.profile or args.metrics_json or args.cprofile_dir
+    run_metrics = RunMetrics(jobs=args.jobs) if instrument else None
+    run_pipeline(
+        input_dir=args.logic_dir or args.input_dir,
+        parsed_dir=args.parsed_dir,
+        maps_dir=args.maps_dir,
+        jobs=args.jobs,
+        incremental=args.incremental,
+        manifest_path=args.manifest,
+        raw_logic=bool(args.logic_dir),
+        compact_dir=args.compact_dir if args.compact else None,
+        id_store_path=args.id_store,
+        run_metrics=run_metrics,
+        profile_dir=args.cprofile_dir,
+        texts_paths=args.texts,
+        strings_dir=args.strings_dir,
+        bundles_dir=args.bundles_dir,
     )
+    if run_metrics is None:
+        return
+    if args.profile:
+        print_report(run_metrics)
+    if args.metrics_json:
+        write_json_if_changed(args.metrics_json, run_metrics.to_json())
 
 
 if __name__ == "__main__":
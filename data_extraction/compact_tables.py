@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Compact columnar encoding for the parsed JSON datasets.
+
+Each dataset (a list of records) is stored as a table of typed columns:
+integer columns are packed at the narrowest signed width that fits, strings
+are indices into one string table shared by the whole file (internalName,
+tid, resources, ...), nested `levels` lists become child tables, integer
+columns with blank (null) cells keep a null bitmap, and numeric strings are
+packed as integers and restored as strings on read. Decoding reproduces the
+JSON exactly, including key order as long as the records of a table agree on
+the relative order of their keys (the pipeline's always do).
+
+The tables are not read by the app yet, so --compact output goes to
+data_extraction/parsed_compact_files (gitignored) rather than into the bundled
+upgrade_info folder. test_compact_tables.py covers the round trip.
+
+Run:
+  python3 data_extraction/compact_tables.py --check
+  python3 -m pytest -q data_extraction/test_compact_tables.py
+"""
+import argparse
+import array
+import json
+import os
+import struct
+import sys
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PARSED_DIR = os.path.join(
+    WORKSPACE_ROOT, "clash_widgets", "upgrade_info", "parsed_json_files"
+)
+COMPACT_DIR = os.path.join(WORKSPACE_ROOT, "data_extraction", "parsed_compact_files")
+
+MAGIC = b"CWCT"
+FORMAT_VERSION = 2
+COMPACT_EXTENSION = ".cwct"
+
+KIND_INT = 1
+KIND_STR = 2
+KIND_BOOL = 3
+KIND_STR_LIST = 4
+KIND_TABLE_LIST = 5
+KIND_TABLE = 6
+KIND_NULL = 7
+KIND_JSON = 8
+KIND_DECIMAL_STR = 9
+KIND_NULLABLE_INT = 10
+
+_INT_TYPECODES = (("b", 1), ("h", 2), ("i", 4), ("q", 8))
+_TYPECODE_BY_SIZE = {size: typecode for typecode, size in _INT_TYPECODES}
+
+
+class _StringTable:
+    def __init__(self) -> None:
+        self.strings: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def add(self, value: str) -> int:
+        position = self.index.get(value)
+        if position is None:
+            position = len(self.strings)
+            self.index[value] = position
+            self.strings.append(value)
+        return position
+
+
+def _is_int(value: Any) -> bool:
+    return type(value) is int
+
+
+def _is_decimal_str(value: str) -> bool:
+    try:
+        return str(int(value)) == value
+    except ValueError:
+        return False
+
+
+def _column_kind(values: List[Any]) -> int:
+    if all(value is None for value in values):
+        return KIND_NULL
+    if all(_is_int(value) for value in values):
+        return KIND_INT
+    if all(value is None or _is_int(value) for value in values):
+        return KIND_NULLABLE_INT
+    if all(isinstance(value, bool) for value in values):
+        return KIND_BOOL
+    if all(isinstance(value, str) for value in values):
+        non_empty = [value for value in values if value != ""]
+        if non_empty and all(_is_decimal_str(value) for value in non_empty):
+            return KIND_DECIMAL_STR
+        return KIND_STR
+    if all(
+        isinstance(value, list) and all(isinstance(v, str) for v in value)
+        for value in values
+    ):
+        return KIND_STR_LIST
+    if all(
+        isinstance(value, list) and all(isinstance(v, dict) for v in value)
+        for value in values
+    ):
+        return KIND_TABLE_LIST
+    if all(isinstance(value, dict) for value in values):
+        return KIND_TABLE
+    return KIND_JSON
+
+
+def _pack_ints(out: bytearray, values: Sequence[int]) -> None:
+    low = min(values, default=0)
+    high = max(values, default=0)
+    for typecode, size in _INT_TYPECODES:
+        bound = 1 << (size * 8 - 1)
+        if -bound <= low and high < bound:
+            break
+    packed = array.array(typecode, values)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    out += struct.pack("<BI", size, len(values))
+    out += packed.tobytes()
+
+
+def _pack_bitmap(out: bytearray, flags: Sequence[bool]) -> None:
+    bitmap = bytearray((len(flags) + 7) // 8)
+    for i, flag in enumerate(flags):
+        if flag:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    out += bitmap
+
+
+def _column_order(rows: List[Dict[str, Any]]) -> List[str]:
+    """Every key of ``rows``; a key first seen in a later row goes before the
+    known key that follows it there, so each row decodes in its own order."""
+    columns: List[str] = []
+    known = set()
+    for row in rows:
+        keys = list(row)
+        for position, key in enumerate(keys):
+            if key in known:
+                continue
+            following = next((later for later in keys[position + 1:] if later in known), None)
+            if following is None:
+                columns.append(key)
+            else:
+                columns.insert(columns.index(following), key)
+            known.add(key)
+    return columns
+
+
+def _encode_table(out: bytearray, rows: List[Dict[str, Any]], strings: _StringTable) -> None:
+    columns = _column_order(rows)
+
+    out += struct.pack("<IH", len(rows), len(columns))
+    for name in columns:
+        present = [name in row for row in rows]
+        values = [row[name] for row in rows if name in row]
+        kind = _column_kind(values)
+        has_missing = not all(present)
+        out += struct.pack("<IBB", strings.add(name), kind, has_missing)
+        if has_missing:
+            _pack_bitmap(out, present)
+
+        if kind == KIND_NULL:
+            continue
+        if kind == KIND_INT:
+            _pack_ints(out, values)
+        elif kind == KIND_BOOL:
+            _pack_ints(out, [int(value) for value in values])
+        elif kind == KIND_STR:
+            _pack_ints(out, [strings.add(value) for value in values])
+        elif kind == KIND_DECIMAL_STR:
+            empty = [value == "" for value in values]
+            _pack_bitmap(out, empty)
+            _pack_ints(out, [int(value) for value in values if value != ""])
+        elif kind == KIND_NULLABLE_INT:
+            _pack_bitmap(out, [value is None for value in values])
+            _pack_ints(out, [value for value in values if value is not None])
+        elif kind == KIND_STR_LIST:
+            _pack_ints(out, [len(value) for value in values])
+            _pack_ints(out, [strings.add(v) for value in values for v in value])
+        elif kind == KIND_TABLE_LIST:
+            _pack_ints(out, [len(value) for value in values])
+            _encode_table(out, [v for value in values for v in value], strings)
+        elif kind == KIND_TABLE:
+            _encode_table(out, values, strings)
+        else:
+            _pack_ints(
+                out,
+                [strings.add(json.dumps(value, ensure_ascii=False)) for value in values],
+            )
+
+
+def encode_compact(records: List[Dict[str, Any]]) -> bytes:
+    strings = _StringTable()
+    body = bytearray()
+    _encode_table(body, records, strings)
+
+    encoded = [value.encode("utf-8") for value in strings.strings]
+    header = bytearray(MAGIC)
+    header += struct.pack("<H", FORMAT_VERSION)
+    _pack_ints(header, [len(value) for value in encoded])
+    header += b"".join(encoded)
+    return bytes(header + body)
+
+
+class _Reader:
+    def __init__(self, data: bytes) -> None:
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, fmt: str) -> Tuple[Any, ...]:
+        values = struct.unpack_from(fmt, self.data, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def take(self, size: int) -> memoryview:
+        chunk = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return chunk
+
+    def ints(self) -> List[int]:
+        size, count = self.unpack("<BI")
+        typecode = _TYPECODE_BY_SIZE[size]
+        values = array.array(typecode)
+        values.frombytes(self.take(size * count))
+        if sys.byteorder == "big":
+            values.byteswap()
+        return values.tolist()
+
+    def bitmap(self, count: int) -> List[bool]:
+        raw = self.take((count + 7) // 8)
+        return [bool(raw[i >> 3] & (1 << (i & 7))) for i in range(count)]
+
+
+def _decode_table(reader: _Reader, strings: List[str]) -> List[Dict[str, Any]]:
+    row_count, column_count = reader.unpack("<IH")
+    rows: List[Dict[str, Any]] = [{} for _ in range(row_count)]
+    for _ in range(column_count):
+        name_index, kind, has_missing = reader.unpack("<IBB")
+        name = strings[name_index]
+        present = reader.bitmap(row_count) if has_missing else [True] * row_count
+        count = sum(present)
+
+        if kind == KIND_NULL:
+            values: List[Any] = [None] * count
+        elif kind == KIND_INT:
+            values = reader.ints()
+        elif kind == KIND_BOOL:
+            values = [bool(value) for value in reader.ints()]
+        elif kind == KIND_STR:
+            values = [strings[i] for i in reader.ints()]
+        elif kind == KIND_DECIMAL_STR:
+            empty = reader.bitmap(count)
+            numbers = iter(reader.ints())
+            values = ["" if is_empty else str(next(numbers)) for is_empty in empty]
+        elif kind == KIND_NULLABLE_INT:
+            nulls = reader.bitmap(count)
+            numbers = iter(reader.ints())
+            values = [None if is_null else next(numbers) for is_null in nulls]
+        elif kind == KIND_STR_LIST:
+            lengths = reader.ints()
+            flat = iter(strings[i] for i in reader.ints())
+            values = [[next(flat) for _ in range(length)] for length in lengths]
+        elif kind == KIND_TABLE_LIST:
+            lengths = reader.ints()
+            flat_rows = iter(_decode_table(reader, strings))
+            values = [[next(flat_rows) for _ in range(length)] for length in lengths]
+        elif kind == KIND_TABLE:
+            values = _decode_table(reader, strings)
+        elif kind == KIND_JSON:
+            values = [json.loads(strings[i]) for i in reader.ints()]
+        else:
+            raise ValueError(f"Unknown column kind {kind} for {name!r}")
+
+        value_iter = iter(values)
+        for row, is_present in zip(rows, present):
+            if is_present:
+                row[name] = next(value_iter)
+    return rows
+
+
+def decode_compact(data: bytes) -> List[Dict[str, Any]]:
+    if data[:4] != MAGIC:
+        raise ValueError("Not a compact table file")
+    reader = _Reader(data)
+    reader.offset = 4
+    (version,) = reader.unpack("<H")
+    if not 1 <= version <= FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact table version {version}")
+    lengths = reader.ints()
+    strings = [bytes(reader.take(length)).decode("utf-8") for length in lengths]
+    return _decode_table(reader, strings)
+
+
+def write_compact_tables(output_path: str, records: List[Dict[str, Any]]) -> bool:
+    encoded = encode_compact(records)
+    if os.path.exists(output_path):
+        with open(output_path, "rb") as existing_file:
+            if existing_file.read() == encoded:
+                return False
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, "wb") as out_file:
+        out_file.write(encoded)
+    return True
+
+
+def read_compact_tables(path: str) -> List[Dict[str, Any]]:
+    with open(path, "rb") as in_file:
+        return decode_compact(in_file.read())
+
+
+def verify_round_trip(json_path: str) -> Tuple[int, int]:
+    """Encode a parsed JSON file and check decoding gives back identical JSON.
+
+    Returns (json_bytes, compact_bytes).
+    """
+    with open(json_path, "rb") as json_file:
+        raw = json_file.read()
+    records = json.loads(raw)
+    encoded = encode_compact(records)
+    decoded = decode_compact(encoded)
+    original_text = json.dumps(records, indent=2, ensure_ascii=False)
+    decoded_text = json.dumps(decoded, indent=2, ensure_ascii=False)
+    if decoded_text != original_text:
+        raise ValueError(f"Compact round trip changed {os.path.basename(json_path)}")
+    return len(raw), len(encoded)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Convert parsed JSON datasets to compact columnar tables."
+    )
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--compact-dir", default=COMPACT_DIR)
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only verify that every dataset round-trips; do not write files",
+    )
+    args = parser.parse_args(argv)
+
+    total_json = 0
+    total_compact = 0
+    for filename in sorted(os.listdir(args.parsed_dir)):
+        if not filename.endswith(".json"):
+            continue
+        json_path = os.path.join(args.parsed_dir, filename)
+        with open(json_path, "r", encoding="utf-8") as json_file:
+            records = json.load(json_file)
+        if not isinstance(records, list):
+            # Derived files such as upgrade_index.json are not record tables.
+            continue
+        json_size, compact_size = verify_round_trip(json_path)
+        total_json += json_size
+        total_compact += compact_size
+        print(f"{filename}: {json_size} -> {compact_size} bytes")
+        if not args.check:
+            name = os.path.splitext(filename)[0]
+            write_compact_tables(
+                os.path.join(args.compact_dir, name + COMPACT_EXTENSION), records
+            )
+    print(f"Total: {total_json} -> {total_compact} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Vectorized remaining-upgrade totals over dense NumPy arrays.
+
+The upgrade index (see upgrade_index.py) is unpacked into dense arrays indexed
+by (entity row, level): cumulative upgrade seconds and cumulative cost per
+resource bucket (gold, elixir, dark elixir), plus the max level of every
+entity at every Town Hall. A batch of player exports is flattened into a few
+integer arrays and reduced with gathers and scatter-adds, so a clan-wide
+"cost to max" report costs a handful of array operations instead of
+per-building Python loops.
+
+Results match analyze_exports.py row for row. Requires numpy.
+
+Run:
+  python3 data_extraction/cost_engine.py exports.jsonl --output summary.csv
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analyze_exports import (
+    CATEGORIES,
+    RESOURCE_KEYS,
+    UNIT_CATEGORIES,
+    ReferenceData,
+    iter_export_sources,
+    resource_bucket,
+    write_summary,
+)
+from upgrade_index import PARSED_DIR
+
+CATEGORY_CODES = {category: code for code, category in enumerate(CATEGORIES)}
+
+
+class CostEngine:
+    def __init__(self, reference: ReferenceData) -> None:
+        index = reference.index
+        self.reference = reference
+        self.ids = np.array(sorted(index.entities), dtype=np.int64)
+        entities = [index.entities[int(entity_id)] for entity_id in self.ids]
+        entity_count = len(entities)
+        level_count = max((e["maxLevel"] for e in entities), default=0) + 1
+
+        self.max_levels = np.array([e["maxLevel"] for e in entities], dtype=np.int64)
+        self.town_halls = np.array(index.town_halls, dtype=np.int64)
+        self.caps = np.zeros((entity_count, len(index.town_halls)), dtype=np.int64)
+        self.cum_time = np.zeros((entity_count, level_count), dtype=np.int64)
+        self.cum_cost = np.zeros(
+            (len(RESOURCE_KEYS), entity_count, level_count), dtype=np.int64
+        )
+        self.categories = np.full(entity_count, -1, dtype=np.int64)
+
+        bucket_codes = {key: code for code, key in enumerate(RESOURCE_KEYS)}
+        for row, entity in enumerate(entities):
+            top = entity["maxLevel"]
+            self.caps[row] = entity["maxLevelByTownHall"]
+            times = entity["cumulativeTimeSeconds"]
+            self.cum_time[row, : top + 1] = times
+            self.cum_time[row, top + 1 :] = times[-1]
+            for resource, series in entity["cumulativeCost"].items():
+                bucket = resource_bucket(resource)
+                if bucket is None:
+                    continue
+                plane = self.cum_cost[bucket_codes[bucket], row]
+                plane[: top + 1] += series
+                plane[top + 1 :] += series[-1]
+
+            dataset = entity["dataset"]
+            if dataset == "buildings":
+                is_wall = "wall" in entity["internalName"].lower()
+                self.categories[row] = CATEGORY_CODES["walls" if is_wall else "buildings"]
+            elif dataset == "traps":
+                self.categories[row] = CATEGORY_CODES["traps"]
+            elif dataset in UNIT_CATEGORIES:
+                self.categories[row] = CATEGORY_CODES[UNIT_CATEGORIES[dataset][0]]
+
+        # Required building/trap counts per Town Hall, keyed the same way as
+        # analyze_exports: townhall_levels names resolved to entity rows.
+        self.required = np.zeros((len(index.town_halls), entity_count), dtype=np.int64)
+        for position, town_hall in enumerate(index.town_halls):
+            for name, count in reference.counts_by_town_hall.get(town_hall, {}).items():
+                lower = name.lower()
+                entity_id = reference.building_ids.get(lower, reference.trap_ids.get(lower))
+                if entity_id is not None:
+                    self.required[position, self.rows_for([entity_id])[0]] = count
+
+        self.unit_rows = np.concatenate([
+            self.rows_for(reference.ids_by_dataset.get(dataset, []))
+            for dataset in UNIT_CATEGORIES
+        ]).astype(np.int64)
+        self.unit_export_keys = {
+            key for _, keys in UNIT_CATEGORIES.values() for key in keys
+        }
+
+    @classmethod
+    def from_parsed_dir(cls, parsed_dir: str = PARSED_DIR) -> "CostEngine":
+        return cls(ReferenceData(parsed_dir))
+
+    def rows_for(self, entity_ids: Sequence[int]) -> np.ndarray:
+        """Dense row per entity id; -1 for ids the index does not know."""
+        ids = np.asarray(entity_ids, dtype=np.int64)
+        rows = np.searchsorted(self.ids, ids)
+        rows = np.minimum(rows, len(self.ids) - 1)
+        return np.where(self.ids[rows] == ids, rows, -1)
+
+    def town_hall_positions(self, town_hall_levels: Sequence[int]) -> np.ndarray:
+        levels = np.asarray(town_hall_levels, dtype=np.int64)
+        positions = np.searchsorted(self.town_halls, levels, side="right") - 1
+        return positions
+
+    def upgrade_totals(
+        self,
+        rows: np.ndarray,
+        from_levels: np.ndarray,
+        to_levels: np.ndarray,
+        counts: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized ``UpgradeIndex.upgrade_between`` for many jobs at once.
+
+        Returns (seconds of shape (N,), costs of shape (N, resources)).
+        """
+        top = self.max_levels[rows]
+        to_levels = np.clip(to_levels, 0, top)
+        from_levels = np.clip(from_levels, 0, to_levels)
+        seconds = self.cum_time[rows, to_levels] - self.cum_time[rows, from_levels]
+        costs = (
+            self.cum_cost[:, rows, to_levels] - self.cum_cost[:, rows, from_levels]
+        ).T
+        if counts is not None:
+            seconds = seconds * counts
+            costs = costs * counts[:, None]
+        return seconds, costs
+
+    def remaining_totals(
+        self, exports: Sequence[Dict[str, Any]]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Remaining upgrades for a batch of exports at their current Town Hall.
+
+        Returns (town hall per export, seconds of shape (A, categories),
+        costs of shape (A, categories, resources)).
+        """
+        account_count = len(exports)
+        entity_count = len(self.ids)
+        town_hall_id = self.reference.town_hall_id
+
+        # Flatten every export entry into parallel lists in one pass.
+        accounts: List[int] = []
+        entity_ids: List[int] = []
+        levels: List[int] = []
+        counts: List[int] = []
+        unit_accounts: List[int] = []
+        unit_ids: List[int] = []
+        unit_levels: List[int] = []
+        town_hall_levels = [0] * account_count
+        for account, export in enumerate(exports):
+            for key in ("buildings", "traps"):
+                for item in export.get(key) or []:
+                    level = item.get("lvl")
+                    if level is None:
+                        continue
+                    if item["data"] == town_hall_id and level > town_hall_levels[account]:
+                        town_hall_levels[account] = level
+                    accounts.append(account)
+                    entity_ids.append(item["data"])
+                    levels.append(level)
+                    counts.append(max(item.get("cnt") or 1, 1))
+            for key in self.unit_export_keys:
+                for item in export.get(key) or []:
+                    unit_accounts.append(account)
+                    unit_ids.append(item["data"])
+                    unit_levels.append(item.get("lvl") or 0)
+
+        town_halls = np.array(town_hall_levels, dtype=np.int64)
+        th_positions = self.town_hall_positions(town_halls)
+        valid_th = th_positions >= 0
+        th_positions = np.where(valid_th, th_positions, 0)
+        cap_matrix = np.where(valid_th[:, None], self.caps[:, th_positions].T, 0)
+        required = np.where(valid_th[:, None], self.required[th_positions], 0)
+
+        seconds = np.zeros(account_count * len(CATEGORIES), dtype=np.int64)
+        costs = np.zeros((account_count * len(CATEGORIES), len(RESOURCE_KEYS)), dtype=np.int64)
+
+        def accumulate(acc: np.ndarray, rows: np.ndarray, job_seconds: np.ndarray, job_costs: np.ndarray) -> None:
+            slots = acc * len(CATEGORIES) + self.categories[rows]
+            np.add.at(seconds, slots, job_seconds)
+            np.add.at(costs, slots, job_costs)
+
+        # Placed buildings and traps, only where the Town Hall requires them.
+        acc = np.array(accounts, dtype=np.int64)
+        rows = self.rows_for(entity_ids) if entity_ids else np.zeros(0, dtype=np.int64)
+        lvl = np.array(levels, dtype=np.int64)
+        cnt = np.array(counts, dtype=np.int64)
+        known = rows >= 0
+        acc, rows, lvl, cnt = acc[known], rows[known], lvl[known], cnt[known]
+        placed_total = np.zeros((account_count, entity_count), dtype=np.int64)
+        np.add.at(placed_total, (acc, rows), cnt)
+        caps = cap_matrix[acc, rows]
+        wanted = (required[acc, rows] > 0) & (caps > 0)
+        job_seconds, job_costs = self.upgrade_totals(
+            rows[wanted], lvl[wanted], caps[wanted], cnt[wanted]
+        )
+        accumulate(acc[wanted], rows[wanted], job_seconds, job_costs)
+
+        # Missing buildings and traps are built from level 0.
+        missing = np.maximum(required - placed_total, 0) * (cap_matrix > 0)
+        miss_acc, miss_rows = np.nonzero(missing)
+        job_seconds, job_costs = self.upgrade_totals(
+            miss_rows,
+            np.zeros(len(miss_rows), dtype=np.int64),
+            cap_matrix[miss_acc, miss_rows],
+            missing[miss_acc, miss_rows],
+        )
+        accumulate(miss_acc, miss_rows, job_seconds, job_costs)
+
+        # Lab units, heroes and pets: every unit up to its cap.
+        current = np.zeros((account_count, entity_count), dtype=np.int64)
+        if unit_ids:
+            u_rows = self.rows_for(unit_ids)
+            u_known = u_rows >= 0
+            np.maximum.at(
+                current,
+                (np.array(unit_accounts, dtype=np.int64)[u_known], u_rows[u_known]),
+                np.array(unit_levels, dtype=np.int64)[u_known],
+            )
+        unit_caps = cap_matrix[:, self.unit_rows]
+        job_acc, job_col = np.nonzero(unit_caps > 1)
+        job_rows = self.unit_rows[job_col]
+        job_seconds, job_costs = self.upgrade_totals(
+            job_rows, current[job_acc, job_rows], unit_caps[job_acc, job_col]
+        )
+        accumulate(job_acc, job_rows, job_seconds, job_costs)
+
+        return (
+            town_halls,
+            seconds.reshape(account_count, len(CATEGORIES)),
+            costs.reshape(account_count, len(CATEGORIES), len(RESOURCE_KEYS)),
+        )
+
+    def summary_rows(self, exports: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        town_halls, seconds, costs = self.remaining_totals(exports)
+        rows = []
+        for account, export in enumerate(exports):
+            row: Dict[str, Any] = {
+                "tag": export.get("tag", ""),
+                "timestamp": export.get("timestamp", ""),
+                "townHallLevel": int(town_halls[account]),
+            }
+            for code, category in enumerate(CATEGORIES):
+                row[f"{category}_seconds"] = int(seconds[account, code])
+                for r, key in enumerate(RESOURCE_KEYS):
+                    row[f"{category}_{key}"] = int(costs[account, code, r])
+            row["total_seconds"] = int(seconds[account].sum())
+            for r, key in enumerate(RESOURCE_KEYS):
+                row[f"total_{key}"] = int(costs[account, :, r].sum())
+            rows.append(row)
+        return rows
+
+
+# what a malformed export raises; analyze_exports._analyze_source catches the same
+EXPORT_ERRORS = (ValueError, KeyError, TypeError, AttributeError)
+
+
+def _summary_row(engine: CostEngine, export: Dict[str, Any]) -> Dict[str, Any]:
+    try:
+        return engine.summary_rows([export])[0]
+    except EXPORT_ERRORS as exc:
+        return {"error": f"{type(exc).__name__}: {exc}"}
+
+
+def iter_summary_rows(
+    engine: CostEngine, sources: Iterable[Tuple[str, str]], batch_size: int = 1000
+) -> Iterator[Dict[str, Any]]:
+    """Summary rows in input order. A batch holding a malformed export is
+    re-run one export at a time, so only the bad export gets an error row."""
+    batch: List[Tuple[str, Dict[str, Any]]] = []
+
+    def flush() -> Iterator[Dict[str, Any]]:
+        exports = [export for _, export in batch]
+        try:
+            rows = engine.summary_rows(exports)
+        except EXPORT_ERRORS:
+            rows = [_summary_row(engine, export) for export in exports]
+        for (label, _), row in zip(batch, rows):
+            row["source"] = label
+            yield row
+        batch.clear()
+
+    for label, raw in sources:
+        try:
+            export = json.loads(raw)
+            if not isinstance(export, dict):
+                raise TypeError("export is not a JSON object")
+        except (ValueError, TypeError) as exc:
+            yield {"source": label, "error": f"{type(exc).__name__}: {exc}"}
+            continue
+        batch.append((label, export))
+        if len(batch) >= batch_size:
+            yield from flush()
+    if batch:
+        yield from flush()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Vectorized remaining-upgrade report for many player exports."
+    )
+    parser.add_argument("paths", nargs="+", help="export files, directories or .jsonl files")
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--format", choices=("csv", "jsonl"), default="csv")
+    parser.add_argument("--output", help="write the summary here instead of stdout")
+    args = parser.parse_args(argv)
+
+    engine = CostEngine.from_parsed_dir(args.parsed_dir)
+    rows = iter_summary_rows(engine, iter_export_sources(args.paths), args.batch_size)
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as out_file:
+            count = write_summary(rows, out_file, args.format)
+        print(f"Wrote {count} rows to {args.output}")
+    else:
+        write_summary(rows, sys.stdout, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+Long-running local HTTP service over the pipeline output in
+clash_widgets/upgrade_info/.
+
+The parsed datasets, json_maps, mapping.json, townhall_levels.json and the
+upgrade index (data_extraction/upgrade_index.json) are loaded once and kept
+in memory. Encoded responses go through an LRU cache. At most once per
+--reload-interval seconds a request checks the size and mtime of every served
+file; when clash_csv_to_json.py has rewritten any of them, a fresh copy is
+loaded and swapped in and the cache is dropped. Since that script replaces
+files atomically, a half-written dataset is never read. If a reload still
+fails, the old data stays in service.
+
+Routes (GET unless noted, JSON responses):
+  /entities/{id}                   parsed entity
+  /entities/{id}/levels/{level}    one level row
+  /names/{name}                    ids whose internal or display name matches
+  /townhalls/{level}               required counts and max level per entity
+  POST /remaining                  body: a player export; remaining upgrade
+                                   time and cost per category (analyze_exports)
+  /status                          loaded files, reload count, cache stats
+
+Run:
+  python3 data_extraction/data_server.py --port 8766
+  curl localhost:8766/townhalls/16
+  curl --data-binary @misc_files/sample.json localhost:8766/remaining
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote, urlsplit
+
+from analyze_exports import ReferenceData, analyze_export
+from upgrade_index import PARSED_DIR, WORKSPACE_ROOT, upgrade_index_path
+
+UPGRADE_INFO_DIR = os.path.join(WORKSPACE_ROOT, "clash_widgets", "upgrade_info")
+MAPS_DIR = os.path.join(UPGRADE_INFO_DIR, "json_maps")
+MAPPING_PATH = os.path.join(UPGRADE_INFO_DIR, "mapping.json")
+DEFAULT_CACHE_SIZE = 4096
+DEFAULT_RELOAD_INTERVAL = 1.0
+MAX_BODY_BYTES = 8 * 1024 * 1024
+
+
+class NotFound(Exception):
+    pass
+
+
+def _file_stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _json_files(directory: str) -> List[str]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".json")
+    )
+
+
+def watched_files(parsed_dir: str, maps_dir: str, mapping_path: str) -> Dict[str, Tuple[int, int]]:
+    paths = _json_files(parsed_dir) + _json_files(maps_dir)
+    for path in (mapping_path, upgrade_index_path(parsed_dir)):
+        if os.path.exists(path) and path not in paths:
+            paths.append(path)
+    return {path: _file_stamp(path) for path in paths}
+
+
+class DataSnapshot:
+    """Everything one generation of the pipeline output answers from."""
+
+    def __init__(self, parsed_dir: str, maps_dir: str, mapping_path: str) -> None:
+        self.stamps = watched_files(parsed_dir, maps_dir, mapping_path)
+        self.reference = ReferenceData(parsed_dir)
+        self.loaded_at = time.time()
+
+        self.entities: Dict[int, Dict[str, Any]] = {}
+        self.datasets: Dict[int, str] = {}
+        for path in _json_files(parsed_dir):
+            dataset = os.path.splitext(os.path.basename(path))[0]
+            with open(path, "r", encoding="utf-8") as in_file:
+                data = json.load(in_file)
+            if not isinstance(data, list):
+                continue
+            for entity in data:
+                if isinstance(entity, dict) and isinstance(entity.get("id"), int):
+                    self.entities[entity["id"]] = entity
+                    self.datasets[entity["id"]] = dataset
+        self.levels: Dict[Tuple[int, int], Dict[str, Any]] = {
+            (entity_id, row["level"]): row
+            for entity_id, entity in self.entities.items()
+            for row in entity.get("levels") or []
+            if "level" in row
+        }
+
+        self.display_names: Dict[int, str] = {}
+        if os.path.exists(mapping_path):
+            with open(mapping_path, "r", encoding="utf-8") as in_file:
+                self.display_names = {int(key): value for key, value in json.load(in_file).items()}
+        self.ids_by_name: Dict[str, List[int]] = {}
+        for path in _json_files(maps_dir):
+            with open(path, "r", encoding="utf-8") as in_file:
+                for entry in json.load(in_file).values():
+                    self._add_name(entry.get("internalName"), entry.get("id"))
+                    self._add_name(entry.get("displayName"), entry.get("id"))
+                    if entry.get("id") is not None and entry.get("displayName"):
+                        self.display_names.setdefault(entry["id"], entry["displayName"])
+        for entity_id, entity in self.entities.items():
+            self._add_name(entity.get("internalName"), entity_id)
+        for entity_id, name in self.display_names.items():
+            self._add_name(name, entity_id)
+
+    def _add_name(self, name: Optional[str], entity_id: Optional[int]) -> None:
+        if not name or entity_id is None:
+            return
+        ids = self.ids_by_name.setdefault(name.lower(), [])
+        if entity_id not in ids:
+            ids.append(entity_id)
+
+    def entity(self, entity_id: int) -> Dict[str, Any]:
+        entity = self.entities.get(entity_id)
+        if entity is None:
+            raise NotFound(f"No entity {entity_id}")
+        output = {"dataset": self.datasets[entity_id], **entity}
+        if entity_id in self.display_names:
+            output["displayName"] = self.display_names[entity_id]
+        return output
+
+    def level(self, entity_id: int, level: int) -> Dict[str, Any]:
+        row = self.levels.get((entity_id, level))
+        if row is None:
+            raise NotFound(f"No level {level} for entity {entity_id}")
+        return row
+
+    def names(self, name: str) -> List[Dict[str, Any]]:
+        ids = self.ids_by_name.get(name.lower())
+        if not ids:
+            raise NotFound(f"No entity named {name!r}")
+        return [
+            {
+                "id": entity_id,
+                "internalName": (self.entities.get(entity_id) or {}).get("internalName"),
+                "displayName": self.display_names.get(entity_id),
+                "dataset": self.datasets.get(entity_id),
+            }
+            for entity_id in ids
+        ]
+
+    def town_hall(self, level: int) -> Dict[str, Any]:
+        reference = self.reference
+        counts = reference.counts_by_town_hall.get(level)
+        if counts is None:
+            raise NotFound(f"No Town Hall level {level}")
+        index = reference.index
+        max_levels = {}
+        for entity_id in sorted(index.entities):
+            cap = index.max_level(entity_id, level)
+            if cap:
+                max_levels[str(entity_id)] = cap
+        return {"townHallLevel": level, "counts": counts, "maxLevels": max_levels}
+
+    def remaining(self, export: Dict[str, Any]) -> Dict[str, Any]:
+        return analyze_export(export, self.reference)
+
+
+class LruCache:
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[Any, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Optional[bytes]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Any, value: bytes) -> None:
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._items), "maxSize": self.size, "hits": self.hits, "misses": self.misses}
+
+
+class DataService:
+    """Holds the current DataSnapshot and swaps it when the files change."""
+
+    def __init__(
+        self,
+        parsed_dir: str = PARSED_DIR,
+        maps_dir: str = MAPS_DIR,
+        mapping_path: str = MAPPING_PATH,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        reload_interval: float = DEFAULT_RELOAD_INTERVAL,
+    ) -> None:
+        self.parsed_dir = parsed_dir
+        self.maps_dir = maps_dir
+        self.mapping_path = mapping_path
+        self.reload_interval = reload_interval
+        self.cache = LruCache(cache_size)
+        self.snapshot = DataSnapshot(parsed_dir, maps_dir, mapping_path)
+        self.reloads = 0
+        self.reload_error: Optional[str] = None
+        self._next_check = time.monotonic() + reload_interval
+        self._reload_lock = threading.Lock()
+
+    def maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now < self._next_check or not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_check = now + self.reload_interval
+            try:
+                stamps = watched_files(self.parsed_dir, self.maps_dir, self.mapping_path)
+                if stamps == self.snapshot.stamps:
+                    return
+                snapshot = DataSnapshot(self.parsed_dir, self.maps_dir, self.mapping_path)
+            except (OSError, ValueError, KeyError) as exc:
+                self.reload_error = f"{type(exc).__name__}: {exc}"
+                return
+            self.snapshot = snapshot
+            self.cache.clear()
+            self.reloads += 1
+            self.reload_error = None
+        finally:
+            self._reload_lock.release()
+
+    def query(self, key: Tuple[Any, ...], compute: Any) -> bytes:
+        """Encoded JSON for ``key``, from the cache when possible."""
+        self.maybe_reload()
+        snapshot = self.snapshot
+        cache_key = (id(snapshot), *key)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        body = json.dumps(compute(snapshot), ensure_ascii=False).encode("utf-8")
+        self.cache.put(cache_key, body)
+        return body
+
+    def status(self) -> Dict[str, Any]:
+        snapshot = self.snapshot
+        return {
+            "loadedAt": snapshot.loaded_at,
+            "files": len(snapshot.stamps),
+            "entities": len(snapshot.entities),
+            "reloads": self.reloads,
+            "reloadError": self.reload_error,
+            "cache": self.cache.stats(),
+        }
+
+
+def _int(segment: str) -> int:
+    try:
+        return int(segment)
+    except ValueError:
+        raise NotFound(f"Not a number: {segment!r}") from None
+
+
+def _error_body(message: str) -> bytes:
+    return json.dumps({"error": message}).encode("utf-8")
+
+
+class DataRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body are separate writes; with Nagle on, keep-alive clients
+    # wait on a delayed ACK for every response
+    disable_nagle_algorithm = True
+    server: "DataServer"
+
+    def do_GET(self) -> None:
+        self._handle(self._get)
+
+    def do_POST(self) -> None:
+        self._handle(self._post)
+
+    def _handle(self, route: Any) -> None:
+        try:
+            status, body = route()
+        except Exception as exc:  # one bad request must not take the handler down
+            # logged even without --verbose
+            BaseHTTPRequestHandler.log_message(self, "Error serving %s: %r", self.path, exc)
+            status, body = 500, _error_body(f"Internal error: {type(exc).__name__}")
+        self._send(status, body)
+
+    def _get(self) -> Tuple[int, bytes]:
+        service = self.server.service
+        parts = [unquote(part) for part in urlsplit(self.path).path.split("/") if part]
+        try:
+            if parts == ["status"]:
+                self.server.service.maybe_reload()
+                body = json.dumps(service.status()).encode("utf-8")
+            elif len(parts) == 2 and parts[0] == "entities":
+                entity_id = _int(parts[1])
+                body = service.query(("entity", entity_id), lambda s: s.entity(entity_id))
+            elif len(parts) == 4 and parts[0] == "entities" and parts[2] == "levels":
+                entity_id, level = _int(parts[1]), _int(parts[3])
+                body = service.query(("level", entity_id, level), lambda s: s.level(entity_id, level))
+            elif len(parts) == 2 and parts[0] == "names":
+                name = parts[1]
+                body = service.query(("names", name.lower()), lambda s: s.names(name))
+            elif len(parts) == 2 and parts[0] == "townhalls":
+                level = _int(parts[1])
+                body = service.query(("townhall", level), lambda s: s.town_hall(level))
+            else:
+                raise NotFound(f"Unknown path {self.path}")
+        except NotFound as exc:
+            return 404, _error_body(str(exc))
+        return 200, body
+
+    def _post(self) -> Tuple[int, bytes]:
+        if urlsplit(self.path).path.rstrip("/") != "/remaining":
+            return 404, _error_body(f"Unknown path {self.path}")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = 0
+        if length <= 0 or length > MAX_BODY_BYTES:
+            return 400, _error_body("Missing or oversized body")
+        raw = self.rfile.read(length)
+        try:
+            export = json.loads(raw)
+        except ValueError as exc:
+            return 400, _error_body(f"Invalid JSON: {exc}")
+        if not isinstance(export, dict):
+            return 400, _error_body("Expected an export object")
+        digest = hashlib.sha1(raw).digest()
+        try:
+            body = self.server.service.query(("remaining", digest), lambda s: s.remaining(export))
+        except (KeyError, TypeError, AttributeError, ValueError) as exc:
+            return 400, _error_body(f"Malformed export: {type(exc).__name__}: {exc}")
+        return 200, body
+
+    def _send(self, status: int, body: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class DataServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: DataService, verbose: bool = False) -> None:
+        super().__init__(address, DataRequestHandler)
+        self.service = service
+        self.verbose = verbose
+
+
+def start_data_server(port: int = 0, **service_options: Any) -> DataServer:
+    """Serve on a background thread; port 0 picks a free port."""
+    server = DataServer(("127.0.0.1", port), DataService(**service_options))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve the parsed upgrade data over local HTTP.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--maps-dir", default=MAPS_DIR)
+    parser.add_argument("--mapping", default=MAPPING_PATH)
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument(
+        "--reload-interval", type=float, default=DEFAULT_RELOAD_INTERVAL,
+        help="seconds between checks for regenerated files",
+    )
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    service = DataService(args.parsed_dir, args.maps_dir, args.mapping, args.cache_size, args.reload_interval)
+    server = DataServer((args.host, args.port), service, args.verbose)
+    print(
+        f"Loaded {len(service.snapshot.entities)} entities in "
+        f"{(time.perf_counter() - started) * 1000:.0f} ms; serving on http://{args.host}:{args.port}",
+        file=sys.stderr,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
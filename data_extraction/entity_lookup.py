@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Lazy lookup of parsed entities by numeric id.
+
+A sidecar index maps every `id` assigned by the pipeline (id_prefix * 1_000_000
++ index) to the dataset file and the byte range of that entity inside it. The
+index and the JSON files are memory-mapped, so a lookup is a binary search over
+fixed-size records followed by decoding one entity; nothing else is parsed.
+
+The sidecar records the size and mtime of every JSON file it covers and is
+rebuilt automatically when any of them changes. It lives outside
+parsed_json_files because that folder is bundled into the app.
+
+Run:
+  python3 data_extraction/entity_lookup.py 1000008 --level 21
+  python3 data_extraction/entity_lookup.py --build
+"""
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from upgrade_index import PARSED_DIR
+
+DATA_EXTRACTION_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_PATH = os.path.join(DATA_EXTRACTION_DIR, "entity_lookup.idx")
+
+MAGIC = b"CWIX"
+FORMAT_VERSION = 1
+# id, file number, byte offset, byte length
+RECORD = struct.Struct("<qHxxII")
+FILE_ENTRY = struct.Struct("<QQH")
+HEADER = struct.Struct("<4sHHI")
+
+
+def _skip_whitespace(text: str, position: int) -> int:
+    while position < len(text) and text[position] in " \t\r\n":
+        position += 1
+    return position
+
+
+def iter_entity_spans(raw: bytes) -> Iterator[Tuple[Dict[str, Any], int, int]]:
+    """Yield (entity, byte offset, byte length) for each top-level list item."""
+    text = raw.decode("utf-8")
+    ascii_only = len(text) == len(raw)
+    decoder = json.JSONDecoder()
+
+    position = _skip_whitespace(text, 0)
+    if text[position:position + 1] != "[":
+        return
+    position += 1
+    char_mark = byte_mark = 0
+
+    def byte_offset(char_offset: int) -> int:
+        nonlocal char_mark, byte_mark
+        if ascii_only:
+            return char_offset
+        byte_mark += len(text[char_mark:char_offset].encode("utf-8"))
+        char_mark = char_offset
+        return byte_mark
+
+    while True:
+        position = _skip_whitespace(text, position)
+        if position >= len(text) or text[position] == "]":
+            return
+        entity, end = decoder.raw_decode(text, position)
+        start_byte = byte_offset(position)
+        yield entity, start_byte, byte_offset(end) - start_byte
+        position = _skip_whitespace(text, end)
+        if text[position:position + 1] == ",":
+            position += 1
+
+
+def _dataset_files(parsed_dir: str) -> List[str]:
+    return sorted(
+        filename for filename in os.listdir(parsed_dir) if filename.endswith(".json")
+    )
+
+
+def _file_stamp(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def build_lookup_index(
+    parsed_dir: str = PARSED_DIR, index_path: str = DEFAULT_INDEX_PATH
+) -> int:
+    """Scan the parsed JSON files once and write the sidecar. Returns the entity count."""
+    files: List[Tuple[str, int, int]] = []
+    records: Dict[int, Tuple[int, int, int]] = {}
+    for filename in _dataset_files(parsed_dir):
+        path = os.path.join(parsed_dir, filename)
+        size, mtime_ns = _file_stamp(path)
+        with open(path, "rb") as in_file:
+            raw = in_file.read()
+        file_number = len(files)
+        files.append((filename, size, mtime_ns))
+        for entity, offset, length in iter_entity_spans(raw):
+            if not isinstance(entity, dict):
+                break
+            entity_id = entity.get("id")
+            if isinstance(entity_id, int) and entity_id not in records:
+                records[entity_id] = (file_number, offset, length)
+
+    out = bytearray(HEADER.pack(MAGIC, FORMAT_VERSION, len(files), len(records)))
+    for filename, size, mtime_ns in files:
+        name = filename.encode("utf-8")
+        out += FILE_ENTRY.pack(size, mtime_ns, len(name)) + name
+    for entity_id in sorted(records):
+        out += RECORD.pack(entity_id, *records[entity_id])
+
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "wb") as out_file:
+        out_file.write(out)
+    os.replace(temp_path, index_path)
+    return len(records)
+
+
+class EntityLookup:
+    """Point lookups over parsed_json_files without loading whole datasets."""
+
+    def __init__(
+        self,
+        parsed_dir: str = PARSED_DIR,
+        index_path: str = DEFAULT_INDEX_PATH,
+        rebuild_stale: bool = True,
+    ) -> None:
+        self.parsed_dir = parsed_dir
+        self.index_path = index_path
+        self._data_maps: Dict[int, Tuple[BinaryIO, mmap.mmap]] = {}
+        if not self._open_index() or self._is_stale():
+            if not rebuild_stale:
+                raise ValueError(f"Lookup index {index_path} is missing or stale")
+            self._close_index()
+            build_lookup_index(parsed_dir, index_path)
+            self._open_index()
+
+    def _open_index(self) -> bool:
+        self._index_file: Optional[BinaryIO] = None
+        self._index: Optional[mmap.mmap] = None
+        self.files: List[Tuple[str, int, int]] = []
+        self._count = 0
+        if not os.path.exists(self.index_path) or os.path.getsize(self.index_path) == 0:
+            return False
+        self._index_file = open(self.index_path, "rb")
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, file_count, self._count = HEADER.unpack_from(self._index, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            return False
+        offset = HEADER.size
+        for _ in range(file_count):
+            size, mtime_ns, name_length = FILE_ENTRY.unpack_from(self._index, offset)
+            offset += FILE_ENTRY.size
+            name = self._index[offset:offset + name_length].decode("utf-8")
+            offset += name_length
+            self.files.append((name, size, mtime_ns))
+        self._records_offset = offset
+        return True
+
+    def _is_stale(self) -> bool:
+        names = [name for name, _, _ in self.files]
+        if names != _dataset_files(self.parsed_dir):
+            return True
+        return any(
+            _file_stamp(os.path.join(self.parsed_dir, name)) != (size, mtime_ns)
+            for name, size, mtime_ns in self.files
+        )
+
+    def _close_index(self) -> None:
+        if self._index is not None:
+            self._index.close()
+        if self._index_file is not None:
+            self._index_file.close()
+        self._index = None
+        self._index_file = None
+
+    def close(self) -> None:
+        for data_file, data_map in self._data_maps.values():
+            data_map.close()
+            data_file.close()
+        self._data_maps.clear()
+        self._close_index()
+
+    def __enter__(self) -> "EntityLookup":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, position: int) -> Tuple[int, int, int, int]:
+        return RECORD.unpack_from(self._index, self._records_offset + position * RECORD.size)
+
+    def _find(self, entity_id: int) -> Optional[Tuple[int, int, int, int]]:
+        position = bisect.bisect_left(
+            range(self._count), entity_id, key=lambda i: self._record(i)[0]
+        )
+        if position < self._count:
+            record = self._record(position)
+            if record[0] == entity_id:
+                return record
+        return None
+
+    def __contains__(self, entity_id: int) -> bool:
+        return self._find(entity_id) is not None
+
+    def ids(self) -> Iterator[int]:
+        for position in range(self._count):
+            yield self._record(position)[0]
+
+    def dataset(self, entity_id: int) -> Optional[str]:
+        record = self._find(entity_id)
+        if record is None:
+            return None
+        return os.path.splitext(self.files[record[1]][0])[0]
+
+    def _data_map(self, file_number: int) -> mmap.mmap:
+        entry = self._data_maps.get(file_number)
+        if entry is None:
+            path = os.path.join(self.parsed_dir, self.files[file_number][0])
+            data_file = open(path, "rb")
+            entry = (data_file, mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ))
+            self._data_maps[file_number] = entry
+        return entry[1]
+
+    def get(self, entity_id: int) -> Optional[Dict[str, Any]]:
+        record = self._find(entity_id)
+        if record is None:
+            return None
+        _, file_number, offset, length = record
+        data_map = self._data_map(file_number)
+        return json.loads(data_map[offset:offset + length])
+
+    def level(self, entity_id: int, level: int) -> Optional[Dict[str, Any]]:
+        entity = self.get(entity_id)
+        if entity is None:
+            return None
+        for row in entity.get("levels") or []:
+            if row.get("level") == level:
+                return row
+        return None
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Look up parsed entities by id.")
+    parser.add_argument("ids", nargs="*", type=int)
+    parser.add_argument("--level", type=int, help="print only this level of each entity")
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    parser.add_argument("--build", action="store_true", help="(re)build the sidecar index")
+    args = parser.parse_args(argv)
+
+    if args.build:
+        count = build_lookup_index(args.parsed_dir, args.index)
+        print(f"Indexed {count} entities in {args.index}")
+
+    if not args.ids:
+        return
+    with EntityLookup(args.parsed_dir, args.index) as lookup:
+        for entity_id in args.ids:
+            if args.level is not None:
+                result = lookup.level(entity_id, args.level)
+            else:
+                result = lookup.get(entity_id)
+            if result is None:
+                print(f"{entity_id}: not found")
+            else:
+                print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
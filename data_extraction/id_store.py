@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Persistent, stable ids for pipeline entities.
+
+Builders derive ids from row order (id_prefix * 1_000_000 + index), so a row
+inserted in the middle of a CSV would shift every later id. The store remembers
+the id handed out for each (id_prefix, internalName) and keeps returning it; an
+entity seen for the first time gets its row-derived id when that id is still
+free (so ids keep matching the game's export ids) and the next free id of its
+prefix otherwise.
+
+The store is seeded from the ids already recorded in json_maps, so adopting it
+does not renumber anything.
+"""
+import json
+import os
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+DATA_EXTRACTION_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_ID_STORE = os.path.join(DATA_EXTRACTION_DIR, "id_store.json")
+STORE_VERSION = 1
+
+# (store key, stable id, row-derived id)
+IdDrift = Tuple[str, int, int]
+
+
+class IdStore:
+    def __init__(self, ids: Optional[Dict[int, Dict[str, int]]] = None) -> None:
+        self.ids: Dict[int, Dict[str, int]] = ids or {}
+        self.changed = False
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_ID_STORE) -> "IdStore":
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as in_file:
+            data = json.load(in_file)
+        if data.get("version") != STORE_VERSION:
+            raise ValueError(f"Unsupported id store version in {path}")
+        return cls({
+            int(prefix): {name: int(value) for name, value in names.items()}
+            for prefix, names in data.get("ids", {}).items()
+        })
+
+    def has_prefix(self, prefix: int) -> bool:
+        return bool(self.ids.get(prefix))
+
+    def seed(self, prefix: int, map_data: Mapping[str, Any]) -> int:
+        """Adopt the ids already recorded in a json_maps file. Returns the count."""
+        known = self.ids.setdefault(prefix, {})
+        added = 0
+        for name, entry in map_data.items():
+            entity_id = entry.get("id") if isinstance(entry, dict) else None
+            if isinstance(entity_id, int) and name not in known:
+                known[name] = entity_id
+                added += 1
+        if added:
+            self.changed = True
+        return added
+
+    def assign(self, prefix: int, items: List[Dict[str, Any]]) -> List[IdDrift]:
+        """Replace row-derived ``id`` values in ``items`` with stable ids.
+
+        Returns the entities whose stable id no longer matches row order.
+        """
+        known = self.ids.setdefault(prefix, {})
+        used = set(known.values())
+        drift: List[IdDrift] = []
+        occurrences: Dict[str, int] = {}
+        for item in items:
+            if "id" not in item:
+                continue
+            name = item.get("internalName", "")
+            occurrences[name] = occurrences.get(name, 0) + 1
+            key = name if occurrences[name] == 1 else f"{name}#{occurrences[name]}"
+            row_id = item["id"]
+            stable = known.get(key)
+            if stable is None:
+                stable = row_id if row_id not in used else max(used) + 1
+                known[key] = stable
+                used.add(stable)
+                self.changed = True
+            elif stable != row_id:
+                drift.append((key, stable, row_id))
+            item["id"] = stable
+        return drift
+
+    def encode(self) -> bytes:
+        data = {
+            "version": STORE_VERSION,
+            "ids": {
+                str(prefix): dict(sorted(names.items(), key=lambda entry: entry[1]))
+                for prefix, names in sorted(self.ids.items())
+            },
+        }
+        return (json.dumps(data, indent=2, ensure_ascii=False) + "\n").encode("utf-8")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Per-locale display-name tables joined from the game's texts CSV.
+
+Every parsed entity keeps the `tid` of its name (TID_BUILDING_HOUSING, ...).
+This stage builds a tid -> entity ids table from the parsed datasets, streams
+the texts CSV (localization/texts.csv: a TID column, then one column per
+locale, with the usual types row) and keeps only the rows whose TID is
+referenced. It writes one compact table per locale, keyed by entity id:
+
+  strings/en.json  {"1000000":"Army Camp","1000001":"Town Hall",...}
+  strings/index.json  {"version":1,"default":"en","locales":{"en":498,...}}
+
+The app only needs to read index.json and the active locale's table. Empty
+cells are left out, so a lookup can fall back to the default locale.
+
+Run:
+  python3 data_extraction/localization.py texts.csv
+  python3 data_extraction/localization.py logic_dump/localization/texts.csv --raw-logic
+"""
+import argparse
+import csv
+import json
+import os
+from typing import Dict, Iterable, List, Optional, Sequence, TextIO, Tuple
+
+from logic_csv import open_logic_csv
+from upgrade_index import PARSED_DIR, WORKSPACE_ROOT
+
+STRINGS_DIR = os.path.join(WORKSPACE_ROOT, "clash_widgets", "upgrade_info", "strings")
+STRINGS_INDEX_NAME = "index.json"
+STRINGS_VERSION = 1
+DEFAULT_LOCALE = "en"
+TID_COLUMN = "TID"
+
+
+def collect_tids(parsed_dir: str = PARSED_DIR) -> Dict[str, List[int]]:
+    """tid -> ids of the parsed entities named by it."""
+    tids: Dict[str, List[int]] = {}
+    for filename in sorted(os.listdir(parsed_dir)):
+        if not filename.endswith(".json"):
+            continue
+        with open(os.path.join(parsed_dir, filename), "r", encoding="utf-8") as in_file:
+            data = json.load(in_file)
+        if not isinstance(data, list):
+            continue
+        for entity in data:
+            if not isinstance(entity, dict):
+                continue
+            tid, entity_id = entity.get("tid"), entity.get("id")
+            if tid and isinstance(entity_id, int):
+                tids.setdefault(tid, []).append(entity_id)
+    return tids
+
+
+def _open_texts(path: str, raw_logic: bool) -> TextIO:
+    if raw_logic:
+        return open_logic_csv(path)
+    return open(path, newline="", encoding="utf-8")
+
+
+def join_texts(
+    lines: Iterable[str], tids: Dict[str, List[int]]
+) -> Tuple[Dict[str, Dict[int, str]], int]:
+    """Hash-join one texts CSV against ``tids``.
+
+    Returns (locale -> entity id -> string, number of CSV rows read). Locale
+    column names are lower-cased; columns after TID count as locales.
+    """
+    reader = csv.reader(lines)
+    headers = next(reader, None) or []
+    if TID_COLUMN not in headers:
+        raise ValueError(f"Texts CSV has no {TID_COLUMN} column")
+    tid_column = headers.index(TID_COLUMN)
+    locales = [
+        (i, name.strip().lower())
+        for i, name in enumerate(headers)
+        if i != tid_column and name.strip()
+    ]
+    next(reader, None)  # types row
+
+    tables: Dict[str, Dict[int, str]] = {locale: {} for _, locale in locales}
+    rows = 0
+    for raw in reader:
+        rows += 1
+        if len(raw) <= tid_column:
+            continue
+        entity_ids = tids.get(raw[tid_column].strip())
+        if not entity_ids:
+            continue
+        for i, locale in locales:
+            text = raw[i].strip() if i < len(raw) else ""
+            if not text:
+                continue
+            table = tables[locale]
+            for entity_id in entity_ids:
+                table[entity_id] = text
+    return tables, rows
+
+
+def encode_table(table: Dict[int, str]) -> bytes:
+    payload = {str(entity_id): table[entity_id] for entity_id in sorted(table)}
+    return (json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def build_string_tables(
+    texts_paths: Sequence[str],
+    parsed_dir: str = PARSED_DIR,
+    raw_logic: bool = False,
+) -> Tuple[Dict[str, Dict[int, str]], Dict[str, List[int]], int]:
+    """Locale tables from every texts CSV (later files win per locale and
+    entity), the tid table they were joined against and the rows read."""
+    tids = collect_tids(parsed_dir)
+    tables: Dict[str, Dict[int, str]] = {}
+    rows = 0
+    for path in texts_paths:
+        with _open_texts(path, raw_logic) as texts_file:
+            file_tables, file_rows = join_texts(texts_file, tids)
+        rows += file_rows
+        for locale, table in file_tables.items():
+            tables.setdefault(locale, {}).update(table)
+    return tables, tids, rows
+
+
+def string_table_files(
+    tables: Dict[str, Dict[int, str]],
+    strings_dir: str = STRINGS_DIR,
+    default_locale: str = DEFAULT_LOCALE,
+) -> Dict[str, bytes]:
+    """path -> encoded bytes, ready for write_files_atomically."""
+    files = {
+        os.path.join(strings_dir, f"{locale}.json"): encode_table(table)
+        for locale, table in sorted(tables.items())
+        if table
+    }
+    index = {
+        "version": STRINGS_VERSION,
+        "default": default_locale,
+        "locales": {locale: len(table) for locale, table in sorted(tables.items()) if table},
+    }
+    files[os.path.join(strings_dir, STRINGS_INDEX_NAME)] = (
+        json.dumps(index, indent=2, ensure_ascii=False) + "\n"
+    ).encode("utf-8")
+    return files
+
+
+def unmatched_tids(tables: Dict[str, Dict[int, str]], tids: Dict[str, List[int]], locale: str) -> List[str]:
+    table = tables.get(locale, {})
+    return sorted(tid for tid, ids in tids.items() if not any(entity_id in table for entity_id in ids))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from clash_csv_to_json import write_files_atomically
+
+    parser = argparse.ArgumentParser(description="Join the texts CSV into per-locale name tables.")
+    parser.add_argument("texts", nargs="+", help="texts CSV(s) with a TID column and one column per locale")
+    parser.add_argument("--raw-logic", action="store_true", help="inputs are raw compressed game files")
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--strings-dir", default=STRINGS_DIR)
+    parser.add_argument("--default-locale", default=DEFAULT_LOCALE)
+    args = parser.parse_args(argv)
+
+    tables, tids, rows = build_string_tables(args.texts, args.parsed_dir, args.raw_logic)
+    if args.default_locale not in tables:
+        parser.error(f"No {args.default_locale!r} column in the texts CSV")
+    changed = write_files_atomically(string_table_files(tables, args.strings_dir, args.default_locale))
+    print(
+        f"Joined {len(tids)} tids against {rows} text rows into {len(tables)} locale(s);"
+        f" {len(changed)} file(s) changed"
+    )
+    missing = unmatched_tids(tables, tids, args.default_locale)
+    if missing:
+        print(f"No {args.default_locale} text for {len(missing)} tid(s): {', '.join(missing[:10])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Decodes raw Supercell `logic/*.csv` files in-process.
+
+Replaces the `dd`/`sce` round-trip in process_logic.sh: the signature header is
+skipped with a single seek, the payload is decompressed with the standard
+library, and the decoded text is handed straight to the CSV reader.
+
+Run:
+  python3 data_extraction/logic_csv.py logic --out processed_csvs
+"""
+import argparse
+import io
+import lzma
+import os
+import struct
+from typing import List, Optional, Sequence
+
+# "Sig:" followed by a 64 byte signature, prepended to every logic file.
+LOGIC_HEADER_SIZE = 68
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+def decompress_logic_payload(payload: bytes) -> bytes:
+    if payload[:1] == b'"':
+        # Already plain CSV (e.g. a file that was decoded before).
+        return payload
+
+    if payload[:4] == b"SCLZ":
+        raise ValueError("LZHAM-compressed logic files are not supported")
+
+    if payload[:2] == b"SC":
+        # SC container: version and hash length are big-endian uint32s,
+        # followed by the hash and the compressed stream.
+        hash_length = struct.unpack_from(">I", payload, 6)[0]
+        return decompress_logic_payload(payload[10 + hash_length:])
+
+    if payload[:4] == ZSTD_MAGIC:
+        try:
+            import zstandard
+        except ImportError as exc:
+            raise ValueError(
+                "zstd-compressed logic file; install the 'zstandard' package"
+            ) from exc
+        return zstandard.ZstdDecompressor().decompressobj().decompress(payload)
+
+    # Supercell LZMA: 5 byte properties and a 4 byte little-endian size where
+    # the .lzma format expects 8 bytes, so widen the size field.
+    if len(payload) < 9:
+        raise ValueError("Truncated logic file")
+    alone = payload[:9] + b"\x00\x00\x00\x00" + payload[9:]
+    return lzma.decompress(alone, format=lzma.FORMAT_ALONE)
+
+
+def read_logic_csv_bytes(path: str, header_size: int = LOGIC_HEADER_SIZE) -> bytes:
+    with open(path, "rb") as logic_file:
+        logic_file.seek(header_size)
+        payload = logic_file.read()
+    return decompress_logic_payload(payload)
+
+
+def read_logic_csv_text(path: str, header_size: int = LOGIC_HEADER_SIZE) -> str:
+    return read_logic_csv_bytes(path, header_size).decode("utf-8")
+
+
+def open_logic_csv(path: str, header_size: int = LOGIC_HEADER_SIZE) -> io.StringIO:
+    # newline="" keeps quoted line breaks intact for csv.reader.
+    return io.StringIO(read_logic_csv_text(path, header_size), newline="")
+
+
+def list_logic_csvs(source_dir: str) -> List[str]:
+    names = []
+    for filename in sorted(os.listdir(source_dir)):
+        if not filename.endswith(".csv"):
+            continue
+        if "_stripped" in filename or "_final" in filename:
+            continue
+        names.append(os.path.join(source_dir, filename))
+    return names
+
+
+def export_logic_csvs(
+    source_dir: str, target_dir: str, header_size: int = LOGIC_HEADER_SIZE
+) -> List[str]:
+    os.makedirs(target_dir, exist_ok=True)
+    written = []
+    for path in list_logic_csvs(source_dir):
+        print(f"Processing {os.path.basename(path)}...")
+        target_path = os.path.join(target_dir, os.path.basename(path))
+        with open(target_path, "wb") as out_file:
+            out_file.write(read_logic_csv_bytes(path, header_size))
+        written.append(target_path)
+    return written
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Decode raw Supercell logic CSVs into plain CSV files."
+    )
+    parser.add_argument("source_dir", nargs="?", default="logic")
+    parser.add_argument("--out", default="processed_csvs")
+    parser.add_argument("--header-size", type=int, default=LOGIC_HEADER_SIZE)
+    args = parser.parse_args(argv)
+
+    export_logic_csvs(args.source_dir, args.out, args.header_size)
+    print(f"Done. All flat files are in: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Ore spending planner for hero equipment.
+
+Reads data_extraction/equipment.json (built by clash_csv_to_json.py from
+json_files/equipment_data.json and json_files/ore_costs.csv, and gitignored
+since the app does not read it) and a player export's `equipment` levels, then
+picks how far to upgrade each owned item within an ore budget (current stock
+plus daily income over --days).
+
+Each item is a group of mutually exclusive options ("upgrade to level t"),
+because equipment levels are bought in order; the solver is a grouped bounded
+knapsack over three resources (shiny, glowy, starry). Costs are divided by
+their greatest common divisor per resource, so the DP table is small and the
+result exact. If the table would still exceed --max-states, the widest axis
+is coarsened with costs rounded up, so the plan stays within budget, and the
+ore that rounding left over is spent greedily; such plans are marked
+approximate. When every item's last option fits at once, no table is built.
+
+The objective is levels gained, weighted per item (--weight "Giant Gauntlet=3").
+Among optimal plans the one spending the least ore is returned.
+
+Run:
+  python3 data_extraction/ore_planner.py misc_files/sample.json --ore 20000 1500 200
+  python3 data_extraction/ore_planner.py clan_exports/ --income 1800 90 10 --days 7 --jobs 4
+"""
+import argparse
+import json
+import sys
+from functools import reduce
+from math import gcd
+from multiprocessing import Pool
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from analyze_exports import iter_export_sources, levels_by_id
+from upgrade_index import PARSED_DIR, derived_path
+
+EQUIPMENT_JSON_NAME = "equipment.json"
+ORE_KEYS = ("shinyOre", "glowyOre", "starryOre")
+DEFAULT_MAX_STATES = 50_000
+
+Ore = Tuple[int, int, int]
+# (target level, value, cost)
+Option = Tuple[int, int, Ore]
+
+
+class EquipmentTable:
+    def __init__(self, items: List[Dict[str, Any]]) -> None:
+        self.items: Dict[int, Dict[str, Any]] = {}
+        # id -> cumulative (shiny, glowy, starry) spent to reach each level
+        self.cumulative: Dict[int, List[Ore]] = {}
+        for item in items:
+            if "id" not in item:
+                continue
+            totals = [(0, 0, 0)]
+            for row in item["levels"]:
+                previous = totals[-1]
+                totals.append(tuple(previous[i] + (row.get(key) or 0) for i, key in enumerate(ORE_KEYS)))
+            self.items[item["id"]] = item
+            self.cumulative[item["id"]] = totals
+        self.ids_by_name = {item["internalName"].lower(): entity_id for entity_id, item in self.items.items()}
+
+    @classmethod
+    def load(cls, parsed_dir: str = PARSED_DIR) -> "EquipmentTable":
+        with open(derived_path(EQUIPMENT_JSON_NAME, parsed_dir), "r", encoding="utf-8") as in_file:
+            return cls(json.load(in_file))
+
+    def max_level(self, entity_id: int) -> int:
+        return len(self.cumulative[entity_id]) - 1
+
+    def cost_between(self, entity_id: int, from_level: int, to_level: int) -> Ore:
+        totals = self.cumulative[entity_id]
+        a, b = totals[from_level], totals[to_level]
+        return b[0] - a[0], b[1] - a[1], b[2] - a[2]
+
+
+def upgrade_options(
+    table: EquipmentTable, levels: Dict[int, int], budget: Ore, weights: Dict[int, int]
+) -> Dict[int, List[Option]]:
+    """Affordable targets per owned item, cheapest first."""
+    groups: Dict[int, List[Option]] = {}
+    for entity_id, current in levels.items():
+        if entity_id not in table.items:
+            continue
+        weight = weights.get(entity_id, 1)
+        options: List[Option] = []
+        for target in range(current + 1, table.max_level(entity_id) + 1):
+            cost = table.cost_between(entity_id, current, target)
+            if any(cost[i] > budget[i] for i in range(3)):
+                break
+            options.append((target, weight * (target - current), cost))
+        if options and weight > 0:
+            groups[entity_id] = options
+    return groups
+
+
+def _axis_units(
+    groups: Dict[int, List[Option]], capacity: Ore, max_states: int
+) -> Tuple[List[int], bool]:
+    units = []
+    for axis in range(3):
+        costs = [cost[axis] for options in groups.values() for _, _, cost in options if cost[axis]]
+        # an axis nothing costs collapses to a single cell
+        units.append(reduce(gcd, costs) if costs else capacity[axis] + 1)
+    approximate = False
+    cells = [capacity[axis] // units[axis] + 1 for axis in range(3)]
+    while cells[0] * cells[1] * cells[2] > max_states:
+        axis = cells.index(max(cells))
+        units[axis] *= 2
+        cells[axis] = capacity[axis] // units[axis] + 1
+        approximate = True
+    return units, approximate
+
+
+def _fill(
+    groups: Dict[int, List[Option]], choices: Dict[int, Option], budget: Ore
+) -> Dict[int, Option]:
+    """Spend what coarsening left over, one next option at a time (best value
+    per share of the remaining budget first)."""
+    left = [budget[axis] - sum(option[2][axis] for option in choices.values()) for axis in range(3)]
+    while True:
+        best_step = None
+        for entity_id, options in groups.items():
+            chosen = choices.get(entity_id)
+            position = options.index(chosen) + 1 if chosen else 0
+            if position >= len(options):
+                continue
+            option = options[position]
+            extra = [option[2][axis] - (chosen[2][axis] if chosen else 0) for axis in range(3)]
+            if any(extra[axis] > left[axis] for axis in range(3)):
+                continue
+            gain = option[1] - (chosen[1] if chosen else 0)
+            share = sum(extra[axis] / budget[axis] for axis in range(3) if budget[axis])
+            score = gain / share if share else float("inf")
+            if best_step is None or score > best_step[0]:
+                best_step = (score, entity_id, option, extra)
+        if best_step is None:
+            return choices
+        _, entity_id, option, extra = best_step
+        choices[entity_id] = option
+        left = [left[axis] - extra[axis] for axis in range(3)]
+
+
+def solve(
+    groups: Dict[int, List[Option]], budget: Ore, max_states: int = DEFAULT_MAX_STATES
+) -> Tuple[Dict[int, Option], bool]:
+    """Best option per group under ``budget``; returns (choices, approximate)."""
+    if not groups:
+        return {}, False
+    # no plan can spend more than every group's most expensive option
+    capacity = tuple(
+        min(budget[axis], sum(options[-1][2][axis] for options in groups.values()))
+        for axis in range(3)
+    )
+    if capacity == tuple(sum(options[-1][2][axis] for options in groups.values()) for axis in range(3)):
+        return {entity_id: options[-1] for entity_id, options in groups.items()}, False
+    units, approximate = _axis_units(groups, capacity, max_states)
+    shape = tuple(capacity[axis] // units[axis] + 1 for axis in range(3))
+
+    def scaled(cost: Ore) -> Tuple[int, int, int]:
+        # ceil, so coarsened costs never understate the real cost
+        return tuple(-(-cost[axis] // units[axis]) for axis in range(3))
+
+    best = np.zeros(shape, dtype=np.int32)
+    order = sorted(groups)
+    picks: List[np.ndarray] = []
+    for entity_id in order:
+        current = best.copy()
+        pick = np.zeros(shape, dtype=np.int8)
+        for k, (_, value, cost) in enumerate(groups[entity_id], start=1):
+            a, b, c = scaled(cost)
+            if a >= shape[0] or b >= shape[1] or c >= shape[2]:
+                break
+            candidate = best[: shape[0] - a, : shape[1] - b, : shape[2] - c] + value
+            target = current[a:, b:, c:]
+            better = candidate > target
+            np.copyto(target, candidate, where=better)
+            np.copyto(pick[a:, b:, c:], k, where=better)
+        best = current
+        picks.append(pick)
+
+    optimum = best[-1, -1, -1]
+    if optimum == 0:
+        return {}, approximate
+    # cheapest state reaching the optimum, spend measured relative to capacity
+    candidates = np.argwhere(best == optimum)
+    spend = (candidates / np.maximum(np.array(shape) - 1, 1)).sum(axis=1)
+    state = [int(v) for v in candidates[int(spend.argmin())]]
+
+    choices: Dict[int, Option] = {}
+    for entity_id, pick in zip(reversed(order), reversed(picks)):
+        k = int(pick[tuple(state)])
+        if not k:
+            continue
+        option = groups[entity_id][k - 1]
+        choices[entity_id] = option
+        for axis, amount in enumerate(scaled(option[2])):
+            state[axis] -= amount
+    if approximate:
+        choices = _fill(groups, choices, budget)
+    return choices, approximate
+
+
+def plan_export(
+    export: Dict[str, Any],
+    table: EquipmentTable,
+    budget: Ore,
+    weights: Optional[Dict[int, int]] = None,
+    max_states: int = DEFAULT_MAX_STATES,
+) -> Dict[str, Any]:
+    levels = levels_by_id(export.get("equipment") or [])
+    groups = upgrade_options(table, levels, budget, weights or {})
+    choices, approximate = solve(groups, budget, max_states)
+
+    steps = []
+    spent = [0, 0, 0]
+    for entity_id, (target, value, cost) in choices.items():
+        item = table.items[entity_id]
+        steps.append({
+            "id": entity_id,
+            "name": item["internalName"],
+            "hero": item["hero"],
+            "from": levels[entity_id],
+            "to": target,
+            "ore": dict(zip(ORE_KEYS, cost)),
+        })
+        spent = [spent[i] + cost[i] for i in range(3)]
+    steps.sort(key=lambda step: (step["hero"], step["name"]))
+    return {
+        "tag": export.get("tag", ""),
+        "budget": dict(zip(ORE_KEYS, budget)),
+        "spent": dict(zip(ORE_KEYS, spent)),
+        "levelsGained": sum(step["to"] - step["from"] for step in steps),
+        "approximate": approximate,
+        "steps": steps,
+        "unknownEquipment": sorted(entity_id for entity_id in levels if entity_id not in table.items),
+    }
+
+
+_WORKER_STATE: Optional[Tuple[EquipmentTable, Ore, Dict[str, int], int]] = None
+
+
+def _init_worker(parsed_dir: str, budget: Ore, weights: Dict[str, int], max_states: int) -> None:
+    global _WORKER_STATE
+    _WORKER_STATE = (EquipmentTable.load(parsed_dir), budget, weights, max_states)
+
+
+def _plan_source(source: Tuple[str, str]) -> Dict[str, Any]:
+    label, raw = source
+    assert _WORKER_STATE is not None
+    table, budget, named_weights, max_states = _WORKER_STATE
+    weights = {
+        table.ids_by_name[name]: weight
+        for name, weight in named_weights.items()
+        if name in table.ids_by_name
+    }
+    try:
+        row = plan_export(json.loads(raw), table, budget, weights, max_states)
+    except (ValueError, KeyError, TypeError, AttributeError) as exc:
+        row = {"error": f"{type(exc).__name__}: {exc}"}
+    row["source"] = label
+    return row
+
+
+def plan_exports(
+    paths: Sequence[str],
+    budget: Ore,
+    weights: Optional[Dict[str, int]] = None,
+    parsed_dir: str = PARSED_DIR,
+    jobs: int = 1,
+    max_states: int = DEFAULT_MAX_STATES,
+) -> Iterator[Dict[str, Any]]:
+    """One plan per export; ``weights`` maps lower-cased item names to weights."""
+    sources = iter_export_sources(paths)
+    initargs = (parsed_dir, budget, weights or {}, max_states)
+    if jobs <= 1:
+        _init_worker(*initargs)
+        yield from map(_plan_source, sources)
+        return
+    with Pool(jobs, initializer=_init_worker, initargs=initargs) as pool:
+        yield from pool.imap(_plan_source, sources, chunksize=16)
+
+
+def _parse_weight(text: str) -> Tuple[str, int]:
+    name, _, weight = text.rpartition("=")
+    if not name:
+        raise argparse.ArgumentTypeError(f"Expected NAME=WEIGHT, got {text!r}")
+    return name.strip().lower(), int(weight)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Plan hero equipment upgrades within an ore budget.")
+    parser.add_argument("paths", nargs="+", help="export files, directories or .jsonl files")
+    parser.add_argument("--ore", nargs=3, type=int, default=(0, 0, 0), metavar=("SHINY", "GLOWY", "STARRY"),
+                        help="ore in stock")
+    parser.add_argument("--income", nargs=3, type=int, default=(0, 0, 0), metavar=("SHINY", "GLOWY", "STARRY"),
+                        help="ore earned per day")
+    parser.add_argument("--days", type=int, default=0, help="days of income to plan ahead")
+    parser.add_argument("--weight", action="append", type=_parse_weight, default=[],
+                        help="value per level of an item, as NAME=WEIGHT (default 1; 0 skips it)")
+    parser.add_argument("--max-states", type=int, default=DEFAULT_MAX_STATES)
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--format", choices=("text", "jsonl"), default="text")
+    args = parser.parse_args(argv)
+
+    budget = tuple(args.ore[i] + args.income[i] * args.days for i in range(3))
+    plans = plan_exports(args.paths, budget, dict(args.weight), args.parsed_dir, args.jobs, args.max_states)
+    for plan in plans:
+        if args.format == "jsonl":
+            sys.stdout.write(json.dumps(plan, ensure_ascii=False) + "\n")
+            continue
+        if "error" in plan:
+            print(f"{plan['source']}: {plan['error']}")
+            continue
+        spent = plan["spent"]
+        print(
+            f"{plan['tag'] or plan['source']}: +{plan['levelsGained']} levels for"
+            f" {spent['shinyOre']} shiny, {spent['glowyOre']} glowy, {spent['starryOre']} starry"
+            + (" (approximate)" if plan["approximate"] else "")
+        )
+        for step in plan["steps"]:
+            ore = step["ore"]
+            print(
+                f"  {step['hero']:<16} {step['name']:<22} {step['from']:>2} -> {step['to']:<2}"
+                f" {ore['shinyOre']:>6} {ore['glowyOre']:>5} {ore['starryOre']:>4}"
+            )
+        if plan["unknownEquipment"]:
+            print(f"  not in equipment_data.json: {', '.join(map(str, plan['unknownEquipment']))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Structured deltas between two snapshots of the game data.
+
+A snapshot is either a folder of extracted logic CSVs (extraxted_data/) or a
+folder of parsed JSON files (parsed_json_files/). CSV snapshots are built with
+the same DatasetSpecs as clash_csv_to_json.py and get their ids from the id
+store, so both kinds compare equal when they describe the same data.
+
+Entities are joined by internalName (townhall_levels by townHallLevel) and
+levels by their level number, through dicts on both sides, so a diff is one
+pass over each table. Repeated keys get a "#n" suffix, as in the id store.
+
+Delta layout (per dataset, empty parts omitted):
+  {"added": [[position, entity], ...],
+   "removed": [key, ...],
+   "changed": {key: entity diff},
+   "order": [key, ...]}           # only when kept items were reordered
+An entity diff is a field diff whose "levels" entry is itself a list delta:
+  {"changed": {field: [old, new]}, "added": {field: new},
+   "removed": [field, ...], "nested": {field: field diff},
+   "levels": list delta}
+Changed fields keep their old value, so deltas double as patch notes and
+apply_delta can check that it is patching the snapshot the delta came from.
+
+Run:
+  python3 data_extraction/patch_delta.py diff OLD_DIR NEW_DIR --output delta.json
+  python3 data_extraction/patch_delta.py notes delta.json
+  python3 data_extraction/patch_delta.py apply delta.json BASE_DIR --output-dir OUT
+"""
+import argparse
+import copy
+import json
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from clash_csv_to_json import (
+    DATASETS,
+    DatasetSpec,
+    build_dataset,
+    encode_json,
+    write_json_if_changed,
+)
+from id_store import DEFAULT_ID_STORE, IdStore
+
+DELTA_VERSION = 1
+SPECS = {spec.name: spec for spec in DATASETS}
+LEVELS_FIELD = "levels"
+
+Item = Dict[str, Any]
+Snapshot = Dict[str, List[Item]]
+
+
+def load_snapshot(
+    path: str,
+    datasets: Optional[Sequence[str]] = None,
+    raw_logic: bool = False,
+    id_store_path: Optional[str] = DEFAULT_ID_STORE,
+) -> Snapshot:
+    """Datasets of a CSV or parsed JSON folder; missing datasets are skipped."""
+    store = IdStore.load(id_store_path) if id_store_path else None
+    snapshot: Snapshot = {}
+    for spec in DATASETS:
+        if datasets and spec.name not in datasets:
+            continue
+        json_path = os.path.join(path, spec.output_name)
+        if os.path.exists(os.path.join(path, spec.csv_name)):
+            items = build_dataset(spec, path, raw_logic)
+            if store is not None and spec.id_prefix is not None:
+                store.assign(spec.id_prefix, items)
+        elif os.path.exists(json_path):
+            with open(json_path, "r", encoding="utf-8") as in_file:
+                items = json.load(in_file)
+        else:
+            continue
+        snapshot[spec.name] = items
+    return snapshot
+
+
+def entity_key(item: Item) -> str:
+    if "internalName" in item:
+        return str(item["internalName"])
+    if "townHallLevel" in item:
+        return str(item["townHallLevel"])
+    return str(item.get("id", ""))
+
+
+def level_key(level: Item) -> str:
+    return str(level.get("level", ""))
+
+
+def index_items(items: List[Item], key: Callable[[Item], str]) -> Dict[str, Item]:
+    """Items by key; the n-th repeat of a key is stored as "key#n"."""
+    index: Dict[str, Item] = {}
+    occurrences: Dict[str, int] = {}
+    for item in items:
+        name = key(item)
+        occurrences[name] = occurrences.get(name, 0) + 1
+        index[name if occurrences[name] == 1 else f"{name}#{occurrences[name]}"] = item
+    return index
+
+
+def diff_fields(old: Item, new: Item, skip: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    changed: Dict[str, List[Any]] = {}
+    nested: Dict[str, Any] = {}
+    added: Dict[str, Any] = {}
+    for field, value in new.items():
+        if field in skip:
+            continue
+        if field not in old:
+            added[field] = value
+            continue
+        previous = old[field]
+        if previous == value:
+            continue
+        if isinstance(previous, dict) and isinstance(value, dict):
+            nested[field] = diff_fields(previous, value)
+        else:
+            changed[field] = [previous, value]
+    removed = [field for field in old if field not in new and field not in skip]
+
+    diff: Dict[str, Any] = {}
+    if changed:
+        diff["changed"] = changed
+    if nested:
+        diff["nested"] = nested
+    if added:
+        diff["added"] = added
+    if removed:
+        diff["removed"] = removed
+    return diff
+
+
+def diff_entity(old: Item, new: Item) -> Dict[str, Any]:
+    diff = diff_fields(old, new, skip=(LEVELS_FIELD,))
+    old_levels = old.get(LEVELS_FIELD)
+    new_levels = new.get(LEVELS_FIELD)
+    if isinstance(old_levels, list) and isinstance(new_levels, list):
+        levels = diff_items(old_levels, new_levels, level_key, diff_fields)
+        if levels:
+            diff[LEVELS_FIELD] = levels
+    elif old_levels != new_levels:
+        if LEVELS_FIELD not in new:
+            diff.setdefault("removed", []).append(LEVELS_FIELD)
+        elif LEVELS_FIELD not in old:
+            diff.setdefault("added", {})[LEVELS_FIELD] = new_levels
+        else:
+            diff.setdefault("changed", {})[LEVELS_FIELD] = [old_levels, new_levels]
+    return diff
+
+
+def diff_items(
+    old_items: List[Item],
+    new_items: List[Item],
+    key: Callable[[Item], str],
+    diff_item: Callable[[Item, Item], Dict[str, Any]],
+) -> Dict[str, Any]:
+    """List delta joining both sides by key; linear in the size of both lists."""
+    old_index = index_items(old_items, key)
+    new_index = index_items(new_items, key)
+
+    added: List[List[Any]] = []
+    changed: Dict[str, Any] = {}
+    kept_order: List[str] = []
+    for position, (name, item) in enumerate(new_index.items()):
+        previous = old_index.get(name)
+        if previous is None:
+            added.append([position, item])
+            continue
+        kept_order.append(name)
+        if previous != item:
+            item_diff = diff_item(previous, item)
+            if item_diff:
+                changed[name] = item_diff
+    removed = [name for name in old_index if name not in new_index]
+
+    delta: Dict[str, Any] = {}
+    if added:
+        delta["added"] = added
+    if removed:
+        delta["removed"] = removed
+    if changed:
+        delta["changed"] = changed
+    if kept_order != [name for name in old_index if name in new_index]:
+        delta["order"] = kept_order
+    return delta
+
+
+def diff_snapshots(old: Snapshot, new: Snapshot) -> Dict[str, Any]:
+    datasets: Dict[str, Any] = {}
+    for name in sorted(old.keys() | new.keys()):
+        delta = diff_items(old.get(name, []), new.get(name, []), entity_key, diff_entity)
+        if delta:
+            datasets[name] = delta
+    return {"version": DELTA_VERSION, "datasets": datasets}
+
+
+def _patch_error(path: str, message: str) -> ValueError:
+    return ValueError(f"Delta does not apply at {path}: {message}")
+
+
+def apply_fields(item: Item, diff: Dict[str, Any], path: str, strict: bool) -> Item:
+    patched = dict(item)
+    for field, (previous, value) in diff.get("changed", {}).items():
+        if strict and patched.get(field) != previous:
+            raise _patch_error(f"{path}.{field}", f"expected {previous!r}, found {patched.get(field)!r}")
+        patched[field] = value
+    for field, field_diff in diff.get("nested", {}).items():
+        current = patched.get(field)
+        if not isinstance(current, dict):
+            raise _patch_error(f"{path}.{field}", "expected an object")
+        patched[field] = apply_fields(current, field_diff, f"{path}.{field}", strict)
+    for field in diff.get("removed", []):
+        if strict and field not in patched:
+            raise _patch_error(f"{path}.{field}", "field to remove is missing")
+        patched.pop(field, None)
+    for field, value in diff.get("added", {}).items():
+        patched[field] = value
+    return patched
+
+
+def apply_entity(item: Item, diff: Dict[str, Any], path: str, strict: bool) -> Item:
+    patched = apply_fields(item, diff, path, strict)
+    if LEVELS_FIELD in diff:
+        patched[LEVELS_FIELD] = apply_items(
+            item.get(LEVELS_FIELD) or [], diff[LEVELS_FIELD], level_key,
+            apply_fields, f"{path}.{LEVELS_FIELD}", strict,
+        )
+    return patched
+
+
+def apply_items(
+    items: List[Item],
+    delta: Dict[str, Any],
+    key: Callable[[Item], str],
+    apply_item: Callable[[Item, Dict[str, Any], str, bool], Item],
+    path: str,
+    strict: bool,
+) -> List[Item]:
+    index = index_items(items, key)
+    removed = set(delta.get("removed", []))
+    changed = delta.get("changed", {})
+    missing = (removed | changed.keys()) - index.keys()
+    if missing:
+        raise _patch_error(path, f"unknown keys {sorted(missing)}")
+
+    kept_names = delta.get("order") or [name for name in index if name not in removed]
+    kept: List[Item] = []
+    for name in kept_names:
+        item = index.get(name)
+        if item is None:
+            raise _patch_error(path, f"unknown key {name!r} in order")
+        if name in changed:
+            item = apply_item(item, changed[name], f"{path}[{name}]", strict)
+        kept.append(item)
+
+    # Merge added items back in at their target positions.
+    result: List[Item] = []
+    kept_iter = iter(kept)
+    for position, item in delta.get("added", []):
+        while len(result) < position:
+            result.append(next(kept_iter))
+        result.append(copy.deepcopy(item))
+    result.extend(kept_iter)
+    return result
+
+
+def apply_delta(base: Snapshot, delta: Dict[str, Any], strict: bool = True) -> Snapshot:
+    """Return ``base`` patched by ``delta``; ``base`` itself is not modified.
+
+    With ``strict`` every changed field must still hold the value the delta
+    recorded as old, so a delta applied to the wrong snapshot fails loudly.
+    """
+    if delta.get("version") != DELTA_VERSION:
+        raise ValueError(f"Unsupported delta version {delta.get('version')!r}")
+    patched = dict(base)
+    for name, dataset_delta in delta.get("datasets", {}).items():
+        patched[name] = apply_items(
+            base.get(name, []), dataset_delta, entity_key, apply_entity, name, strict
+        )
+    return patched
+
+
+def _format_value(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _field_notes(prefix: str, diff: Dict[str, Any]) -> Iterator[str]:
+    for field, (previous, value) in diff.get("changed", {}).items():
+        yield f"{prefix} {field}: {_format_value(previous)} -> {_format_value(value)}"
+    for field, field_diff in diff.get("nested", {}).items():
+        yield from _field_notes(f"{prefix} {field}", field_diff)
+    for field, value in diff.get("added", {}).items():
+        yield f"{prefix} {field}: new {_format_value(value)}"
+    for field in diff.get("removed", []):
+        yield f"{prefix} {field}: removed"
+
+
+def iter_change_notes(delta: Dict[str, Any]) -> Iterator[str]:
+    """Human-readable "what changed in this patch" lines."""
+    for dataset, dataset_delta in delta.get("datasets", {}).items():
+        for _, entity in dataset_delta.get("added", []):
+            levels = entity.get(LEVELS_FIELD) or []
+            suffix = f" ({len(levels)} levels)" if levels else ""
+            yield f"{dataset}: new {entity_key(entity)}{suffix}"
+        for name in dataset_delta.get("removed", []):
+            yield f"{dataset}: removed {name}"
+        for name, diff in dataset_delta.get("changed", {}).items():
+            prefix = f"{dataset}: {name}"
+            yield from _field_notes(prefix, diff)
+            levels = diff.get(LEVELS_FIELD, {})
+            added_levels = [level_key(level) for _, level in levels.get("added", [])]
+            if added_levels:
+                yield f"{prefix} new levels {', '.join(added_levels)}"
+            if levels.get("removed"):
+                yield f"{prefix} removed levels {', '.join(levels['removed'])}"
+            for level, level_diff in levels.get("changed", {}).items():
+                yield from _field_notes(f"{prefix} level {level}", level_diff)
+        if "order" in dataset_delta:
+            yield f"{dataset}: entities reordered"
+
+
+def _read_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as in_file:
+        return json.load(in_file)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Diff and patch game data snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    diff_parser = commands.add_parser("diff", help="write the delta between two snapshots")
+    diff_parser.add_argument("old", help="extracted CSV or parsed JSON folder")
+    diff_parser.add_argument("new", help="extracted CSV or parsed JSON folder")
+    diff_parser.add_argument("--output", help="write the delta here instead of stdout")
+    diff_parser.add_argument("--notes", action="store_true", help="also print change notes")
+
+    notes_parser = commands.add_parser("notes", help="print the changes recorded in a delta")
+    notes_parser.add_argument("delta")
+
+    apply_parser = commands.add_parser("apply", help="patch a snapshot with a delta")
+    apply_parser.add_argument("delta")
+    apply_parser.add_argument("base", help="extracted CSV or parsed JSON folder")
+    apply_parser.add_argument("--output-dir", required=True, help="where to write the parsed JSON")
+    apply_parser.add_argument("--no-strict", action="store_true", help="skip old-value checks")
+
+    for sub in (diff_parser, apply_parser):
+        sub.add_argument("--datasets", nargs="+", choices=sorted(SPECS))
+        sub.add_argument("--raw-logic", action="store_true", help="CSV snapshots are compressed logic files")
+        sub.add_argument("--id-store", default=DEFAULT_ID_STORE, help="stable ids for CSV snapshots")
+    args = parser.parse_args(argv)
+
+    if args.command == "notes":
+        for line in iter_change_notes(_read_json(args.delta)):
+            print(line)
+        return
+
+    def load(path: str) -> Snapshot:
+        return load_snapshot(path, args.datasets, args.raw_logic, args.id_store)
+
+    if args.command == "diff":
+        delta = diff_snapshots(load(args.old), load(args.new))
+        if args.output:
+            write_json_if_changed(args.output, delta)
+            print(f"Wrote delta for {len(delta['datasets'])} dataset(s) to {args.output}")
+        else:
+            print(encode_json(delta).decode("utf-8"), end="")
+        if args.notes:
+            for line in iter_change_notes(delta):
+                print(line)
+        return
+
+    patched = apply_delta(load(args.base), _read_json(args.delta), strict=not args.no_strict)
+    os.makedirs(args.output_dir, exist_ok=True)
+    for name, items in patched.items():
+        spec: DatasetSpec = SPECS[name]
+        if write_json_if_changed(os.path.join(args.output_dir, spec.output_name), items):
+            print(f"Wrote {spec.output_name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the CSV -> JSON pipeline on synthetic logic CSVs.
+
+The generator clones the entity blocks of a real extracted CSV (header, types
+row, the Name row and its blank-name continuation rows, original cell values
+and column widths) `scale` times with unique names. townhall_levels.csv is
+scaled in width instead, by repeating its count columns, since that table
+grows by columns when the game adds buildings or heroes.
+
+Every stage is timed as the median of --repeat samples, each sample looping
+the stage until it has run for at least MIN_SAMPLE_SECONDS so that fast
+stages are not timed at timer-noise scale, and then run once more under
+tracemalloc for its peak allocation. Results can be saved as a baseline and
+later runs checked against it. Machine speed drifts between runs (2x is
+common on shared hosts), so every stage is also timed against a fixed
+calibration workload run right before and after it, and --check compares
+that relative cost and the peak allocation, not raw seconds. A baseline
+stores the median of several timings per stage and --check re-times a stage
+that looks slower before reporting it.
+
+Run:
+  python3 data_extraction/pipeline_benchmark.py --scales 1 10 100
+  python3 data_extraction/pipeline_benchmark.py --save-baseline
+  python3 data_extraction/pipeline_benchmark.py --check
+"""
+import argparse
+import csv
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from clash_csv_to_json import (
+    DATASETS,
+    EXTRACTED_DIR,
+    build_rows,
+    encode_json,
+    iter_csv_rows,
+    read_csv_rows,
+    write_json_if_changed,
+)
+from compact_tables import encode_compact
+
+DATA_EXTRACTION_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(DATA_EXTRACTION_DIR, "benchmark_baselines.json")
+DEFAULT_SCALES = (1, 10, 100)
+DEFAULT_REPEAT = 5
+# a timed sample loops a stage until it has run this long
+MIN_SAMPLE_SECONDS = 0.05
+# stop sampling a slow stage early once this much time went into it
+MAX_STAGE_SECONDS = 5.0
+# --save-baseline stores the median of this many timings per stage
+BASELINE_ATTEMPTS = 3
+# --check re-times a stage that looks slower up to this many times
+CONFIRM_ATTEMPTS = 2
+SPECS = {spec.name: spec for spec in DATASETS}
+BENCH_DATASETS = ("characters", "buildings", "townhall_levels")
+
+
+def _read_template(path: str) -> Tuple[List[str], List[str], List[List[List[str]]]]:
+    """Header, types row and entity blocks (Name row plus continuation rows)."""
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        reader = csv.reader(csv_file)
+        headers = next(reader)
+        types = next(reader)
+        blocks: List[List[List[str]]] = []
+        for row in reader:
+            if not row:
+                continue
+            if row[0].strip() or not blocks:
+                blocks.append([])
+            blocks[-1].append(row)
+    return headers, types, blocks
+
+
+def generate_logic_csv(template_path: str, output_path: str, scale: int) -> int:
+    """Write a synthetic CSV `scale` times the size of the template; returns data rows."""
+    headers, types, blocks = _read_template(template_path)
+    rows = 0
+    with open(output_path, "w", newline="", encoding="utf-8") as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(headers)
+        writer.writerow(types)
+        for copy in range(scale):
+            for block in blocks:
+                for position, row in enumerate(block):
+                    if position == 0 and copy and row[0].strip():
+                        row = [f"{row[0]}{copy}", *row[1:]]
+                    writer.writerow(row)
+                    rows += 1
+    return rows
+
+
+def generate_townhall_csv(template_path: str, output_path: str, scale: int) -> int:
+    """Widen townhall_levels.csv by repeating its count columns `scale` times."""
+    headers, types, blocks = _read_template(template_path)
+    start = headers.index("Troop Housing")
+    extra = list(range(start, len(headers)))
+
+    def widen(row: List[str], rename: bool) -> List[str]:
+        padded = row + [""] * (len(headers) - len(row))
+        output = list(padded)
+        for copy in range(1, scale):
+            output.extend(
+                f"{padded[i]}{copy}" if rename else padded[i] for i in extra
+            )
+        return output
+
+    rows = 0
+    with open(output_path, "w", newline="", encoding="utf-8") as out_file:
+        writer = csv.writer(out_file)
+        writer.writerow(widen(headers, True))
+        writer.writerow(widen(types, False))
+        for block in blocks:
+            for row in block:
+                writer.writerow(widen(row, False))
+                rows += 1
+    return rows
+
+
+def generate_dataset(name: str, input_dir: str, output_dir: str, scale: int) -> Tuple[str, int]:
+    template = os.path.join(input_dir, f"{name}.csv")
+    output_path = os.path.join(output_dir, f"{name}_{scale}x.csv")
+    if name == "townhall_levels":
+        rows = generate_townhall_csv(template, output_path, scale)
+    else:
+        rows = generate_logic_csv(template, output_path, scale)
+    return output_path, rows
+
+
+def _stages(name: str, csv_path: str, out_dir: str) -> List[Tuple[str, Callable[[], Any]]]:
+    spec = SPECS[name]
+
+    def read() -> int:
+        with open(csv_path, newline="", encoding="utf-8") as csv_file:
+            _, rows = iter_csv_rows(csv_file, spec.columns)
+            return sum(1 for _ in rows)
+
+    def read_dicts() -> int:
+        return len(read_csv_rows(csv_path))
+
+    def read_build() -> List[Dict[str, Any]]:
+        with open(csv_path, newline="", encoding="utf-8") as csv_file:
+            headers, rows = iter_csv_rows(csv_file, spec.columns)
+            return build_rows(spec, rows, headers)
+
+    items = read_build()
+    json_path = os.path.join(out_dir, f"{name}.json")
+
+    def write_json() -> bool:
+        if os.path.exists(json_path):
+            os.remove(json_path)
+        return write_json_if_changed(json_path, items)
+
+    return [
+        ("read", read),
+        ("read_dicts", read_dicts),
+        ("read_build", read_build),
+        ("encode_json", lambda: encode_json(items)),
+        ("write_json", write_json),
+        ("encode_compact", lambda: encode_compact(items)),
+    ]
+
+
+def time_stage(stage: Callable[[], Any], repeat: int) -> float:
+    """Median seconds per call over `repeat` samples of at least
+    MIN_SAMPLE_SECONDS each (fewer once MAX_STAGE_SECONDS have been spent)."""
+    gc.collect()
+    started = time.perf_counter()
+    stage()
+    first = time.perf_counter() - started
+    loops = max(1, int(MIN_SAMPLE_SECONDS / first) + 1) if first < MIN_SAMPLE_SECONDS else 1
+    samples: List[float] = []
+    spent = first
+    while len(samples) < max(repeat, 1) and (len(samples) < 2 or spent < MAX_STAGE_SECONDS):
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(loops):
+            stage()
+        elapsed = time.perf_counter() - started
+        spent += elapsed
+        samples.append(elapsed / loops)
+    return statistics.median(samples)
+
+
+def calibration_workload() -> Callable[[], Any]:
+    """Fixed CSV parsing and JSON encoding, independent of the repo's code: a
+    yardstick for how fast the machine is right now."""
+    lines = [",".join(f"cell{row}_{column}" for column in range(40)) for row in range(2000)]
+    records = [
+        {"level": i, "name": f"n{i}", "cost": i * 7, "flags": [True, None]} for i in range(2000)
+    ]
+
+    def work() -> int:
+        return sum(1 for _ in csv.reader(lines)) + len(json.dumps(records))
+
+    return work
+
+
+def relative_time(
+    stage: Callable[[], Any], calibrate: Callable[[], Any], repeat: int
+) -> Tuple[float, float]:
+    """(seconds per call, calibration seconds) with the calibration timed
+    right before and after the stage."""
+    before = time_stage(calibrate, repeat)
+    seconds = time_stage(stage, repeat)
+    after = time_stage(calibrate, repeat)
+    return seconds, (before + after) / 2
+
+
+def measure(
+    stage: Callable[[], Any], calibrate: Callable[[], Any], repeat: int, attempts: int = 1
+) -> Tuple[float, float, int]:
+    """The `attempts` timing with the median relative cost, and the peak
+    traced allocation of one run."""
+    timings = sorted(
+        (relative_time(stage, calibrate, repeat) for _ in range(max(attempts, 1))),
+        key=lambda timing: timing[0] / timing[1],
+    )
+    seconds, calibration = timings[len(timings) // 2]
+    gc.collect()
+    tracemalloc.start()
+    try:
+        stage()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, calibration, peak
+
+
+def _slower(seconds: float, calibration: float, reference: Dict[str, Any], time_tolerance: float) -> bool:
+    reference_cost = reference.get("relativeCost")
+    return bool(reference_cost and seconds / calibration > reference_cost * time_tolerance)
+
+
+def run_benchmarks(
+    datasets: Sequence[str] = BENCH_DATASETS,
+    scales: Sequence[int] = DEFAULT_SCALES,
+    input_dir: str = EXTRACTED_DIR,
+    repeat: int = DEFAULT_REPEAT,
+    attempts: int = 1,
+    baseline: Optional[Dict[str, Dict[str, Any]]] = None,
+    time_tolerance: float = 1.5,
+) -> Dict[str, Dict[str, Any]]:
+    """Time every stage. With a ``baseline``, a stage that looks slower than
+    it allows is timed up to CONFIRM_ATTEMPTS more times and keeps its
+    cheapest timing, so one bad moment on a shared machine is not reported."""
+    results: Dict[str, Dict[str, Any]] = {}
+    calibrate = calibration_workload()
+    with tempfile.TemporaryDirectory(prefix="pipeline_bench_") as work_dir:
+        for name in datasets:
+            for scale in scales:
+                csv_path, rows = generate_dataset(name, input_dir, work_dir, scale)
+                size = os.path.getsize(csv_path)
+                for stage_name, stage in _stages(name, csv_path, work_dir):
+                    key = f"{name}/{stage_name}@{scale}x"
+                    seconds, calibration, peak = measure(stage, calibrate, repeat, attempts)
+                    reference = (baseline or {}).get(key)
+                    retries = 0
+                    while (
+                        reference
+                        and retries < CONFIRM_ATTEMPTS
+                        and _slower(seconds, calibration, reference, time_tolerance)
+                    ):
+                        retimed = relative_time(stage, calibrate, repeat)
+                        if retimed[0] / retimed[1] < seconds / calibration:
+                            seconds, calibration = retimed
+                        retries += 1
+                    results[key] = {
+                        "rows": rows,
+                        "csvBytes": size,
+                        "seconds": round(seconds, 6),
+                        "rowsPerSecond": round(rows / seconds) if seconds else None,
+                        "calibrationSeconds": round(calibration, 6),
+                        "relativeCost": round(seconds / calibration, 4),
+                        "peakBytes": peak,
+                    }
+                    print(
+                        f"{key:<40} {seconds * 1000:10.1f} ms"
+                        f" {rows / seconds if seconds else 0:12.0f} rows/s"
+                        f" {seconds / calibration:8.2f}x cal"
+                        f" {peak / 1_048_576:9.1f} MiB peak"
+                        + (f" (retimed {retries}x)" if retries else "")
+                    )
+                os.remove(csv_path)
+    return results
+
+
+def compare_to_baseline(
+    results: Dict[str, Dict[str, Any]],
+    baseline: Dict[str, Dict[str, Any]],
+    time_tolerance: float,
+    memory_tolerance: float,
+) -> List[str]:
+    regressions = []
+    for key, result in results.items():
+        reference = baseline.get(key)
+        if not reference:
+            continue
+        # cost relative to the calibration workload, so the gate follows the
+        # code rather than how busy the machine was during either run
+        if _slower(result["seconds"], result["calibrationSeconds"], reference, time_tolerance):
+            regressions.append(
+                f"{key}: {result['relativeCost']}x calibration"
+                f" vs baseline {reference['relativeCost']}x"
+                f" ({result['rowsPerSecond']} vs {reference['rowsPerSecond']} rows/s)"
+            )
+        if result["peakBytes"] > reference["peakBytes"] * memory_tolerance:
+            regressions.append(
+                f"{key}: peak {result['peakBytes']} B vs baseline {reference['peakBytes']} B"
+            )
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the CSV -> JSON pipeline.")
+    parser.add_argument("--datasets", nargs="+", default=list(BENCH_DATASETS), choices=sorted(SPECS))
+    parser.add_argument("--scales", nargs="+", type=int, default=list(DEFAULT_SCALES))
+    parser.add_argument("--input-dir", default=EXTRACTED_DIR)
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed samples per stage")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--baseline-attempts",
+        type=int,
+        default=BASELINE_ATTEMPTS,
+        help="timings per stage whose median --save-baseline stores",
+    )
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=1.5,
+        help="fail when a stage costs this many times its baseline, relative to calibration",
+    )
+    parser.add_argument("--memory-tolerance", type=float, default=1.2)
+    parser.add_argument("--output", help="also write the results as JSON here")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.check:
+        with open(args.baseline, "r", encoding="utf-8") as in_file:
+            baseline = json.load(in_file)
+    attempts = args.baseline_attempts if args.save_baseline else 1
+    results = run_benchmarks(
+        args.datasets, args.scales, args.input_dir, args.repeat, attempts, baseline, args.time_tolerance
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out_file:
+            json.dump(results, out_file, indent=2)
+            out_file.write("\n")
+    if args.save_baseline:
+        write_json_if_changed(args.baseline, dict(sorted(results.items())))
+        print(f"Saved baseline to {args.baseline}")
+    if baseline is not None:
+        regressions = compare_to_baseline(
+            results, baseline, args.time_tolerance, args.memory_tolerance
+        )
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
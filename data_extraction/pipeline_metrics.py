@@ -0,0 +1,150 @@
+"""
+Per-dataset timing and memory instrumentation for clash_csv_to_json.py.
+
+Metrics are plain dataclasses so worker processes can send them back with the
+built items. Stage timers cost nothing when instrumentation is off because the
+pipeline only creates them when --profile or --metrics-json is given.
+"""
+import cProfile
+import os
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, TypeVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None  # type: ignore[assignment]
+
+STAGES = ("read", "build", "write", "map")
+
+T = TypeVar("T")
+
+
+def peak_rss_bytes(children: bool = False) -> int:
+    if resource is None:
+        return 0
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+@dataclass
+class DatasetMetrics:
+    name: str
+    seconds: Dict[str, float] = field(default_factory=lambda: {s: 0.0 for s in STAGES})
+    rows_in: int = 0
+    entities_out: int = 0
+    levels_out: int = 0
+    bytes_written: int = 0
+    # peak RSS of the process that built the dataset
+    peak_rss_bytes: int = 0
+    pid: int = 0
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "seconds": {k: round(v, 6) for k, v in self.seconds.items()},
+            "rowsIn": self.rows_in,
+            "entitiesOut": self.entities_out,
+            "levelsOut": self.levels_out,
+            "bytesWritten": self.bytes_written,
+            "peakRssBytes": self.peak_rss_bytes,
+            "pid": self.pid,
+        }
+
+
+@dataclass
+class RunMetrics:
+    jobs: int
+    datasets: List[DatasetMetrics] = field(default_factory=list)
+    seconds: Dict[str, float] = field(default_factory=dict)
+    started: float = field(default_factory=time.perf_counter)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "jobs": self.jobs,
+            "totalSeconds": round(time.perf_counter() - self.started, 6),
+            "seconds": {k: round(v, 6) for k, v in self.seconds.items()},
+            "peakRssBytes": peak_rss_bytes(),
+            "peakChildRssBytes": peak_rss_bytes(children=True),
+            "datasets": [metrics.to_json() for metrics in self.datasets],
+        }
+
+
+@contextmanager
+def timed(
+    seconds: Dict[str, float],
+    stage: str,
+    profile_dir: Optional[str] = None,
+    profile_name: Optional[str] = None,
+) -> Iterator[None]:
+    """Add the wall time of the block to ``seconds[stage]``; optionally dump a
+    cProfile of it to ``<profile_dir>/<profile_name>.<stage>.prof``."""
+    profiler = cProfile.Profile() if profile_dir else None
+    started = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        seconds[stage] = seconds.get(stage, 0.0) + time.perf_counter() - started
+        if profiler and profile_dir:
+            os.makedirs(profile_dir, exist_ok=True)
+            profiler.dump_stats(
+                os.path.join(profile_dir, f"{profile_name or 'pipeline'}.{stage}.prof")
+            )
+
+
+def timed_rows(rows: Iterable[T], metrics: DatasetMetrics) -> Iterator[T]:
+    """Pass rows through, charging the time spent producing them to "read"."""
+    iterator = iter(rows)
+    clock = time.perf_counter
+    count = 0
+    spent = 0.0
+    try:
+        while True:
+            started = clock()
+            try:
+                row = next(iterator)
+            except StopIteration:
+                spent += clock() - started
+                return
+            spent += clock() - started
+            count += 1
+            yield row
+    finally:
+        metrics.rows_in += count
+        metrics.seconds["read"] += spent
+
+
+def count_levels(items: List[Dict[str, Any]]) -> int:
+    return sum(len(item.get("levels") or ()) for item in items if isinstance(item, dict))
+
+
+def print_report(run: RunMetrics, out: TextIO = sys.stdout) -> None:
+    header = (
+        f"{'dataset (ms)':<30}{'read':>9}{'build':>9}{'write':>9}{'map':>9}"
+        f"{'rows':>8}{'ents':>7}{'levels':>8}{'bytes':>10}{'rss MiB':>9}"
+    )
+    out.write(header + "\n")
+    for metrics in run.datasets:
+        s = metrics.seconds
+        out.write(
+            f"{metrics.name:<30}"
+            + "".join(f"{s.get(stage, 0.0) * 1000:9.1f}" for stage in STAGES)
+            + f"{metrics.rows_in:>8}{metrics.entities_out:>7}{metrics.levels_out:>8}"
+            + f"{metrics.bytes_written:>10}{metrics.peak_rss_bytes / 1_048_576:>9.1f}\n"
+        )
+    summary = run.to_json()
+    extras = ", ".join(f"{k} {v * 1000:.1f} ms" for k, v in run.seconds.items())
+    out.write(
+        f"total {summary['totalSeconds'] * 1000:.1f} ms"
+        + (f" ({extras})" if extras else "")
+        + f", peak RSS {summary['peakRssBytes'] / 1_048_576:.1f} MiB\n"
+    )
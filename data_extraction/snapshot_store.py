@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Time-series store for in-game player exports (the misc_files/sample.json shape).
+
+Every export is canonicalized to (data id, level) -> count, the same
+run-length form as countsByLevel in DataService+Progress.swift, taken over all
+leveled export lists (buildings, traps, units, heroes, pets, equipment, builder
+base lists, ...) plus the crafted defense modules nested in buildings.
+
+Snapshots live in one sqlite table indexed by (tag, timestamp). Each row keeps
+its delta against the previous snapshot of the account (zlib-packed
+(id, level, count change) records) and, every --keyframe-interval rows, the
+full state as well. The state at any time is the nearest earlier keyframe plus
+the deltas after it. "What changed between two dates" only sums the deltas in
+the window, and the progress series reads precomputed columns (Town Hall level,
+levels gained), so neither re-reads full exports. A snapshot inserted out of
+order only rewrites the delta of the snapshot after it.
+
+Run:
+  python3 data_extraction/snapshot_store.py add misc_files/sample.json misc_files/sample2.json
+  python3 data_extraction/snapshot_store.py progress '#2CJJRQJ0' --days 90
+  python3 data_extraction/snapshot_store.py upgrades '#2CJJRQJ0' --days 7
+"""
+import argparse
+import json
+import os
+import sqlite3
+import struct
+import time
+import zlib
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from analyze_exports import iter_export_sources
+
+DATA_EXTRACTION_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB_PATH = os.path.join(DATA_EXTRACTION_DIR, "snapshots.sqlite3")
+DEFAULT_KEYFRAME_INTERVAL = 30
+STORE_VERSION = 1
+TOWN_HALL_ID = 1000001
+DAY_SECONDS = 86400
+
+# data id, level, count (or count change)
+RECORD = struct.Struct("<IHi")
+
+Counts = Dict[Tuple[int, int], int]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    tag TEXT NOT NULL,
+    timestamp INTEGER NOT NULL,
+    town_hall INTEGER NOT NULL,
+    levels_gained INTEGER NOT NULL,
+    delta BLOB NOT NULL,
+    keyframe BLOB,
+    PRIMARY KEY (tag, timestamp)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS snapshots_keyframes
+    ON snapshots (tag, timestamp) WHERE keyframe IS NOT NULL;
+"""
+
+
+def canonical_counts(export: Dict[str, Any]) -> Counts:
+    """(data id, level) -> count over every leveled list in an export."""
+    counts: Counts = {}
+
+    def add(item: Dict[str, Any]) -> None:
+        level = item.get("lvl")
+        if level is None or "data" not in item:
+            return
+        key = (item["data"], level)
+        counts[key] = counts.get(key, 0) + max(item.get("cnt") or 1, 1)
+
+    for value in export.values():
+        if not isinstance(value, list):
+            continue
+        for item in value:
+            if not isinstance(item, dict):
+                continue
+            add(item)
+            for crafted in item.get("types") or []:
+                for module in crafted.get("modules") or []:
+                    add(module)
+    return counts
+
+
+def diff_counts(new: Counts, old: Counts) -> Counts:
+    delta = {key: count - old.get(key, 0) for key, count in new.items() if count != old.get(key, 0)}
+    for key, count in old.items():
+        if key not in new:
+            delta[key] = -count
+    return delta
+
+
+def add_counts(base: Counts, delta: Counts) -> Counts:
+    output = dict(base)
+    for key, change in delta.items():
+        count = output.get(key, 0) + change
+        if count:
+            output[key] = count
+        else:
+            output.pop(key, None)
+    return output
+
+
+def levels_gained(delta: Counts) -> int:
+    """Sum of level * count change: one per building upgrade, one per level of
+    a unit, hero or pet."""
+    return sum(level * change for (_, level), change in delta.items())
+
+
+def pack_counts(counts: Counts) -> bytes:
+    records = b"".join(RECORD.pack(data_id, level, count) for (data_id, level), count in sorted(counts.items()))
+    return zlib.compress(records, 9)
+
+
+def unpack_counts(blob: bytes) -> Counts:
+    return {(data_id, level): count for data_id, level, count in RECORD.iter_unpack(zlib.decompress(blob))}
+
+
+def town_hall_level(counts: Counts) -> int:
+    return max((level for (data_id, level) in counts if data_id == TOWN_HALL_ID), default=0)
+
+
+class SnapshotStore:
+    def __init__(self, path: str = DEFAULT_DB_PATH, keyframe_interval: int = DEFAULT_KEYFRAME_INTERVAL) -> None:
+        self.path = path
+        self.keyframe_interval = max(keyframe_interval, 1)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version = {STORE_VERSION}")
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "SnapshotStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        if exc_info[0] is None:
+            self.db.commit()
+        self.close()
+
+    def tags(self) -> List[str]:
+        return [row[0] for row in self.db.execute("SELECT DISTINCT tag FROM snapshots ORDER BY tag")]
+
+    def timestamps(self, tag: str) -> List[int]:
+        return [
+            row[0]
+            for row in self.db.execute(
+                "SELECT timestamp FROM snapshots WHERE tag = ? ORDER BY timestamp", (tag,)
+            )
+        ]
+
+    def state_at(self, tag: str, timestamp: Optional[int] = None, inclusive: bool = True) -> Counts:
+        """Counts of the latest snapshot at (or, with inclusive=False, before) ``timestamp``."""
+        op = "<=" if inclusive else "<"
+        limit = timestamp if timestamp is not None else 2**62
+        keyframe_row = self.db.execute(
+            f"SELECT timestamp, keyframe FROM snapshots WHERE tag = ? AND timestamp {op} ?"
+            " AND keyframe IS NOT NULL ORDER BY timestamp DESC LIMIT 1",
+            (tag, limit),
+        ).fetchone()
+        state: Counts = {}
+        start = -1
+        if keyframe_row:
+            start, blob = keyframe_row
+            state = unpack_counts(blob)
+        for (blob,) in self.db.execute(
+            f"SELECT delta FROM snapshots WHERE tag = ? AND timestamp > ? AND timestamp {op} ?"
+            " ORDER BY timestamp",
+            (tag, start, limit),
+        ):
+            state = add_counts(state, unpack_counts(blob))
+        return state
+
+    def _needs_keyframe(self, tag: str, timestamp: int) -> bool:
+        row = self.db.execute(
+            "SELECT COUNT(*) FROM snapshots WHERE tag = ? AND timestamp < ? AND timestamp >"
+            " COALESCE((SELECT MAX(timestamp) FROM snapshots WHERE tag = ? AND timestamp < ?"
+            " AND keyframe IS NOT NULL), -1)",
+            (tag, timestamp, tag, timestamp),
+        ).fetchone()
+        has_keyframe = self.db.execute(
+            "SELECT 1 FROM snapshots WHERE tag = ? AND timestamp < ? AND keyframe IS NOT NULL LIMIT 1",
+            (tag, timestamp),
+        ).fetchone()
+        return not has_keyframe or row[0] + 1 >= self.keyframe_interval
+
+    def add(self, export: Dict[str, Any]) -> bool:
+        """Store one export. Returns False when an identical snapshot is already stored."""
+        tag = export.get("tag") or ""
+        timestamp = int(export.get("timestamp") or 0)
+        if not tag or not timestamp:
+            raise ValueError("Export has no tag or timestamp")
+        counts = canonical_counts(export)
+
+        existing = self.db.execute(
+            "SELECT delta, keyframe FROM snapshots WHERE tag = ? AND timestamp = ?", (tag, timestamp)
+        ).fetchone()
+        has_previous = self.db.execute(
+            "SELECT 1 FROM snapshots WHERE tag = ? AND timestamp < ? LIMIT 1", (tag, timestamp)
+        ).fetchone()
+        previous = self.state_at(tag, timestamp, inclusive=False) if has_previous else {}
+        delta = diff_counts(counts, previous)
+        old_delta = unpack_counts(existing[0]) if existing else {}
+        if existing and old_delta == delta:
+            return False
+
+        keyframe = None
+        if (existing and existing[1] is not None) or (not existing and self._needs_keyframe(tag, timestamp)):
+            keyframe = pack_counts(counts)
+        self.db.execute(
+            "INSERT OR REPLACE INTO snapshots (tag, timestamp, town_hall, levels_gained, delta, keyframe)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (tag, timestamp, town_hall_level(counts), levels_gained(delta) if has_previous else 0,
+             pack_counts(delta), keyframe),
+        )
+
+        # The next snapshot's delta was against the old state at this point:
+        # next - new = (next - previous) - (new - previous) + (old - previous).
+        following = self.db.execute(
+            "SELECT timestamp, delta FROM snapshots WHERE tag = ? AND timestamp > ?"
+            " ORDER BY timestamp LIMIT 1",
+            (tag, timestamp),
+        ).fetchone()
+        if following:
+            next_delta = add_counts(add_counts(unpack_counts(following[1]), old_delta), {k: -v for k, v in delta.items()})
+            self.db.execute(
+                "UPDATE snapshots SET delta = ?, levels_gained = ? WHERE tag = ? AND timestamp = ?",
+                (pack_counts(next_delta), levels_gained(next_delta), tag, following[0]),
+            )
+        return True
+
+    def changes(self, tag: str, since: int, until: Optional[int] = None) -> Counts:
+        """Net (id, level) count changes of the snapshots in (since, until]. The
+        first snapshot of an account is the baseline, not a change."""
+        total: Counts = {}
+        for (blob,) in self.db.execute(
+            "SELECT delta FROM snapshots WHERE tag = ? AND timestamp > ? AND timestamp <= ?"
+            " AND timestamp > (SELECT MIN(timestamp) FROM snapshots WHERE tag = ?) ORDER BY timestamp",
+            (tag, since, until if until is not None else 2**62, tag),
+        ):
+            total = add_counts(total, unpack_counts(blob))
+        return total
+
+    def upgrades(self, tag: str, since: int, until: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Per data id: levels left, levels reached and levels gained in the window."""
+        by_id: Dict[int, Dict[str, Any]] = {}
+        for (data_id, level), change in sorted(self.changes(tag, since, until).items()):
+            entry = by_id.setdefault(data_id, {"id": data_id, "from": {}, "to": {}, "levelsGained": 0})
+            entry["from" if change < 0 else "to"][level] = abs(change)
+            entry["levelsGained"] += level * change
+        return [entry for entry in by_id.values() if entry["levelsGained"]]
+
+    def progress(self, tag: str, since: int, until: Optional[int] = None) -> List[Tuple[int, int, int]]:
+        """(timestamp, Town Hall level, cumulative levels gained) per snapshot in the window."""
+        rows = self.db.execute(
+            "SELECT timestamp, town_hall, levels_gained FROM snapshots WHERE tag = ?"
+            " AND timestamp > ? AND timestamp <= ? ORDER BY timestamp",
+            (tag, since, until if until is not None else 2**62),
+        )
+        series = []
+        total = 0
+        for timestamp, town_hall, gained in rows:
+            total += gained
+            series.append((timestamp, town_hall, total))
+        return series
+
+    def storage(self) -> Dict[str, int]:
+        row = self.db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(delta)), 0), COALESCE(SUM(LENGTH(keyframe)), 0),"
+            " COUNT(keyframe) FROM snapshots"
+        ).fetchone()
+        return {"snapshots": row[0], "deltaBytes": row[1], "keyframeBytes": row[2], "keyframes": row[3]}
+
+
+def iter_exports(paths: Sequence[str]) -> Iterator[Dict[str, Any]]:
+    for _, text in iter_export_sources(paths):
+        yield json.loads(text)
+
+
+def _entity_names(ids: Iterable[int]) -> Dict[int, str]:
+    try:
+        from entity_lookup import EntityLookup
+
+        with EntityLookup() as lookup:
+            names = {}
+            for data_id in ids:
+                entity = lookup.get(data_id)
+                if entity:
+                    names[data_id] = entity.get("internalName", "")
+            return names
+    except (OSError, ValueError):
+        return {}
+
+
+def _window(args: argparse.Namespace) -> Tuple[int, int]:
+    until = args.until if args.until is not None else int(time.time())
+    return until - args.days * DAY_SECONDS, until
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Delta-compressed store of player export snapshots.")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = commands.add_parser("add", help="store exports (files, directories or .jsonl)")
+    add_parser.add_argument("paths", nargs="+")
+    add_parser.add_argument("--keyframe-interval", type=int, default=DEFAULT_KEYFRAME_INTERVAL)
+
+    for name, help_text in (
+        ("progress", "cumulative levels gained per snapshot"),
+        ("upgrades", "upgrades finished in the window"),
+    ):
+        sub = commands.add_parser(name, help=help_text)
+        sub.add_argument("tag")
+        sub.add_argument("--days", type=int, default=90 if name == "progress" else 7)
+        sub.add_argument("--until", type=int, help="window end as a unix timestamp (default: now)")
+
+    state_parser = commands.add_parser("state", help="print the (id, level) counts at a time")
+    state_parser.add_argument("tag")
+    state_parser.add_argument("--at", type=int, help="unix timestamp (default: latest)")
+
+    commands.add_parser("stats", help="snapshot and storage counts")
+    args = parser.parse_args(argv)
+
+    keyframe_interval = getattr(args, "keyframe_interval", DEFAULT_KEYFRAME_INTERVAL)
+    with SnapshotStore(args.db, keyframe_interval) as store:
+        if args.command == "add":
+            added = skipped = 0
+            for export in iter_exports(args.paths):
+                if store.add(export):
+                    added += 1
+                else:
+                    skipped += 1
+            print(f"Stored {added} snapshot(s), {skipped} unchanged")
+        elif args.command == "progress":
+            since, until = _window(args)
+            for timestamp, town_hall, total in store.progress(args.tag, since, until):
+                day = time.strftime("%Y-%m-%d %H:%M", time.gmtime(timestamp))
+                print(f"{day}  TH{town_hall:<3} +{total} levels")
+        elif args.command == "upgrades":
+            since, until = _window(args)
+            upgrades = store.upgrades(args.tag, since, until)
+            names = _entity_names(entry["id"] for entry in upgrades)
+            for entry in upgrades:
+                moves = ", ".join(f"{n}x L{level}" for level, n in entry["to"].items())
+                print(f"{entry['id']:<10} {names.get(entry['id'], ''):<28} +{entry['levelsGained']:<4} now {moves}")
+        elif args.command == "state":
+            counts = store.state_at(args.tag, args.at)
+            print(json.dumps(
+                [{"data": data_id, "lvl": level, "cnt": count} for (data_id, level), count in sorted(counts.items())]
+            ))
+        else:
+            print(json.dumps(store.storage()))
+
+
+if __name__ == "__main__":
+    main()
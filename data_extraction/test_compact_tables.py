@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Round-trip tests for compact_tables.py on the edge cases the parsed datasets
+only hit by accident: empty tables and lists, null columns and columns whose
+values mix types.
+
+Run:
+  python3 -m pytest -q data_extraction/test_compact_tables.py
+  python3 data_extraction/test_compact_tables.py
+"""
+import json
+import unittest
+from typing import Any, Dict, List
+
+from compact_tables import (
+    KIND_INT,
+    KIND_JSON,
+    KIND_NULL,
+    KIND_NULLABLE_INT,
+    _column_kind,
+    decode_compact,
+    encode_compact,
+)
+
+
+class CompactRoundTripTest(unittest.TestCase):
+    def assertRoundTrips(self, records: List[Dict[str, Any]]) -> None:
+        decoded = decode_compact(encode_compact(records))
+        # the JSON text also catches True vs 1, 1.0 vs 1 and key order
+        self.assertEqual(
+            json.dumps(decoded, ensure_ascii=False), json.dumps(records, ensure_ascii=False)
+        )
+
+    def test_empty(self) -> None:
+        self.assertRoundTrips([])
+        self.assertRoundTrips([{}, {}])
+        self.assertRoundTrips([{"levels": []}, {"levels": []}])
+        self.assertRoundTrips([{"name": ""}, {"name": ""}])
+        self.assertRoundTrips([{"levels": [{}]}, {"levels": []}])
+
+    def test_null_columns(self) -> None:
+        self.assertEqual(_column_kind([None, None]), KIND_NULL)
+        self.assertRoundTrips([{"tid": None}, {"tid": None}])
+        self.assertEqual(_column_kind([3, None, -7]), KIND_NULLABLE_INT)
+        self.assertRoundTrips([{"cost": 3}, {"cost": None}, {"cost": -7}])
+        self.assertRoundTrips([{"levels": [{"cost": None}, {"cost": 10**12}]}])
+
+    def test_mixed_type_columns(self) -> None:
+        self.assertEqual(_column_kind([1, True]), KIND_JSON)
+        self.assertEqual(_column_kind([1, 2]), KIND_INT)
+        self.assertRoundTrips([{"v": 1}, {"v": True}, {"v": 1.0}, {"v": "1"}, {"v": None}])
+        self.assertRoundTrips([{"v": ["a", 1]}, {"v": {"k": [None]}}, {"v": []}])
+        self.assertRoundTrips([{"v": "007"}, {"v": "7"}, {"v": ""}, {"v": "-0"}])
+        self.assertRoundTrips([{"levels": [{"v": 1}, {"v": "x"}]}, {"levels": "none"}])
+
+    def test_missing_keys_keep_their_order(self) -> None:
+        self.assertRoundTrips([{"b": 1}, {"a": 2, "b": 3}, {"b": 4, "c": None}])
+        self.assertRoundTrips([{"id": 1}, {"id": 2, "levels": [{"level": 1}]}])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+"""
+Discrete-event simulation of builder and lab timers with boosts and helpers.
+
+Takes the running timers of a player export (the `timer` fields, grouped into
+the same categories as DataService.collectUpgrades), optional queues of
+follow-up upgrades, and a schedule of boosts, and computes when every upgrade
+finishes. Boost rules follow BoostType in Models.swift: each active boost adds
+its multiplier to the elapsed time per second, clock tower boosts do not stack
+with each other, and the Builder's Apprentice / Lab Assistant speed up a single
+upgrade by their BoostMultiplier from villager_apprentices.json.
+
+Events (boost start/end, helper availability, upgrade completion) are kept in a
+heap; completion entries are re-pushed when a rate changes and stale ones are
+skipped, so a run costs O(events * log events).
+
+Run:
+  python3 data_extraction/timer_simulator.py misc_files/sample2.json
+  python3 data_extraction/timer_simulator.py misc_files/sample2.json --sweep-helpers 48 \
+      --apprentice-level 8 --assistant-level 8
+"""
+import argparse
+import heapq
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from clash_csv_to_json import safe_int
+from upgrade_index import PARSED_DIR
+
+BUILDER_VILLAGE = "builderVillage"
+BUILDER_BASE = "builderBase"
+LAB = "lab"
+STAR_LAB = "starLab"
+PETS = "pets"
+
+# export key -> upgrade category, as in DataService.collectUpgrades
+EXPORT_CATEGORIES = (
+    ("buildings", BUILDER_VILLAGE),
+    ("buildings2", BUILDER_BASE),
+    ("traps", BUILDER_VILLAGE),
+    ("traps2", BUILDER_BASE),
+    ("heroes", BUILDER_VILLAGE),
+    ("heroes2", BUILDER_BASE),
+    ("pets", PETS),
+    ("siege_machines", LAB),
+    ("units", LAB),
+    ("units2", STAR_LAB),
+    ("spells", LAB),
+    ("guardians", BUILDER_VILLAGE),
+)
+
+BUILDER_APPRENTICE_ID = 93000000
+LAB_ASSISTANT_ID = 93000001
+HELPER_NAMES = {
+    "builder_apprentice": "BuilderApprentice",
+    "lab_assistant": "ResearchApprentice",
+}
+HELPER_IDS = {
+    "builder_apprentice": BUILDER_APPRENTICE_ID,
+    "lab_assistant": LAB_ASSISTANT_ID,
+}
+HELPER_WORK_SECONDS = 3600
+HELPER_COOLDOWN_SECONDS = 23 * 3600
+
+# boost type -> (extra seconds per second, affected categories, duration)
+BOOST_TYPES: Dict[str, Tuple[float, Tuple[str, ...], int]] = {
+    "builder_potion": (9.0, (BUILDER_VILLAGE,), 3600),
+    "research_potion": (23.0, (LAB,), 3600),
+    "pet_potion": (23.0, (PETS,), 3600),
+    "builder_bite": (1.0, (BUILDER_VILLAGE,), 3600),
+    "study_soup": (3.0, (LAB, PETS), 3600),
+    "clock_tower_potion": (9.0, (BUILDER_BASE,), 1800),
+    "clock_tower": (9.0, (BUILDER_BASE,), 14 * 60),
+    "builder_apprentice": (0.0, (BUILDER_VILLAGE,), HELPER_WORK_SECONDS),
+    "lab_assistant": (0.0, (LAB,), HELPER_WORK_SECONDS),
+}
+CLOCK_TOWER_BOOSTS = ("clock_tower", "clock_tower_potion")
+
+# `boosts` object of an export: key -> boost type already running at import
+EXPORT_BOOSTS = {
+    "builder_boost": "builder_potion",
+    "lab_boost": "research_potion",
+    "pet_boost": "pet_potion",
+    "clocktower_boost": "clock_tower",
+}
+
+_START, _END, _COMPLETE = 0, 1, 2
+
+
+def load_helper_multipliers(parsed_dir: str = PARSED_DIR) -> Dict[str, Dict[int, float]]:
+    """Boost type -> {helper level: BoostMultiplier} from villager_apprentices.json."""
+    with open(
+        os.path.join(parsed_dir, "villager_apprentices.json"), "r", encoding="utf-8"
+    ) as in_file:
+        apprentices = {item["internalName"]: item for item in json.load(in_file)}
+    output: Dict[str, Dict[int, float]] = {}
+    for boost_type, name in HELPER_NAMES.items():
+        levels = apprentices.get(name, {}).get("levels", [])
+        output[boost_type] = {
+            safe_int(row.get("level")): float(safe_int(row.get("BoostMultiplier")))
+            for row in levels
+        }
+    return output
+
+
+@dataclass(frozen=True)
+class Timer:
+    category: str
+    data: int
+    level: int
+    seconds: int
+    uses_goblin: bool = False
+
+
+@dataclass(frozen=True)
+class Boost:
+    type: str
+    start: int = 0
+    level: int = 0
+    # data id of the upgrade a helper works on; None picks the longest timer
+    target: Optional[int] = None
+    duration: Optional[int] = None
+
+
+@dataclass
+class Completion:
+    time: float
+    category: str
+    data: int
+    level: int
+
+
+@dataclass
+class SimulationResult:
+    completions: List[Completion] = field(default_factory=list)
+    applied_boosts: List[Tuple[Boost, int]] = field(default_factory=list)
+
+    def finish_time(self, category: Optional[str] = None) -> float:
+        return max(
+            (c.time for c in self.completions if category in (None, c.category)),
+            default=0.0,
+        )
+
+    def total_time(self, category: Optional[str] = None) -> float:
+        """Sum of completion times; lower means builders free up sooner overall."""
+        return sum(c.time for c in self.completions if category in (None, c.category))
+
+
+def export_timers(export: Dict[str, Any]) -> List[Timer]:
+    timers = []
+    for key, category in EXPORT_CATEGORIES:
+        for item in export.get(key) or []:
+            level, timer = item.get("lvl"), item.get("timer")
+            if level is not None and timer and timer > 0:
+                timers.append(
+                    Timer(category, item["data"], level, timer, bool(item.get("extra")))
+                )
+        if key == "buildings":
+            # Crafted defense modules are nested inside their building.
+            for item in export.get(key) or []:
+                for crafted in item.get("types") or []:
+                    for module in crafted.get("modules") or []:
+                        level, timer = module.get("lvl"), module.get("timer")
+                        if level is not None and timer and timer > 0:
+                            timers.append(
+                                Timer(
+                                    BUILDER_VILLAGE,
+                                    module["data"],
+                                    level,
+                                    timer,
+                                    bool(module.get("extra")),
+                                )
+                            )
+    return timers
+
+
+def export_boosts(export: Dict[str, Any]) -> List[Boost]:
+    boosts = []
+    for key, seconds in (export.get("boosts") or {}).items():
+        boost_type = EXPORT_BOOSTS.get(key)
+        if boost_type and isinstance(seconds, int) and seconds > 0:
+            boosts.append(Boost(boost_type, 0, duration=seconds))
+    return boosts
+
+
+def export_helpers(export: Dict[str, Any]) -> Dict[int, Tuple[int, int]]:
+    """Helper id -> (level, seconds until it can work again)."""
+    return {
+        helper["data"]: (helper.get("lvl") or 0, max(helper.get("helper_cooldown") or 0, 0))
+        for helper in export.get("helpers") or []
+    }
+
+
+class _Job:
+    __slots__ = ("category", "data", "level", "remaining", "rate", "updated", "version", "slot")
+
+    def __init__(self, category: str, data: int, level: int, work: float, now: float, slot: bool) -> None:
+        self.category = category
+        self.data = data
+        self.level = level
+        self.remaining = float(work)
+        self.rate = 0.0
+        self.updated = now
+        self.version = 0
+        # goblin builders do not occupy a builder slot
+        self.slot = slot
+
+
+class TimerSimulator:
+    """Reusable simulator for one export; `run` is called once per schedule."""
+
+    def __init__(
+        self,
+        timers: Sequence[Timer],
+        helpers: Optional[Dict[int, Tuple[int, int]]] = None,
+        base_boosts: Sequence[Boost] = (),
+        helper_multipliers: Optional[Dict[str, Dict[int, float]]] = None,
+        workers: Optional[Dict[str, int]] = None,
+    ) -> None:
+        self.timers = list(timers)
+        self.helpers = dict(helpers or {})
+        self.base_boosts = list(base_boosts)
+        self.helper_multipliers = (
+            helper_multipliers if helper_multipliers is not None else load_helper_multipliers()
+        )
+        busy: Dict[str, int] = {}
+        for timer in self.timers:
+            if not timer.uses_goblin:
+                busy[timer.category] = busy.get(timer.category, 0) + 1
+        self.workers = {category: max(count, 1) for category, count in busy.items()}
+        self.workers.update(workers or {})
+
+    @classmethod
+    def from_export(cls, export: Dict[str, Any], **kwargs: Any) -> "TimerSimulator":
+        return cls(export_timers(export), export_helpers(export), export_boosts(export), **kwargs)
+
+    def _helper_extra(self, boost: Boost) -> float:
+        multipliers = self.helper_multipliers.get(boost.type, {})
+        level = boost.level or self.helpers.get(HELPER_IDS[boost.type], (0, 0))[0]
+        return multipliers.get(level, float(level))
+
+    def run(
+        self,
+        boosts: Sequence[Boost] = (),
+        queues: Optional[Dict[str, Sequence[Tuple[int, int, int]]]] = None,
+    ) -> SimulationResult:
+        """Simulate until every timer and queued upgrade is done.
+
+        ``queues`` maps a category to (data id, level, seconds) upgrades started
+        in order whenever a worker of that category frees up.
+        """
+        result = SimulationResult()
+        events: List[Tuple[float, int, int, Any]] = []
+        sequence = 0
+
+        def push(time: float, kind: int, payload: Any) -> None:
+            nonlocal sequence
+            heapq.heappush(events, (time, sequence, kind, payload))
+            sequence += 1
+
+        helper_ready = {
+            boost_type: self.helpers.get(helper_id, (0, 0))[1]
+            for boost_type, helper_id in HELPER_IDS.items()
+        }
+        for boost in sorted((*self.base_boosts, *boosts), key=lambda b: b.start):
+            start = boost.start
+            if boost.type in HELPER_IDS:
+                # A helper only works once its cooldown is over.
+                start = max(start, helper_ready[boost.type])
+                helper_ready[boost.type] = start + HELPER_WORK_SECONDS + HELPER_COOLDOWN_SECONDS
+            push(start, _START, boost)
+
+        jobs: List[_Job] = [
+            _Job(t.category, t.data, t.level, t.seconds, 0.0, not t.uses_goblin)
+            for t in self.timers
+        ]
+        pending = {category: list(items) for category, items in (queues or {}).items()}
+        for category, items in pending.items():
+            free = self.workers.get(category, 1) - sum(
+                1 for job in jobs if job.slot and job.category == category
+            )
+            while free > 0 and items:
+                data, level, seconds = items.pop(0)
+                jobs.append(_Job(category, data, level, seconds, 0.0, True))
+                free -= 1
+
+        active: List[Tuple[Boost, int]] = []
+        # boost -> job it is pinned to (helpers only)
+        pinned: Dict[int, _Job] = {}
+
+        def reschedule(now: float) -> None:
+            extras: Dict[str, float] = {}
+            clock_tower: Dict[str, bool] = {}
+            for boost, _ in active:
+                if boost.type in HELPER_IDS:
+                    continue
+                extra, categories, _ = BOOST_TYPES[boost.type]
+                for category in categories:
+                    if boost.type in CLOCK_TOWER_BOOSTS:
+                        if clock_tower.get(category):
+                            continue
+                        clock_tower[category] = True
+                    extras[category] = extras.get(category, 0.0) + extra
+            helper_extra: Dict[int, float] = {}
+            for boost, key in active:
+                job = pinned.get(key)
+                if job is not None:
+                    helper_extra[id(job)] = helper_extra.get(id(job), 0.0) + self._helper_extra(boost)
+            for job in jobs:
+                rate = 1.0 + extras.get(job.category, 0.0) + helper_extra.get(id(job), 0.0)
+                if rate != job.rate:
+                    job.rate = rate
+                    job.version += 1
+                    push(now + job.remaining / rate, _COMPLETE, (job, job.version))
+
+        def advance(now: float) -> None:
+            for job in jobs:
+                job.remaining -= (now - job.updated) * job.rate
+                job.updated = now
+
+        reschedule(0.0)
+        while events:
+            now, key, kind, payload = heapq.heappop(events)
+            if kind == _COMPLETE:
+                job, version = payload
+                if version != job.version or job not in jobs:
+                    continue
+            advance(now)
+            if kind == _START:
+                boost = payload
+                active.append((boost, key))
+                if boost.type in HELPER_IDS:
+                    candidates = [job for job in jobs if job.category in BOOST_TYPES[boost.type][1]]
+                    if boost.target is not None:
+                        candidates = [job for job in candidates if job.data == boost.target]
+                    if candidates:
+                        pinned[key] = max(candidates, key=lambda job: job.remaining)
+                        result.applied_boosts.append((boost, int(now)))
+                else:
+                    result.applied_boosts.append((boost, int(now)))
+                duration = boost.duration or BOOST_TYPES[boost.type][2]
+                push(now + duration, _END, key)
+            elif kind == _END:
+                active = [(boost, k) for boost, k in active if k != payload]
+                pinned.pop(payload, None)
+            else:
+                job = payload[0]
+                jobs.remove(job)
+                result.completions.append(Completion(now, job.category, job.data, job.level + 1))
+                for boost_key, pinned_job in list(pinned.items()):
+                    if pinned_job is job:
+                        del pinned[boost_key]
+                items = pending.get(job.category)
+                if job.slot and items:
+                    data, level, seconds = items.pop(0)
+                    new_job = _Job(job.category, data, level, seconds, now, True)
+                    jobs.append(new_job)
+            if not jobs and not any(pending.values()):
+                break
+            reschedule(now)
+        return result
+
+
+def helper_level(simulator: TimerSimulator, boost_type: str, level: Optional[int] = None) -> int:
+    """Level to sweep a helper at: ``level`` if given, else the export's."""
+    return level or simulator.helpers.get(HELPER_IDS[boost_type], (0, 0))[0]
+
+
+def helper_schedules(
+    simulator: TimerSimulator,
+    horizon_hours: int,
+    step_hours: int = 1,
+    levels: Optional[Dict[str, int]] = None,
+) -> Iterable[List[Boost]]:
+    """Every combination of start hour and target for both helpers.
+
+    ``levels`` maps a helper boost type to its level; helpers missing from it
+    use the level in the export. A helper with upgrades to target but no known
+    level raises ValueError, since it would sweep at multiplier 0.
+    """
+    levels = levels or {}
+    hours = range(0, horizon_hours + 1, step_hours)
+    options: List[List[Optional[Boost]]] = []
+    for boost_type, category in (("builder_apprentice", BUILDER_VILLAGE), ("lab_assistant", LAB)):
+        targets = sorted({t.data for t in simulator.timers if t.category == category})
+        level = helper_level(simulator, boost_type, levels.get(boost_type))
+        if targets and not level:
+            raise ValueError(f"No {boost_type} level in the export; pass it explicitly")
+        options.append([None] + [
+            Boost(boost_type, hour * 3600, level, target)
+            for hour in hours
+            for target in targets
+        ])
+    builder_options, lab_options = options
+    for builder in builder_options:
+        for lab in lab_options:
+            yield [boost for boost in (builder, lab) if boost is not None]
+
+
+def sweep(
+    simulator: TimerSimulator,
+    schedules: Iterable[Sequence[Boost]],
+    category: Optional[str] = None,
+) -> Tuple[float, List[Boost], SimulationResult]:
+    """Run every schedule and return the one with the lowest total completion
+    time (ties go to the earlier last finish)."""
+    best: Optional[Tuple[Tuple[float, float], List[Boost], SimulationResult]] = None
+    for schedule in schedules:
+        result = simulator.run(schedule)
+        score = (result.total_time(category), result.finish_time(category))
+        if best is None or score < best[0]:
+            best = (score, list(schedule), result)
+    assert best is not None
+    return best[0][0], best[1], best[2]
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(round(seconds))
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+    return f"{days}d {hours:02d}h {minutes:02d}m" if days else f"{hours}h {minutes:02d}m"
+
+
+def _parse_boost(text: str) -> Boost:
+    # type[@start_hours][:level][>target]
+    target = None
+    if ">" in text:
+        text, target_text = text.split(">", 1)
+        target = int(target_text)
+    level = 0
+    if ":" in text:
+        text, level_text = text.split(":", 1)
+        level = int(level_text)
+    start = 0
+    if "@" in text:
+        text, start_text = text.split("@", 1)
+        start = int(float(start_text) * 3600)
+    if text not in BOOST_TYPES:
+        raise argparse.ArgumentTypeError(f"unknown boost type {text!r}")
+    return Boost(text, start, level, target)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Simulate upgrade timers of an export under a boost schedule."
+    )
+    parser.add_argument("export", help="player export JSON")
+    parser.add_argument(
+        "--boost",
+        action="append",
+        type=_parse_boost,
+        default=[],
+        help="type[@start_hours][:level][>target_id], e.g. builder_apprentice@2>1000002",
+    )
+    parser.add_argument("--builders", type=int, help="override the number of builders")
+    parser.add_argument(
+        "--sweep-helpers",
+        type=int,
+        metavar="HOURS",
+        help="try every helper start hour up to HOURS and target, report the best",
+    )
+    parser.add_argument(
+        "--apprentice-level",
+        type=int,
+        help="Builder's Apprentice level for --sweep-helpers (default: from the export)",
+    )
+    parser.add_argument(
+        "--assistant-level",
+        type=int,
+        help="Lab Assistant level for --sweep-helpers (default: from the export)",
+    )
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    args = parser.parse_args(argv)
+
+    with open(args.export, "r", encoding="utf-8") as in_file:
+        export = json.load(in_file)
+    workers = {BUILDER_VILLAGE: args.builders} if args.builders else None
+    simulator = TimerSimulator.from_export(
+        export,
+        helper_multipliers=load_helper_multipliers(args.parsed_dir),
+        workers=workers,
+    )
+
+    boosts: List[Boost] = args.boost
+    if args.sweep_helpers is not None:
+        levels = {"builder_apprentice": args.apprentice_level, "lab_assistant": args.assistant_level}
+        try:
+            schedules = list(helper_schedules(simulator, args.sweep_helpers, levels=levels))
+        except ValueError as error:
+            parser.error(f"{error} (--apprentice-level / --assistant-level)")
+        started = time.perf_counter()
+        _, extra, _ = sweep(simulator, ([*args.boost, *s] for s in schedules))
+        elapsed = time.perf_counter() - started
+        print(
+            f"Swept {len(schedules)} schedules in {elapsed:.2f}s "
+            f"({len(schedules) / max(elapsed, 1e-9):.0f}/s)"
+        )
+        boosts = extra
+
+    baseline = simulator.run(args.boost if args.sweep_helpers is not None else [])
+    result = simulator.run(boosts)
+    for boost, start in result.applied_boosts:
+        target = f" on {boost.target}" if boost.target is not None else ""
+        print(f"boost {boost.type}{target} at +{_format_seconds(start)}")
+    for completion in sorted(result.completions, key=lambda c: c.time):
+        print(
+            f"{_format_seconds(completion.time):>14}  {completion.category:<15}"
+            f" {completion.data} -> level {completion.level}"
+        )
+    for category in sorted({c.category for c in result.completions}):
+        before = baseline.finish_time(category)
+        after = result.finish_time(category)
+        saved_total = baseline.total_time(category) - result.total_time(category)
+        print(
+            f"{category}: done in {_format_seconds(after)}"
+            f" (saved {_format_seconds(before - after)},"
+            f" {_format_seconds(saved_total)} summed over upgrades)"
+        )
+
+
+if __name__ == "__main__":
+    main()
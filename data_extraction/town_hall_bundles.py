@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Per-Town-Hall data bundles for the widget extension.
+
+A widget only shows one account, so it only needs the levels around that
+account's Town Hall. For every Town Hall level T this stage writes one compact
+bundle holding the buildings, traps, troops, spells, pets and heroes of the
+full parsed datasets, cut down to:
+
+- entities with a level allowed at T + 1 (buildings/traps: townHallLevel;
+  troops/spells: LaboratoryLevel against the Laboratory cap; pets: against
+  the Pet Shop cap; heroes: RequiredTownHallLevel), taken from the same caps
+  as upgrade_index.json;
+- buildings and traps that townhall_levels.json allows at T or T + 1 (names
+  it does not list, such as the Town Hall itself, are kept);
+- levels from the T - 1 cap up to the T + 1 cap, i.e. the levels T and T + 1
+  unlock plus the one an up-to-date account starts from;
+- the fields the app's loaders read (id, internalName and per level the
+  time, cost, resource and requirement columns). A blank resource cell gets
+  the resource it inherits from the levels that were cut.
+
+An entity keeps the key names of its full file, under the dataset's file stem,
+so a loader can decode bundle["buildings"] like buildings.json. For a level
+below a bundle's first row (a rushed account) it falls back to the full files.
+The two townhall_levels entries ride along. index.json lists the bundles:
+
+  th12.json  {"version":2,"townHallLevel":12,"nextTownHallLevel":13,
+              "townhall_levels":[...],"buildings":[...],...}
+  index.json  {"version":2,"townHallLevels":[1,...],"bundles":{"12":
+               {"file":"th12.json","bytes":...,"sha256":"..."}}}
+
+The output goes to ClashDashWidget/widget_bundles, a folder reference in the
+widget extension's resources only (not the app's upgrade_info folder).
+WidgetDataBundle.swift opens index.json and the bundle of the profile's cached
+Town Hall level. The full parsed datasets are not changed.
+
+Run:
+  python3 data_extraction/town_hall_bundles.py
+  python3 data_extraction/town_hall_bundles.py --parsed-dir /tmp/parsed --bundles-dir /tmp/bundles
+"""
+import argparse
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from upgrade_index import (
+    BUILDING_DATASETS,
+    PARSED_DIR,
+    UNIT_DATASETS,
+    WORKSPACE_ROOT,
+    UpgradeIndex,
+    build_upgrade_index,
+    load_parsed_datasets,
+    upgrade_index_path,
+)
+
+BUNDLES_DIR = os.path.join(WORKSPACE_ROOT, "ClashDashWidget", "widget_bundles")
+BUNDLES_INDEX_NAME = "index.json"
+BUNDLES_VERSION = 2
+BUNDLE_DATASETS = (*BUILDING_DATASETS, *UNIT_DATASETS)
+ENTITY_FIELDS = ("id", "internalName")
+# per-level columns read by DataService (ParsedBuildingLevel, loadParsedUnits)
+# and upgrade_index.py; buildings and traps spell some of them differently
+LEVEL_FIELDS = (
+    "level",
+    "buildTimeSeconds",
+    "buildResource",
+    "BuildResource",
+    "buildCost",
+    "BuildCost",
+    "townHallLevel",
+    "TownHallLevel",
+    "upgradeTimeSeconds",
+    "UpgradeResource",
+    "UpgradeCost",
+    "LaboratoryLevel",
+    "RequiredTownHallLevel",
+)
+RESOURCE_FIELDS = ("buildResource", "BuildResource", "UpgradeResource")
+
+
+def bundle_file_name(town_hall_level: int) -> str:
+    return f"th{town_hall_level}.json"
+
+
+def _dumps(data: Any) -> str:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+def encode_bundle(bundle: Dict[str, Any], fragments: Optional[Dict[Any, str]] = None) -> bytes:
+    """Same bytes as compact json.dumps. Many entities come out identical in
+    neighbouring bundles, so their JSON is cached in ``fragments`` by
+    (dataset, id, first level, levels kept) and shared between bundles."""
+    if fragments is None:
+        fragments = {}
+    parts: List[str] = []
+    for key, value in bundle.items():
+        if key in BUNDLE_DATASETS:
+            items: List[str] = []
+            for item in value:
+                levels = item["levels"]
+                cache_key = (key, item["id"], levels[0]["level"] if levels else 0, len(levels))
+                fragment = fragments.get(cache_key)
+                if fragment is None:
+                    fragment = fragments[cache_key] = _dumps(item)
+                items.append(fragment)
+            encoded = "[" + ",".join(items) + "]"
+        else:
+            encoded = _dumps(value)
+        parts.append(_dumps(key) + ":" + encoded)
+    return ("{" + ",".join(parts) + "}\n").encode("utf-8")
+
+
+def _cut_levels(levels: List[Dict[str, Any]], floor: int, cap: int) -> List[Dict[str, Any]]:
+    """Levels ``floor``..``cap`` (from 1 when ``floor`` is 0) with LEVEL_FIELDS."""
+    output: List[Dict[str, Any]] = []
+    inherited: Dict[str, Any] = {}
+    for level in levels:
+        number = level.get("level", 0)
+        for key in RESOURCE_FIELDS:
+            if level.get(key):
+                inherited[key] = level[key]
+        if number < floor or number > cap:
+            continue
+        row = {key: level[key] for key in LEVEL_FIELDS if key in level}
+        for key in RESOURCE_FIELDS:
+            if key in row and not row[key] and key in inherited:
+                row[key] = inherited[key]
+        output.append(row)
+    return output
+
+
+def build_bundle(
+    datasets: Dict[str, List[Dict[str, Any]]],
+    index: UpgradeIndex,
+    town_hall_level: int,
+) -> Dict[str, Any]:
+    """The bundle for ``town_hall_level``: every dataset cut to the levels
+    between the previous and the next Town Hall's caps."""
+    town_halls = index.town_halls
+    next_level = min(town_hall_level + 1, town_halls[-1]) if town_halls else town_hall_level
+    previous_level = town_hall_level - 1
+    counts_entries: List[Dict[str, Any]] = []
+    counted = set()
+    placeable = set()
+    for entry in datasets.get("townhall_levels", []):
+        relevant = entry.get("townHallLevel") in (town_hall_level, next_level)
+        if relevant:
+            counts_entries.append(entry)
+        for name, count in (entry.get("counts") or {}).items():
+            counted.add(name)
+            if relevant and isinstance(count, int) and count > 0:
+                placeable.add(name)
+
+    bundle: Dict[str, Any] = {
+        "version": BUNDLES_VERSION,
+        "townHallLevel": town_hall_level,
+        "nextTownHallLevel": next_level,
+        "townhall_levels": counts_entries,
+    }
+    for dataset in BUNDLE_DATASETS:
+        items: List[Dict[str, Any]] = []
+        for item in datasets.get(dataset, []):
+            entity_id = item.get("id")
+            if entity_id not in index:
+                continue
+            cap = index.max_level(entity_id, next_level)
+            if cap == 0:
+                continue
+            name = item.get("internalName", "")
+            if dataset in BUILDING_DATASETS and name in counted and name not in placeable:
+                continue
+            floor = index.max_level(entity_id, previous_level) if previous_level > 0 else 0
+            entity = {key: item[key] for key in ENTITY_FIELDS if key in item}
+            entity["levels"] = _cut_levels(item.get("levels", []), floor, cap)
+            items.append(entity)
+        bundle[dataset] = items
+    return bundle
+
+
+def build_bundles(
+    datasets: Dict[str, List[Dict[str, Any]]], index: Optional[UpgradeIndex] = None
+) -> Dict[int, Dict[str, Any]]:
+    if index is None:
+        index = UpgradeIndex(build_upgrade_index(datasets))
+    return {town_hall: build_bundle(datasets, index, town_hall) for town_hall in index.town_halls}
+
+
+def bundle_files(bundles: Dict[int, Dict[str, Any]], bundles_dir: str = BUNDLES_DIR) -> Dict[str, bytes]:
+    """path -> encoded bytes for every bundle plus the index, ready for
+    write_files_atomically."""
+    files: Dict[str, bytes] = {}
+    entries: Dict[str, Dict[str, Any]] = {}
+    fragments: Dict[Any, str] = {}
+    for town_hall, bundle in sorted(bundles.items()):
+        encoded = encode_bundle(bundle, fragments)
+        name = bundle_file_name(town_hall)
+        files[os.path.join(bundles_dir, name)] = encoded
+        entries[str(town_hall)] = {
+            "file": name,
+            "bytes": len(encoded),
+            "sha256": hashlib.sha256(encoded).hexdigest(),
+        }
+    manifest = {
+        "version": BUNDLES_VERSION,
+        "townHallLevels": sorted(bundles),
+        "bundles": entries,
+    }
+    files[os.path.join(bundles_dir, BUNDLES_INDEX_NAME)] = (
+        json.dumps(manifest, indent=2, ensure_ascii=False) + "\n"
+    ).encode("utf-8")
+    return files
+
+
+def load_bundle_sources(parsed_dir: str = PARSED_DIR) -> Dict[int, Dict[str, Any]]:
+    datasets = load_parsed_datasets(parsed_dir, (*BUNDLE_DATASETS, "townhall_levels"))
+    index_path = upgrade_index_path(parsed_dir)
+    index = UpgradeIndex.load(index_path) if os.path.exists(index_path) else None
+    return build_bundles(datasets, index)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    from clash_csv_to_json import write_files_atomically
+
+    parser = argparse.ArgumentParser(description="Write per-Town-Hall data bundles for the widget.")
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--bundles-dir", default=BUNDLES_DIR)
+    args = parser.parse_args(argv)
+
+    files = bundle_files(load_bundle_sources(args.parsed_dir), args.bundles_dir)
+    changed = write_files_atomically(files)
+    full = sum(
+        os.path.getsize(os.path.join(args.parsed_dir, f"{name}.json"))
+        for name in (*BUNDLE_DATASETS, "townhall_levels")
+        if os.path.exists(os.path.join(args.parsed_dir, f"{name}.json"))
+    )
+    sizes = [len(encoded) for path, encoded in files.items() if not path.endswith(BUNDLES_INDEX_NAME)]
+    print(
+        f"Wrote {len(sizes)} bundle(s) of {min(sizes, default=0)}-{max(sizes, default=0)} bytes"
+        f" (full datasets: {full} bytes); {len(changed)} file(s) changed"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Precomputed per-Town-Hall upgrade index built from the parsed datasets.
+
+For every building, trap, troop, spell, pet and hero the index stores the max
+level reachable at each Town Hall and prefix sums of upgrade time and cost
+(per resource) by level, so "remaining cost from level a to b" is a single
+subtraction instead of a loop over levels.
+
+Level semantics follow DataService+Progress.swift:
+- buildings/traps: the cost on level L is the cost of building level L;
+- troops/spells/pets/heroes: the cost on level L is the upgrade from L to L+1.
+Caps follow the same rules: buildings by TownHallLevel, lab units by the
+Laboratory cap, pets by the Pet Shop cap and heroes by RequiredTownHallLevel.
+Blank resource cells inherit the resource of the previous level, as in the
+raw CSVs.
+
+No Swift code reads the index, so for the app's parsed_json_files it is kept
+in data_extraction/upgrade_index.json (gitignored) rather than in the bundled
+upgrade_info folder; any other parsed directory keeps it next to its data.
+derived_path() applies the same rule to other Python-only outputs.
+
+Run:
+  python3 data_extraction/upgrade_index.py --benchmark
+"""
+import argparse
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+WORKSPACE_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+PARSED_DIR = os.path.join(
+    WORKSPACE_ROOT, "clash_widgets", "upgrade_info", "parsed_json_files"
+)
+UPGRADE_INDEX_NAME = "upgrade_index.json"
+UPGRADE_INDEX_PATH = os.path.join(WORKSPACE_ROOT, "data_extraction", UPGRADE_INDEX_NAME)
+INDEX_VERSION = 1
+
+BUILDING_DATASETS = ("buildings", "traps")
+# dataset -> what gates the unit's level requirement column
+UNIT_DATASETS = {
+    "characters": "Laboratory",
+    "spells": "Laboratory",
+    "pets": "Pet Shop",
+    "heroes": "townHall",
+}
+
+# (level, timeSeconds, resource, cost, requirement)
+LevelRow = Tuple[int, int, str, int, int]
+
+
+def _to_int(value: Any) -> int:
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def derived_path(name: str, parsed_dir: str = PARSED_DIR) -> str:
+    """Where a file derived from ``parsed_dir`` that only the Python tools read
+    lives: data_extraction/ for the app's bundled parsed_json_files, otherwise
+    next to the data."""
+    if os.path.abspath(parsed_dir) == os.path.abspath(PARSED_DIR):
+        return os.path.join(WORKSPACE_ROOT, "data_extraction", name)
+    return os.path.join(parsed_dir, name)
+
+
+def upgrade_index_path(parsed_dir: str = PARSED_DIR) -> str:
+    return derived_path(UPGRADE_INDEX_NAME, parsed_dir)
+
+
+def load_parsed_datasets(
+    parsed_dir: str = PARSED_DIR, names: Optional[Sequence[str]] = None
+) -> Dict[str, List[Dict[str, Any]]]:
+    if names is None:
+        names = (*BUILDING_DATASETS, *UNIT_DATASETS, "townhall_levels")
+    datasets: Dict[str, List[Dict[str, Any]]] = {}
+    for name in names:
+        path = os.path.join(parsed_dir, f"{name}.json")
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as in_file:
+            datasets[name] = json.load(in_file)
+    return datasets
+
+
+def building_level_rows(item: Dict[str, Any]) -> List[LevelRow]:
+    rows: List[LevelRow] = []
+    resource = ""
+    for level in item.get("levels", []):
+        resource = level.get("buildResource", level.get("BuildResource", "")) or resource
+        rows.append((
+            _to_int(level.get("level")),
+            _to_int(level.get("buildTimeSeconds")),
+            resource,
+            _to_int(level.get("buildCost", level.get("BuildCost"))),
+            _to_int(level.get("townHallLevel", level.get("TownHallLevel"))),
+        ))
+    return rows
+
+
+def unit_level_rows(item: Dict[str, Any]) -> List[LevelRow]:
+    rows: List[LevelRow] = []
+    resource = ""
+    for level in item.get("levels", []):
+        resource = level.get("UpgradeResource", "") or resource
+        requirement = level.get("LaboratoryLevel", "")
+        if requirement in ("", None):
+            requirement = level.get("RequiredTownHallLevel", "")
+        rows.append((
+            _to_int(level.get("level")),
+            _to_int(level.get("upgradeTimeSeconds")),
+            resource,
+            _to_int(level.get("UpgradeCost")),
+            _to_int(requirement),
+        ))
+    return rows
+
+
+def _prefix_sums(
+    rows: List[LevelRow], unit_costs: bool
+) -> Tuple[int, List[int], Dict[str, List[int]]]:
+    by_level = {row[0]: row for row in rows if row[0] > 0}
+    max_level = max(by_level, default=0)
+    times = [0] * (max_level + 1)
+    costs: Dict[str, List[int]] = {}
+    for level in range(1, max_level + 1):
+        # Building level L carries its own cost; unit level L carries the cost
+        # of going from L to L + 1, so reaching L sums levels 1..L-1.
+        source = by_level.get(level - 1 if unit_costs else level)
+        times[level] = times[level - 1]
+        for series in costs.values():
+            series[level] = series[level - 1]
+        if source is None:
+            continue
+        _, seconds, resource, cost, _ = source
+        times[level] += seconds
+        if cost > 0 and resource:
+            # A new series is zero below this level, which is its prefix sum.
+            costs.setdefault(resource, [0] * (max_level + 1))[level] += cost
+    return max_level, times, costs
+
+
+def _cap_level(rows: List[LevelRow], gate: int) -> int:
+    return max((row[0] for row in rows if row[0] > 0 and row[4] <= gate), default=0)
+
+
+def build_upgrade_index(datasets: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+    town_halls = sorted(
+        _to_int(entry.get("townHallLevel"))
+        for entry in datasets.get("townhall_levels", [])
+    )
+
+    entities: Dict[str, Dict[str, Any]] = {}
+    gate_caps: Dict[str, List[int]] = {"townHall": list(town_halls)}
+
+    for dataset in BUILDING_DATASETS:
+        for item in datasets.get(dataset, []):
+            if "id" not in item:
+                continue
+            rows = building_level_rows(item)
+            max_level, times, costs = _prefix_sums(rows, unit_costs=False)
+            caps = [_cap_level(rows, th) for th in town_halls]
+            entities[str(item["id"])] = {
+                "dataset": dataset,
+                "internalName": item.get("internalName", ""),
+                "maxLevel": max_level,
+                "maxLevelByTownHall": caps,
+                "cumulativeTimeSeconds": times,
+                "cumulativeCost": costs,
+            }
+            gate_name = item.get("internalName", "")
+            if gate_name in UNIT_DATASETS.values() and gate_name not in gate_caps:
+                gate_caps[gate_name] = caps
+
+    for dataset, gate in UNIT_DATASETS.items():
+        gates = gate_caps.get(gate, [0] * len(town_halls))
+        for item in datasets.get(dataset, []):
+            if "id" not in item:
+                continue
+            rows = unit_level_rows(item)
+            max_level, times, costs = _prefix_sums(rows, unit_costs=True)
+            entities[str(item["id"])] = {
+                "dataset": dataset,
+                "internalName": item.get("internalName", ""),
+                "maxLevel": max_level,
+                "maxLevelByTownHall": [_cap_level(rows, g) for g in gates],
+                "cumulativeTimeSeconds": times,
+                "cumulativeCost": costs,
+            }
+
+    return {
+        "version": INDEX_VERSION,
+        "townHallLevels": town_halls,
+        "entities": entities,
+    }
+
+
+def encode_upgrade_index(index: Dict[str, Any]) -> bytes:
+    # Long numeric arrays: keep the file compact rather than one value per line.
+    return (
+        json.dumps(index, ensure_ascii=False, separators=(",", ":")) + "\n"
+    ).encode("utf-8")
+
+
+class UpgradeIndex:
+    """Query API over the precomputed index; every query is O(1)."""
+
+    def __init__(self, index: Dict[str, Any]) -> None:
+        self.town_halls: List[int] = index.get("townHallLevels", [])
+        self.entities: Dict[int, Dict[str, Any]] = {
+            int(key): value for key, value in index.get("entities", {}).items()
+        }
+        self._town_hall_position = {th: i for i, th in enumerate(self.town_halls)}
+        # (maxLevel, caps, cumulative times, ((resource, cumulative costs), ...))
+        self._compiled: Dict[int, Tuple[int, List[int], List[int], Tuple[Tuple[str, List[int]], ...]]] = {
+            entity_id: (
+                entity["maxLevel"],
+                entity["maxLevelByTownHall"],
+                entity["cumulativeTimeSeconds"],
+                tuple(entity["cumulativeCost"].items()),
+            )
+            for entity_id, entity in self.entities.items()
+        }
+
+    @classmethod
+    def load(cls, path: str = UPGRADE_INDEX_PATH) -> "UpgradeIndex":
+        with open(path, "r", encoding="utf-8") as in_file:
+            return cls(json.load(in_file))
+
+    @classmethod
+    def from_parsed_dir(cls, parsed_dir: str = PARSED_DIR) -> "UpgradeIndex":
+        return cls(build_upgrade_index(load_parsed_datasets(parsed_dir)))
+
+    @classmethod
+    def for_parsed_dir(cls, parsed_dir: str = PARSED_DIR) -> "UpgradeIndex":
+        """The index the pipeline wrote for ``parsed_dir``, or one built from
+        the datasets when it has not been written yet."""
+        path = upgrade_index_path(parsed_dir)
+        if os.path.exists(path):
+            return cls.load(path)
+        return cls.from_parsed_dir(parsed_dir)
+
+    def __contains__(self, entity_id: int) -> bool:
+        return entity_id in self._compiled
+
+    def max_level(self, entity_id: int, town_hall_level: Optional[int] = None) -> int:
+        entity = self._compiled.get(entity_id)
+        if entity is None:
+            return 0
+        if town_hall_level is None:
+            return entity[0]
+        position = self._town_hall_position.get(town_hall_level)
+        if position is None:
+            if not self.town_halls or town_hall_level < self.town_halls[0]:
+                return 0
+            position = len(self.town_halls) - 1
+        return entity[1][position]
+
+    def upgrade_between(
+        self, entity_id: int, from_level: int, to_level: int
+    ) -> Tuple[int, Dict[str, int]]:
+        """Time and per-resource cost of going from ``from_level`` to ``to_level``."""
+        entity = self._compiled.get(entity_id)
+        if entity is None:
+            return 0, {}
+        top, _, times, costs = entity
+        b = to_level if to_level < top else top
+        if b < 0:
+            b = 0
+        a = from_level if from_level < b else b
+        if a < 0:
+            a = 0
+        output = {}
+        for resource, series in costs:
+            amount = series[b] - series[a]
+            if amount:
+                output[resource] = amount
+        return times[b] - times[a], output
+
+    def time_between(self, entity_id: int, from_level: int, to_level: int) -> int:
+        return self.upgrade_between(entity_id, from_level, to_level)[0]
+
+    def cost_between(self, entity_id: int, from_level: int, to_level: int) -> Dict[str, int]:
+        return self.upgrade_between(entity_id, from_level, to_level)[1]
+
+    def remaining_to_cap(
+        self, entity_id: int, current_level: int, town_hall_level: int
+    ) -> Tuple[int, Dict[str, int]]:
+        cap = self.max_level(entity_id, town_hall_level)
+        return self.upgrade_between(entity_id, current_level, cap)
+
+
+def naive_cost_between(
+    rows: List[LevelRow], from_level: int, to_level: int, unit_costs: bool
+) -> Tuple[int, Dict[str, int]]:
+    """Reference implementation: walk the levels like the Swift progress code."""
+    total_time = 0
+    totals: Dict[str, int] = {}
+    for level, seconds, resource, cost, _ in rows:
+        if unit_costs:
+            included = max(from_level, 1) <= level < to_level
+        else:
+            included = from_level < level <= to_level
+        if not included:
+            continue
+        total_time += seconds
+        if cost > 0 and resource:
+            totals[resource] = totals.get(resource, 0) + cost
+    return total_time, totals
+
+
+def benchmark(
+    datasets: Dict[str, List[Dict[str, Any]]], queries: int = 100_000, seed: int = 7
+) -> Dict[str, float]:
+    index = UpgradeIndex(build_upgrade_index(datasets))
+    rows_by_id: Dict[int, Tuple[List[LevelRow], bool]] = {}
+    for dataset in BUILDING_DATASETS:
+        for item in datasets.get(dataset, []):
+            if "id" in item:
+                rows_by_id[item["id"]] = (building_level_rows(item), False)
+    for dataset in UNIT_DATASETS:
+        for item in datasets.get(dataset, []):
+            if "id" in item:
+                rows_by_id[item["id"]] = (unit_level_rows(item), True)
+
+    rng = random.Random(seed)
+    ids = [i for i in rows_by_id if index.max_level(i) > 0]
+    workload = []
+    for _ in range(queries):
+        entity_id = rng.choice(ids)
+        top = index.max_level(entity_id)
+        a = rng.randint(0, top)
+        workload.append((entity_id, a, rng.randint(a, top)))
+
+    start = time.perf_counter()
+    naive = [
+        naive_cost_between(rows_by_id[e][0], a, b, rows_by_id[e][1])
+        for e, a, b in workload
+    ]
+    naive_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    indexed = [index.upgrade_between(e, a, b) for e, a, b in workload]
+    index_seconds = time.perf_counter() - start
+
+    if naive != indexed:
+        raise AssertionError("Index results differ from the naive level walk")
+    return {
+        "queries": float(queries),
+        "naiveSeconds": naive_seconds,
+        "indexSeconds": index_seconds,
+        "speedup": naive_seconds / index_seconds if index_seconds else float("inf"),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Build or benchmark the per-Town-Hall upgrade index."
+    )
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--queries", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    datasets = load_parsed_datasets(args.parsed_dir)
+    if args.benchmark:
+        print(json.dumps(benchmark(datasets, args.queries), indent=2))
+        return
+
+    output_path = upgrade_index_path(args.parsed_dir)
+    with open(output_path, "wb") as out_file:
+        out_file.write(encode_upgrade_index(build_upgrade_index(datasets)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+Builder schedule for the remaining home-village upgrades of an export.
+
+Every building, trap and hero instance becomes a chain of one-level upgrade
+jobs (level L before L+1, durations from upgrade_index.json, instant ones
+such as walls dropped); missing buildings start a chain at level 1. Upgrades
+already running keep their builder and remaining timer (more of them than
+--builders each hold a temporary slot until they finish). With --town-hall above
+the export's level, the Town Hall chain comes first, and a job needing a higher
+Town Hall (a level past the old cap, or a building the old Town Hall did not
+allow) waits for it.
+
+The schedule is built with list scheduling: whenever a builder is free, it
+takes the available job whose chain has the most work left (critical path
+first, longest job on ties). The Builder's Apprentice, if any, works one hour a
+day on the running upgrade with the most chain work left, at its
+BoostMultiplier from villager_apprentices.json, like timer_simulator.py.
+
+--improve runs a depth-first branch and bound over the same dispatch decisions
+(the --width best candidates at each one) within a node and time budget,
+pruned with max(longest chain left, remaining work / builders) minus what the
+apprentice could still save.
+
+Run:
+  python3 data_extraction/upgrade_order.py misc_files/sample.json
+  python3 data_extraction/upgrade_order.py misc_files/sample.json --town-hall 18 --builders 6 --improve 0.5
+"""
+import argparse
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from analyze_exports import ReferenceData, export_town_hall_level
+from timer_simulator import (
+    BUILDER_APPRENTICE_ID,
+    HELPER_COOLDOWN_SECONDS,
+    HELPER_WORK_SECONDS,
+    export_helpers,
+    load_helper_multipliers,
+)
+from upgrade_index import PARSED_DIR
+
+WORKER_BUILDING_NAME = "worker building"
+HELPER_PERIOD_SECONDS = HELPER_WORK_SECONDS + HELPER_COOLDOWN_SECONDS
+
+
+@dataclass(frozen=True)
+class UpgradeJob:
+    data: int
+    level: int
+    seconds: int
+    # Town Hall level the job waits for (0 = none beyond the chain order)
+    town_hall: int = 0
+    running: bool = False
+    goblin: bool = False
+
+
+@dataclass
+class ScheduledUpgrade:
+    start: float
+    end: float
+    # builder slot, -1 for goblin builders
+    builder: int
+    data: int
+    level: int
+
+
+@dataclass
+class UpgradePlan:
+    upgrades: List[ScheduledUpgrade] = field(default_factory=list)
+    makespan: float = 0.0
+    lower_bound: float = 0.0
+    nodes: int = 0
+    proven: bool = False
+
+
+class _State:
+    __slots__ = ("now", "next_pos", "busy", "running", "free", "window", "work", "town_hall")
+
+    def copy(self) -> "_State":
+        other = _State.__new__(_State)
+        other.now = self.now
+        other.next_pos = self.next_pos[:]
+        other.busy = self.busy[:]
+        other.running = self.running[:]
+        other.free = self.free[:]
+        other.window = self.window
+        other.work = self.work
+        other.town_hall = self.town_hall
+        return other
+
+
+class UpgradeScheduler:
+    def __init__(
+        self,
+        chains: Sequence[Sequence[UpgradeJob]],
+        builders: int,
+        town_hall: int = 0,
+        town_hall_chain: Optional[int] = None,
+        apprentice_multiplier: float = 0.0,
+        apprentice_ready: int = 0,
+    ) -> None:
+        self.chains = [list(chain) for chain in chains if chain]
+        self.builders = max(builders, 1)
+        self.town_hall = town_hall
+        self.town_hall_chain = None
+        if town_hall_chain is not None and chains[town_hall_chain]:
+            self.town_hall_chain = sum(1 for chain in chains[:town_hall_chain] if chain)
+        self.apprentice = apprentice_multiplier
+        self.apprentice_ready = apprentice_ready
+        # work left in each chain from each position on
+        self.tails: List[List[int]] = []
+        for chain in self.chains:
+            tail = [0] * (len(chain) + 1)
+            for pos in range(len(chain) - 1, -1, -1):
+                tail[pos] = tail[pos + 1] + chain[pos].seconds
+            self.tails.append(tail)
+
+    def _root(self) -> _State:
+        state = _State()
+        state.now = 0.0
+        state.next_pos = [0] * len(self.chains)
+        state.busy = [False] * len(self.chains)
+        state.running = []
+        state.free = list(range(self.builders - 1, -1, -1))
+        state.window = float(self.apprentice_ready) if self.apprentice else float("inf")
+        state.work = sum(tail[0] for chain, tail in zip(self.chains, self.tails) if not chain[0].goblin)
+        state.town_hall = self.town_hall
+        # upgrades already underway hold their builder from the start; any past
+        # the builder count get a slot of their own that is gone once they end
+        extra = self.builders
+        for c, chain in enumerate(self.chains):
+            if chain[0].running:
+                if not chain[0].goblin and not state.free:
+                    state.free.append(extra)
+                    extra += 1
+                self._start(state, c)
+        return state
+
+    def _start(self, state: _State, c: int) -> None:
+        pos = state.next_pos[c]
+        job = self.chains[c][pos]
+        slot = -1 if job.goblin else state.free.pop()
+        state.running.append((state.now + job.seconds, c, pos, slot, state.now))
+        state.next_pos[c] = pos + 1
+        state.busy[c] = True
+        if not job.goblin:
+            state.work -= job.seconds
+
+    def _candidates(self, state: _State) -> List[int]:
+        chains, tails, next_pos, busy = self.chains, self.tails, state.next_pos, state.busy
+        town_hall = state.town_hall
+        candidates = [
+            c
+            for c in range(len(chains))
+            if not busy[c]
+            and next_pos[c] < len(chains[c])
+            and chains[c][next_pos[c]].town_hall <= town_hall
+        ]
+        candidates.sort(
+            key=lambda c: (-tails[c][next_pos[c]], -chains[c][next_pos[c]].seconds, c)
+        )
+        return candidates
+
+    def _apply_apprentice(self, state: _State) -> None:
+        window = state.window
+        state.window = window + HELPER_PERIOD_SECONDS
+        if not state.running:
+            return
+        rate = 1.0 + self.apprentice
+        index = max(
+            range(len(state.running)),
+            key=lambda i: state.running[i][0] + self.tails[state.running[i][1]][state.running[i][2] + 1],
+        )
+        finish, c, pos, slot, start = state.running[index]
+        left = finish - window
+        if left <= rate * HELPER_WORK_SECONDS:
+            finish = window + left / rate
+        else:
+            finish -= self.apprentice * HELPER_WORK_SECONDS
+        state.running[index] = (finish, c, pos, slot, start)
+
+    def _settle(self, state: _State, log: Optional[List[ScheduledUpgrade]]) -> Optional[List[int]]:
+        """Advance to the next dispatch decision; None once everything is done."""
+        while True:
+            if state.free:
+                candidates = self._candidates(state)
+                if candidates:
+                    return candidates
+            if not state.running:
+                if any(pos < len(chain) for pos, chain in zip(state.next_pos, self.chains)):
+                    raise ValueError("Upgrades wait on a Town Hall level that is never reached")
+                return None
+            index = min(range(len(state.running)), key=lambda i: state.running[i][0])
+            finish = state.running[index][0]
+            if state.window < finish:
+                state.now = max(state.now, state.window)
+                self._apply_apprentice(state)
+                continue
+            _, c, pos, slot, start = state.running.pop(index)
+            state.now = finish
+            state.busy[c] = False
+            if 0 <= slot < self.builders:
+                state.free.append(slot)
+            job = self.chains[c][pos]
+            if c == self.town_hall_chain:
+                state.town_hall = job.level
+            if log is not None:
+                log.append(ScheduledUpgrade(start, finish, slot, job.data, job.level))
+
+    def _lower_bound(self, state: _State, horizon: float) -> float:
+        now = state.now
+        savings = 0.0
+        if self.apprentice and state.window < horizon:
+            windows = int((horizon - state.window) // HELPER_PERIOD_SECONDS) + 1
+            savings = windows * self.apprentice * HELPER_WORK_SECONDS
+        running_work = 0.0
+        bound = now
+        ends = {}
+        for finish, c, pos, slot, _ in state.running:
+            ends[c] = finish
+            if 0 <= slot < self.builders:
+                running_work += finish - now
+            bound = max(bound, finish - savings)
+        for c, tail in enumerate(self.tails):
+            left = tail[state.next_pos[c]]
+            if left:
+                bound = max(bound, ends.get(c, now) + left - savings)
+        return max(bound, now + (running_work + state.work - savings) / self.builders)
+
+    def _greedy(self, state: _State, log: Optional[List[ScheduledUpgrade]]) -> float:
+        while True:
+            candidates = self._settle(state, log)
+            if candidates is None:
+                return state.now
+            self._start(state, candidates[0])
+
+    def schedule(self, improve_seconds: float = 0.0, max_nodes: int = 200_000, width: int = 3) -> UpgradePlan:
+        root = self._root()
+        log: List[ScheduledUpgrade] = []
+        best = self._greedy(root.copy(), log)
+        plan = UpgradePlan(log, best, self._lower_bound(root, best))
+        plan.proven = plan.makespan <= plan.lower_bound + 1
+        if improve_seconds <= 0 or plan.proven:
+            plan.upgrades.sort(key=lambda u: (u.start, u.builder))
+            return plan
+
+        # DFS over dispatch decisions; a node records the choices leading to
+        # it, so the winning schedule is replayed once at the end.
+        deadline = time.perf_counter() + improve_seconds
+        best_choices: Optional[List[int]] = None
+        stack: List[Tuple[_State, List[int]]] = [(root, [])]
+        nodes = 0
+        while stack:
+            if nodes >= max_nodes or (nodes & 255 == 0 and time.perf_counter() > deadline):
+                break
+            state, choices = stack.pop()
+            nodes += 1
+            candidates = self._settle(state, None)
+            if candidates is None:
+                if state.now < best - 1:
+                    best, best_choices = state.now, choices
+                continue
+            if self._lower_bound(state, best) >= best - 1:
+                continue
+            options = candidates[:width]
+            for i in range(len(options) - 1, -1, -1):
+                child = state.copy() if i else state
+                self._start(child, options[i])
+                stack.append((child, choices + [options[i]]))
+
+        plan.nodes = nodes
+        # only the bound proves optimality: the search skips candidates past
+        # --width and never leaves a builder idle on purpose
+        plan.proven = best <= plan.lower_bound + 1
+        if best_choices is not None:
+            state, log = self._root(), []
+            for choice in best_choices:
+                self._settle(state, log)
+                self._start(state, choice)
+            plan.makespan = self._greedy(state, log)
+            plan.upgrades = log
+        plan.upgrades.sort(key=lambda u: (u.start, u.builder))
+        return plan
+
+
+def _unlock_town_hall(reference: ReferenceData, entity_id: int, level: int, current: int, target: int) -> int:
+    """Lowest Town Hall in (current, target] whose cap allows ``level``; 0 when
+    the current Town Hall already does."""
+    if reference.index.max_level(entity_id, current) >= level:
+        return 0
+    for town_hall in range(current + 1, target + 1):
+        if reference.index.max_level(entity_id, town_hall) >= level:
+            return town_hall
+    return target
+
+
+def remaining_upgrade_chains(
+    export: Dict[str, Any],
+    reference: ReferenceData,
+    town_hall: Optional[int] = None,
+    heroes: bool = True,
+) -> Tuple[List[List[UpgradeJob]], int, Optional[int]]:
+    """(chains, current Town Hall, index of the Town Hall chain or None)."""
+    index = reference.index
+    current = export_town_hall_level(export, reference)
+    target = max(town_hall or current, current)
+    chains: List[List[UpgradeJob]] = []
+
+    def add_chain(entity_id: int, level: int, cap: int, timer: int = 0, goblin: bool = False) -> None:
+        chain: List[UpgradeJob] = []
+        if timer:
+            chain.append(UpgradeJob(entity_id, level + 1, timer, 0, True, goblin))
+            level += 1
+        for next_level in range(level + 1, cap + 1):
+            seconds = index.time_between(entity_id, next_level - 1, next_level)
+            if seconds > 0:
+                gate = _unlock_town_hall(reference, entity_id, next_level, current, target)
+                chain.append(UpgradeJob(entity_id, next_level, seconds, gate))
+        if chain:
+            chains.append(chain)
+
+    town_hall_chain = None
+    town_hall_item = next(
+        (item for item in export.get("buildings") or [] if item.get("data") == reference.town_hall_id),
+        None,
+    )
+    if reference.town_hall_id is not None and (target > current or (town_hall_item or {}).get("timer")):
+        town_hall_chain = len(chains)
+        chains.append([])
+        timer = (town_hall_item or {}).get("timer") or 0
+        level = current
+        if timer:
+            chains[-1].append(UpgradeJob(reference.town_hall_id, level + 1, timer, 0, True))
+            level += 1
+        for next_level in range(level + 1, target + 1):
+            seconds = index.time_between(reference.town_hall_id, next_level - 1, next_level)
+            chains[-1].append(UpgradeJob(reference.town_hall_id, next_level, seconds))
+
+    for key, ids in (("buildings", reference.building_ids), ("traps", reference.trap_ids)):
+        required = reference.counts_by_town_hall.get(target, {})
+        items_by_id: Dict[int, List[Dict[str, Any]]] = {}
+        for item in export.get(key) or []:
+            if item.get("lvl") is not None:
+                items_by_id.setdefault(item["data"], []).append(item)
+        for name, required_count in required.items():
+            entity_id = ids.get(name.lower())
+            if entity_id is None or entity_id == reference.town_hall_id:
+                continue
+            cap = index.max_level(entity_id, target)
+            if cap == 0:
+                continue
+            placed = 0
+            for item in items_by_id.get(entity_id, []):
+                count = max(item.get("cnt") or 1, 1)
+                placed += count
+                for _ in range(count):
+                    add_chain(entity_id, item["lvl"], cap, item.get("timer") or 0, bool(item.get("extra")))
+            for instance in range(placed, required_count):
+                # the instance-th copy may only be allowed by a later Town Hall
+                unlock = next(
+                    (
+                        th
+                        for th in range(current, target + 1)
+                        if reference.counts_by_town_hall.get(th, {}).get(name, 0) > instance
+                    ),
+                    target,
+                )
+                start = len(chains)
+                add_chain(entity_id, 0, cap)
+                if len(chains) > start and unlock > current:
+                    chains[-1] = [
+                        UpgradeJob(j.data, j.level, j.seconds, max(j.town_hall, unlock), j.running, j.goblin)
+                        for j in chains[-1]
+                    ]
+
+    if heroes:
+        for item in export.get("heroes") or []:
+            entity_id, level = item.get("data"), item.get("lvl")
+            if entity_id not in index or level is None:
+                continue
+            add_chain(entity_id, level, index.max_level(entity_id, target), item.get("timer") or 0)
+    return chains, current, town_hall_chain
+
+
+def export_builders(export: Dict[str, Any], reference: ReferenceData) -> int:
+    worker_id = reference.building_ids.get(WORKER_BUILDING_NAME)
+    return sum(
+        max(item.get("cnt") or 1, 1)
+        for item in export.get("buildings") or []
+        if item.get("data") == worker_id
+    )
+
+
+def plan_export(
+    export: Dict[str, Any],
+    reference: ReferenceData,
+    town_hall: Optional[int] = None,
+    builders: Optional[int] = None,
+    apprentice_level: Optional[int] = None,
+    heroes: bool = True,
+    improve_seconds: float = 0.0,
+    max_nodes: int = 200_000,
+    width: int = 3,
+    parsed_dir: str = PARSED_DIR,
+) -> Tuple[UpgradePlan, int]:
+    """Schedule an export's remaining upgrades; returns (plan, job count)."""
+    chains, current, town_hall_chain = remaining_upgrade_chains(export, reference, town_hall, heroes)
+    helper_level, helper_cooldown = export_helpers(export).get(BUILDER_APPRENTICE_ID, (0, 0))
+    if apprentice_level is not None:
+        helper_level = apprentice_level
+    multiplier = 0.0
+    if helper_level:
+        multiplier = load_helper_multipliers(parsed_dir)["builder_apprentice"].get(helper_level, float(helper_level))
+    scheduler = UpgradeScheduler(
+        chains,
+        builders or export_builders(export, reference) or 1,
+        current,
+        town_hall_chain,
+        multiplier,
+        helper_cooldown,
+    )
+    return scheduler.schedule(improve_seconds, max_nodes, width), sum(len(chain) for chain in chains)
+
+
+def _format_seconds(seconds: float) -> str:
+    seconds = int(round(seconds))
+    days, rest = divmod(seconds, 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes = rest // 60
+    return f"{days}d {hours:02d}h {minutes:02d}m" if days else f"{hours}h {minutes:02d}m"
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Order the remaining builder upgrades of an export.")
+    parser.add_argument("export", help="player export JSON")
+    parser.add_argument("--town-hall", type=int, help="plan up to this Town Hall's caps (default: current)")
+    parser.add_argument("--builders", type=int, help="number of builders (default: Builder's Huts in the export)")
+    parser.add_argument("--apprentice", type=int, help="Builder's Apprentice level (default: from the export)")
+    parser.add_argument("--no-heroes", action="store_true", help="leave hero upgrades out")
+    parser.add_argument("--improve", type=float, default=0.0, metavar="SECONDS",
+                        help="spend up to SECONDS on branch and bound after the heuristic")
+    parser.add_argument("--max-nodes", type=int, default=200_000)
+    parser.add_argument("--width", type=int, default=3, help="candidates tried per decision when improving")
+    parser.add_argument("--parsed-dir", default=PARSED_DIR)
+    parser.add_argument("--format", choices=("text", "json"), default="text")
+    args = parser.parse_args(argv)
+
+    with open(args.export, "r", encoding="utf-8") as in_file:
+        export = json.load(in_file)
+    reference = ReferenceData(args.parsed_dir)
+    started = time.perf_counter()
+    plan, jobs = plan_export(
+        export, reference, args.town_hall, args.builders, args.apprentice, not args.no_heroes,
+        args.improve, args.max_nodes, args.width, args.parsed_dir,
+    )
+    elapsed = time.perf_counter() - started
+
+    if args.format == "json":
+        print(json.dumps({
+            "makespan": plan.makespan,
+            "lowerBound": plan.lower_bound,
+            "proven": plan.proven,
+            "upgrades": [
+                {"start": u.start, "end": u.end, "builder": u.builder, "data": u.data, "level": u.level}
+                for u in plan.upgrades
+            ],
+        }))
+        return
+    names = {entity_id: entity["internalName"] for entity_id, entity in reference.index.entities.items()}
+    for upgrade in plan.upgrades:
+        builder = "goblin" if upgrade.builder < 0 else f"builder {upgrade.builder + 1}"
+        print(
+            f"{_format_seconds(upgrade.start):>14} -> {_format_seconds(upgrade.end):>14}  {builder:<10}"
+            f" {names.get(upgrade.data, upgrade.data)} level {upgrade.level}"
+        )
+    gap = (plan.makespan - plan.lower_bound) / plan.lower_bound * 100 if plan.lower_bound else 0.0
+    print(
+        f"{jobs} upgrades done in {_format_seconds(plan.makespan)}"
+        f" (lower bound {_format_seconds(plan.lower_bound)}, gap {gap:.1f}%"
+        f"{', optimal' if plan.proven else ''}); planned in {elapsed * 1000:.0f} ms"
+        + (f", {plan.nodes} nodes" if plan.nodes else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Per-member war statistics streamed from saved war history.
+
+Inputs are files holding war data in any of the shapes the API returns or
+that tools/clash_api_fetcher.py writes: a single war (currentwar or a CWL
+war, misc_files/war_details.json), a war log ({"items": [...]},
+misc_files/war_log.json), a JSON array of either, a fetcher result (clan,
+currentWar, warLog, leagueWars) or JSONL with one document per line.
+
+Files are read in chunks and decoded one war at a time with
+JSONDecoder.raw_decode, so memory stays bounded by the largest single war
+rather than the file. War details give the per-member numbers (stars, new
+stars, destruction, attacks used out of attacks available, triples and
+TH-vs-TH hit rates); war log entries only carry clan results and feed the
+win/loss summary. Every war and war log entry becomes its own partial table
+keyed by clan, opponent and time, so one saved in several files (or twice in
+one) is counted once; an ended copy wins over a live one. With --jobs > 1
+files are processed in a multiprocessing pool and the partials are
+de-duplicated across files before they are merged.
+
+Run:
+  python3 data_extraction/war_analytics.py misc_files/war_details.json misc_files/war_log.json
+  python3 data_extraction/war_analytics.py history/ --jobs 8 --format json --output war_stats.json
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+from dataclasses import dataclass, field
+from multiprocessing import Pool
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+TABLE_VERSION = 1
+CHUNK_SIZE = 256 * 1024
+ENDED_STATES = ("warEnded",)
+LIVE_STATES = ("inWar",)
+
+MEMBER_COLUMNS = (
+    "tag",
+    "name",
+    "townHallLevel",
+    "wars",
+    "attacksAvailable",
+    "attacksUsed",
+    "stars",
+    "newStars",
+    "triples",
+    "destruction",
+    "avgStars",
+    "avgDestruction",
+    "attackUsage",
+    "defenses",
+    "starsConceded",
+)
+
+
+class JsonStream:
+    """Incremental JSON reader over a text file, one value at a time."""
+
+    def __init__(self, in_file: TextIO, chunk_size: int = CHUNK_SIZE) -> None:
+        self.in_file = in_file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.in_file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character, or "" at the end of the input."""
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in " \t\r\n":
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in JSON stream, found {self.peek()!r}")
+        self.position += 1
+
+    def value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # A number cut at the buffer edge decodes fine but may go on.
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.position = end
+            return value
+
+    def _separator(self, closing: str) -> bool:
+        """Consume ',' and return True, or the closing bracket and return False."""
+        char = self.peek()
+        self.position += 1
+        if char == ",":
+            return True
+        if char == closing:
+            return False
+        raise ValueError(f"Expected ',' or {closing!r} in JSON stream, found {char!r}")
+
+    def items(self) -> Iterator[None]:
+        """Step through an array; the caller reads each element before resuming."""
+        self.expect("[")
+        if self.peek() == "]":
+            self.position += 1
+            return
+        while True:
+            yield None
+            if not self._separator("]"):
+                return
+
+    def keys(self) -> Iterator[str]:
+        """Step through an object; the caller reads each value before resuming."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.position += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(":")
+            yield key
+            if not self._separator("}"):
+                return
+
+
+def is_war(document: Any) -> bool:
+    return (
+        isinstance(document, dict)
+        and isinstance(document.get("clan"), dict)
+        and "members" in document["clan"]
+    )
+
+
+def is_log_entry(document: Any) -> bool:
+    return isinstance(document, dict) and "result" in document and "clan" in document
+
+
+def _classify(document: Any) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    if is_war(document):
+        yield "war", document
+    elif is_log_entry(document):
+        yield "log", document
+    elif isinstance(document, dict):
+        for key in ("items", "wars"):
+            for item in document.get(key) or []:
+                yield from _classify(item)
+    elif isinstance(document, list):
+        for item in document:
+            yield from _classify(item)
+
+
+def _stream_document(stream: JsonStream) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    char = stream.peek()
+    if char == "[":
+        for _ in stream.items():
+            yield from _stream_document(stream)
+        return
+    if char != "{":
+        stream.value()
+        return
+
+    # Walk the top-level object so war lists and league wars are decoded one
+    # war at a time; small members are collected and classified at the end.
+    rest: Dict[str, Any] = {}
+    for key in stream.keys():
+        if key in ("items", "wars") and stream.peek() == "[":
+            for _ in stream.items():
+                yield from _stream_document(stream)
+        elif key == "leagueWars" and stream.peek() == "{":
+            for _ in stream.keys():
+                yield from _stream_document(stream)
+        elif key in ("warLog", "currentWar"):
+            yield from _stream_document(stream)
+        elif key == "members" and stream.peek() == "{":
+            # fetcher results: member profiles keyed by tag, not needed here
+            for _ in stream.keys():
+                stream.value()
+        else:
+            value = rest[key] = stream.value()
+            if key == "clan" and isinstance(value, dict) and "memberList" in value:
+                # a fetcher result names the tracked clan before its wars
+                yield "clan", value
+    if is_war(rest) or is_log_entry(rest):
+        yield from _classify(rest)
+
+
+def iter_war_documents(path: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Yield ("war" | "log" | "clan", document) from one history file."""
+    with open(path, "r", encoding="utf-8") as in_file:
+        if path.endswith(".jsonl"):
+            for line in in_file:
+                if line.strip():
+                    yield from _classify(json.loads(line))
+            return
+        stream = JsonStream(in_file)
+        while stream.peek():
+            yield from _stream_document(stream)
+
+
+@dataclass
+class MemberStats:
+    tag: str
+    name: str = ""
+    town_hall_level: int = 0
+    # sortable API timestamp of the war name and TH were taken from
+    seen: str = ""
+    wars: int = 0
+    attacks_available: int = 0
+    attacks_used: int = 0
+    stars: int = 0
+    new_stars: int = 0
+    triples: int = 0
+    destruction: float = 0.0
+    defenses: int = 0
+    stars_conceded: int = 0
+    # "attackerTH-defenderTH" -> [attacks, triples]
+    hit_rates: Dict[str, List[int]] = field(default_factory=dict)
+
+    def merge(self, other: "MemberStats") -> None:
+        if other.seen >= self.seen:
+            self.name, self.town_hall_level, self.seen = other.name, other.town_hall_level, other.seen
+        self.wars += other.wars
+        self.attacks_available += other.attacks_available
+        self.attacks_used += other.attacks_used
+        self.stars += other.stars
+        self.new_stars += other.new_stars
+        self.triples += other.triples
+        self.destruction += other.destruction
+        self.defenses += other.defenses
+        self.stars_conceded += other.stars_conceded
+        for matchup, (attacks, triples) in other.hit_rates.items():
+            totals = self.hit_rates.setdefault(matchup, [0, 0])
+            totals[0] += attacks
+            totals[1] += triples
+
+    def row(self) -> Dict[str, Any]:
+        used = self.attacks_used
+        return {
+            "tag": self.tag,
+            "name": self.name,
+            "townHallLevel": self.town_hall_level,
+            "wars": self.wars,
+            "attacksAvailable": self.attacks_available,
+            "attacksUsed": used,
+            "stars": self.stars,
+            "newStars": self.new_stars,
+            "triples": self.triples,
+            "destruction": round(self.destruction, 2),
+            "avgStars": round(self.stars / used, 3) if used else 0.0,
+            "avgDestruction": round(self.destruction / used, 2) if used else 0.0,
+            "attackUsage": round(used / self.attacks_available, 3) if self.attacks_available else 0.0,
+            "defenses": self.defenses,
+            "starsConceded": self.stars_conceded,
+        }
+
+
+@dataclass
+class ClanSummary:
+    wins: int = 0
+    losses: int = 0
+    ties: int = 0
+    wars: int = 0
+    stars: int = 0
+
+    def merge(self, other: "ClanSummary") -> None:
+        self.wins += other.wins
+        self.losses += other.losses
+        self.ties += other.ties
+        self.wars += other.wars
+        self.stars += other.stars
+
+
+@dataclass
+class WarStats:
+    members: Dict[str, MemberStats] = field(default_factory=dict)
+    clans: Dict[str, ClanSummary] = field(default_factory=dict)
+    wars: int = 0
+
+    def merge(self, other: "WarStats") -> None:
+        self.wars += other.wars
+        for tag, stats in other.members.items():
+            if tag in self.members:
+                self.members[tag].merge(stats)
+            else:
+                self.members[tag] = stats
+        for tag, summary in other.clans.items():
+            self.clans.setdefault(tag, ClanSummary()).merge(summary)
+
+
+def _war_time(war: Dict[str, Any]) -> str:
+    return war.get("preparationStartTime") or war.get("startTime") or war.get("endTime") or ""
+
+
+def _tracked_side(
+    war: Dict[str, Any], clan_tag: Optional[str]
+) -> Optional[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    clan, opponent = war.get("clan") or {}, war.get("opponent") or {}
+    if clan_tag is None or clan.get("tag") == clan_tag:
+        return clan, opponent
+    if opponent.get("tag") == clan_tag:
+        return opponent, clan
+    return None
+
+
+def add_war(stats: WarStats, war: Dict[str, Any], clan_tag: Optional[str]) -> bool:
+    sides = _tracked_side(war, clan_tag)
+    if sides is None:
+        return False
+    side, opponent = sides
+    when = _war_time(war)
+    # CWL wars carry a warTag and one attack per member
+    per_member = war.get("attacksPerMember") or 1
+    opponent_th = {m.get("tag"): m.get("townhallLevel", 0) for m in opponent.get("members", [])}
+
+    attacks: List[Tuple[int, str, Dict[str, Any]]] = []
+    for member in side.get("members", []):
+        tag = member.get("tag", "")
+        entry = stats.members.get(tag)
+        if entry is None:
+            entry = stats.members[tag] = MemberStats(tag)
+        if when >= entry.seen:
+            entry.name = member.get("name", entry.name)
+            entry.town_hall_level = member.get("townhallLevel", entry.town_hall_level)
+            entry.seen = when
+        entry.wars += 1
+        entry.attacks_available += per_member
+        for attack in member.get("attacks") or []:
+            attacks.append((attack.get("order", 0), tag, attack))
+        defense = member.get("bestOpponentAttack")
+        if member.get("opponentAttacks"):
+            entry.defenses += member["opponentAttacks"]
+        if defense:
+            entry.stars_conceded += defense.get("stars", 0)
+
+    # New stars need the attacks on each defender in order.
+    best: Dict[str, int] = {}
+    for _, tag, attack in sorted(attacks, key=lambda item: item[0]):
+        entry = stats.members[tag]
+        stars = attack.get("stars", 0)
+        defender = attack.get("defenderTag", "")
+        entry.attacks_used += 1
+        entry.stars += stars
+        entry.new_stars += max(stars - best.get(defender, 0), 0)
+        best[defender] = max(best.get(defender, 0), stars)
+        entry.destruction += attack.get("destructionPercentage", 0)
+        triple = 1 if stars == 3 else 0
+        entry.triples += triple
+        matchup = f"{entry.town_hall_level}-{opponent_th.get(defender, 0)}"
+        totals = entry.hit_rates.setdefault(matchup, [0, 0])
+        totals[0] += 1
+        totals[1] += triple
+    stats.wars += 1
+    return True
+
+
+def add_log_entry(stats: WarStats, entry: Dict[str, Any]) -> None:
+    clan = entry.get("clan") or {}
+    summary = stats.clans.setdefault(clan.get("tag", ""), ClanSummary())
+    summary.wars += 1
+    summary.stars += clan.get("stars", 0)
+    result = entry.get("result")
+    if result == "win":
+        summary.wins += 1
+    elif result == "lose":
+        summary.losses += 1
+    elif result == "tie":
+        summary.ties += 1
+
+
+# (kind, clan tag, opponent tag, time) -> (rank, partial); higher ranks win
+WarPartials = Dict[Tuple[str, str, str, str], Tuple[int, WarStats]]
+
+
+def _keep(partials: WarPartials, key: Tuple[str, str, str, str], rank: int, stats: WarStats) -> None:
+    if key not in partials or rank > partials[key][0]:
+        partials[key] = (rank, stats)
+
+
+def file_partials(path: str, clan_tag: Optional[str] = None, include_live: bool = False) -> WarPartials:
+    """One partial table per war and war log entry in ``path``."""
+    partials: WarPartials = {}
+    states = ENDED_STATES + (LIVE_STATES if include_live else ())
+    tracked = clan_tag
+    for kind, document in iter_war_documents(path):
+        if kind == "clan":
+            tracked = tracked or document.get("tag")
+            continue
+        clan_side = (document.get("clan") or {}).get("tag", "")
+        opponent_side = (document.get("opponent") or {}).get("tag", "")
+        stats = WarStats()
+        if kind == "log":
+            add_log_entry(stats, document)
+            _keep(partials, ("log", clan_side, opponent_side, document.get("endTime", "")), 0, stats)
+        elif document.get("state") in states:
+            key = ("war", clan_side, opponent_side, _war_time(document))
+            rank = 1 if document.get("state") in ENDED_STATES else 0
+            if key in partials and rank <= partials[key][0]:
+                continue
+            add_war(stats, document, tracked)
+            _keep(partials, key, rank, stats)
+    return partials
+
+
+def merge_partials(partials: WarPartials) -> WarStats:
+    total = WarStats()
+    for _, stats in partials.values():
+        total.merge(stats)
+    return total
+
+
+def analyze_file(path: str, clan_tag: Optional[str] = None, include_live: bool = False) -> WarStats:
+    return merge_partials(file_partials(path, clan_tag, include_live))
+
+
+def iter_history_files(paths: Sequence[str]) -> Iterator[str]:
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, filenames in os.walk(path):
+                for filename in sorted(filenames):
+                    if filename.endswith((".json", ".jsonl")):
+                        yield os.path.join(root, filename)
+        else:
+            yield path
+
+
+def _analyze_job(job: Tuple[str, Optional[str], bool]) -> WarPartials:
+    return file_partials(*job)
+
+
+def analyze_history(
+    paths: Sequence[str], clan_tag: Optional[str] = None, include_live: bool = False, jobs: int = 1
+) -> WarStats:
+    files = list(iter_history_files(paths))
+    work = [(path, clan_tag, include_live) for path in files]
+    # the same war is often saved in several files: keep one copy per key,
+    # taking files in order so --jobs does not change which copy that is
+    kept: WarPartials = {}
+    if jobs <= 1 or len(work) <= 1:
+        results: Iterator[WarPartials] = map(_analyze_job, work)
+        for partials in results:
+            for key, (rank, stats) in partials.items():
+                _keep(kept, key, rank, stats)
+        return merge_partials(kept)
+    with Pool(min(jobs, len(work))) as pool:
+        for partials in pool.imap(_analyze_job, work):
+            for key, (rank, stats) in partials.items():
+                _keep(kept, key, rank, stats)
+    return merge_partials(kept)
+
+
+def member_table(stats: WarStats) -> Dict[str, Any]:
+    """Columnar table: one row per member plus clan-wide TH-vs-TH hit rates."""
+    rows = sorted(
+        (member.row() for member in stats.members.values()),
+        key=lambda row: (-row["stars"], row["tag"]),
+    )
+    hit_rates: Dict[str, List[int]] = {}
+    for member in stats.members.values():
+        for matchup, (attacks, triples) in member.hit_rates.items():
+            totals = hit_rates.setdefault(matchup, [0, 0])
+            totals[0] += attacks
+            totals[1] += triples
+    return {
+        "version": TABLE_VERSION,
+        "wars": stats.wars,
+        "columns": list(MEMBER_COLUMNS),
+        "rows": [[row[column] for column in MEMBER_COLUMNS] for row in rows],
+        "memberHitRates": {
+            tag: member.hit_rates for tag, member in sorted(stats.members.items()) if member.hit_rates
+        },
+        "hitRates": dict(sorted(hit_rates.items())),
+        "clans": {
+            tag: vars(summary) for tag, summary in sorted(stats.clans.items())
+        },
+    }
+
+
+def write_table(table: Dict[str, Any], out_file: TextIO, output_format: str) -> int:
+    if output_format == "json":
+        json.dump(table, out_file, separators=(",", ":"), ensure_ascii=False)
+        out_file.write("\n")
+    else:
+        writer = csv.writer(out_file)
+        writer.writerow(table["columns"])
+        writer.writerows(table["rows"])
+    return len(table["rows"])
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Aggregate per-member war stats from war history files.")
+    parser.add_argument("paths", nargs="+", help="war history files, directories or .jsonl files")
+    parser.add_argument("--clan", help="clan tag to report on (default: the 'clan' side of each war)")
+    parser.add_argument("--include-live", action="store_true", help="also count wars still in progress")
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    parser.add_argument("--output", help="write the table here instead of stdout")
+    args = parser.parse_args(argv)
+
+    clan_tag = "#" + args.clan.strip().lstrip("#").upper() if args.clan else None
+    table = member_table(analyze_history(args.paths, clan_tag, args.include_live, args.jobs))
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as out_file:
+            count = write_table(table, out_file, args.format)
+        print(f"Wrote {count} members from {table['wars']} wars to {args.output}")
+    else:
+        write_table(table, sys.stdout, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+Resolves every entity id to its image asset and checks Assets.xcassets.
+
+Sources joined into one id -> asset index:
+  - clash_widgets/upgrade_info/json_maps/*.json  (internalName, displayName, id)
+  - clash_widgets/upgrade_info/mapping.json      (id -> display name)
+  - clash_widgets/upgrade_info/ingameunits.json  (category -> id -> name)
+  - json_files/asset_map.json                    (display name -> asset slug)
+
+Asset names are resolved the way the widget's iconName(for:) does: the
+category folder plus the sanitized display name, crafted_defenses first for
+seasonal defenses, asset_map.json overrides before either. The report lists
+ids without an image, imagesets no id resolves to, and ids the sources
+disagree on.
+
+With --thumbnails it also writes trimmed, widget-sized @2x/@3x PNGs for every
+resolved asset, in parallel, under the thumbnails/ namespace of the widget's
+asset catalog (buildings_home/cannon -> thumbnails/buildings_home/cannon).
+The widget's iconName(for:) tries thumbnails/ first, so it does not decode the
+full-size artwork for its icons. The namespace belongs to this tool: existing
+imagesets outside it are never touched. That step needs Pillow
+(pip install Pillow).
+
+Run:
+  python3 tools/asset_pipeline.py
+  python3 tools/asset_pipeline.py --index asset_index.json --json report.json
+  python3 tools/asset_pipeline.py --thumbnails --jobs 8
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+UPGRADE_INFO = ROOT / 'clash_widgets' / 'upgrade_info'
+JSON_MAPS_DIR = UPGRADE_INFO / 'json_maps'
+MAPPING_JSON = UPGRADE_INFO / 'mapping.json'
+INGAME_UNITS_JSON = UPGRADE_INFO / 'ingameunits.json'
+ASSET_MAP_JSON = ROOT / 'json_files' / 'asset_map.json'
+APP_ASSETS = ROOT / 'clash_widgets' / 'Assets.xcassets'
+WIDGET_ASSETS = ROOT / 'ClashDashWidget' / 'Assets.xcassets'
+
+# json_maps dataset -> asset catalog folders to try, in order. The first one is
+# the widget's iconName(for:) folder; builder base and hero art live in their
+# own folders and the maps do not say which village an entity belongs to.
+DATASET_FOLDERS = {
+    'buildings': ('buildings_home', 'builder_base'),
+    'traps': ('buildings_home', 'builder_base'),
+    'heroes': ('buildings_home', 'heroes', 'builder_base'),
+    'guardians': ('buildings_home',),
+    'weapons': ('buildings_home',),
+    'seasonal_defense_modules': ('crafted_defenses',),
+    'seasonal_defense_archetypes': ('crafted_defenses',),
+    'characters': ('lab', 'builder_base'),
+    'spells': ('lab',),
+    'pets': ('pets',),
+}
+# id prefix -> dataset, for ids that only appear in mapping.json
+PREFIX_DATASETS = {
+    1: 'buildings', 4: 'characters', 12: 'traps', 26: 'spells', 28: 'heroes',
+    73: 'pets', 102: 'seasonal_defense_modules', 103: 'seasonal_defense_archetypes',
+    107: 'guardians',
+}
+# json_maps display names of builder base entities carry this prefix
+BUILDER_BASE_PREFIX = 'bb_'
+# Hero equipment has no logic dataset; its ids only live in mapping.json.
+EQUIPMENT_PREFIX = 90
+# Folders of artwork that is not tied to an entity id (same list as the
+# asset browser in ContentView.swift), never reported as orphaned.
+UNMAPPED_FOLDERS = {'leagues', 'resources', 'town_hall', 'profile', 'images', 'extras'}
+
+# Largest icon frame in ClashDashWidget.swift, in points.
+DEFAULT_THUMBNAIL_POINTS = 44
+THUMBNAIL_NAMESPACE = 'thumbnails'
+THUMBNAIL_SCALES = (2, 3)
+ALPHA_THRESHOLD = 5  # same cut-off as ImageTrimmer.swift
+
+
+def sanitize(name: str) -> str:
+    """Swift's sanitize(_:) in BuilderRow/ClashDashWidget: every non-alphanumeric
+    becomes '_', edges trimmed, lowercased (runs of '_' are kept)."""
+    return ''.join(c if c.isalnum() else '_' for c in name).strip('_').lower()
+
+
+@dataclass
+class AssetEntry:
+    id: int
+    internal_name: Optional[str] = None
+    display_name: Optional[str] = None
+    dataset: Optional[str] = None
+    # shown by the app: listed in mapping.json or ingameunits.json
+    listed: bool = False
+    aliases: List[str] = field(default_factory=list)
+    candidates: List[str] = field(default_factory=list)
+    asset: Optional[str] = None
+
+    def to_json(self) -> dict:
+        return {
+            'internalName': self.internal_name,
+            'displayName': self.display_name,
+            'dataset': self.dataset,
+            'listed': self.listed,
+            'asset': self.asset,
+            'candidates': self.candidates,
+        }
+
+
+@dataclass
+class AssetReport:
+    entries: Dict[int, AssetEntry]
+    missing: List[int]
+    orphaned: List[str]
+    problems: List[str]
+
+    def to_json(self) -> dict:
+        return {
+            'missing': [
+                {'id': entity_id, **self.entries[entity_id].to_json()} for entity_id in self.missing
+            ],
+            'orphaned': self.orphaned,
+            'problems': self.problems,
+        }
+
+
+def read_json(path: Path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def scan_asset_catalog(catalog: Path) -> Dict[str, Path]:
+    """Lower-cased asset name (namespace folders included) -> .imageset path."""
+    assets: Dict[str, Path] = {}
+
+    def walk(directory: Path, namespace: str) -> None:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                path = Path(entry.path)
+                if entry.name.endswith('.imageset'):
+                    assets[(namespace + path.stem).lower()] = path
+                elif path.suffix == '':
+                    prefix = namespace
+                    contents = path / 'Contents.json'
+                    if contents.exists():
+                        props = read_json(contents).get('properties', {})
+                        if props.get('provides-namespace'):
+                            prefix = f'{namespace}{entry.name}/'
+                    walk(path, prefix)
+
+    if catalog.exists():
+        walk(catalog, '')
+    return assets
+
+
+def imageset_source(imageset: Path) -> Optional[Path]:
+    """The largest-scale image file an .imageset references."""
+    contents = imageset / 'Contents.json'
+    if not contents.exists():
+        return None
+    best: Optional[Tuple[float, Path]] = None
+    for image in read_json(contents).get('images', []):
+        filename = image.get('filename')
+        if not filename or not (imageset / filename).exists():
+            continue
+        scale = float(str(image.get('scale', '1x')).rstrip('x') or 1)
+        if best is None or scale > best[0]:
+            best = (scale, imageset / filename)
+    return best[1] if best else None
+
+
+def load_entries(json_maps_dir: Path = JSON_MAPS_DIR) -> Dict[int, AssetEntry]:
+    entries: Dict[int, AssetEntry] = {}
+    for path in sorted(json_maps_dir.glob('*_json_map.json')):
+        dataset = path.name[:-len('_json_map.json')]
+        for key, value in read_json(path).items():
+            entity_id = value.get('id') if isinstance(value, dict) else None
+            if not isinstance(entity_id, int):
+                continue
+            entries[entity_id] = AssetEntry(
+                id=entity_id,
+                internal_name=value.get('internalName', key),
+                display_name=value.get('displayName'),
+                dataset=dataset,
+            )
+    return entries
+
+
+def build_asset_index(
+    json_maps_dir: Path = JSON_MAPS_DIR,
+    mapping_path: Path = MAPPING_JSON,
+    ingame_units_path: Path = INGAME_UNITS_JSON,
+    asset_map_path: Path = ASSET_MAP_JSON,
+    catalog: Path = APP_ASSETS,
+    include_unlisted: bool = False,
+) -> AssetReport:
+    """Join the sources into one index and check it against ``catalog``.
+
+    json_maps also carries NPC, event and unused rows; those only count as
+    missing with ``include_unlisted``.
+    """
+    entries = load_entries(json_maps_dir)
+    problems: List[str] = []
+
+    mapping = read_json(mapping_path) if mapping_path.exists() else {}
+    for raw_id, display in mapping.items():
+        entity_id = int(raw_id)
+        entry = entries.get(entity_id)
+        if entry is None:
+            entry = entries[entity_id] = AssetEntry(id=entity_id, display_name=display)
+            if entity_id // 1_000_000 in PREFIX_DATASETS:
+                problems.append(f'{entity_id} "{display}" is in mapping.json but in no json_maps file')
+        elif entry.display_name is None:
+            entry.display_name = display
+        elif entry.display_name != display:
+            entry.aliases.append(display)
+            if sanitize(entry.display_name.removeprefix(BUILDER_BASE_PREFIX)) != sanitize(display):
+                problems.append(
+                    f'{entity_id} is "{entry.display_name}" in json_maps but "{display}" in mapping.json'
+                )
+        entry.listed = True
+
+    ingame_units = read_json(ingame_units_path) if ingame_units_path.exists() else {}
+    for category, units in ingame_units.items():
+        for raw_id, name in units.items():
+            # helper categories hold a single {displayName, internalName} record
+            if not raw_id.isdigit() or not isinstance(name, str):
+                continue
+            entry = entries.get(int(raw_id))
+            if entry is None:
+                problems.append(f'{raw_id} "{name}" ({category}) in ingameunits.json has no known id')
+            else:
+                entry.aliases.append(name)
+                entry.listed = True
+
+    overrides = read_json(asset_map_path) if asset_map_path.exists() else {}
+    overrides_by_key = {sanitize(name): slug for name, slug in overrides.items()}
+
+    assets = scan_asset_catalog(catalog)
+    assets_by_stem: Dict[str, List[str]] = {}
+    for name in assets:
+        assets_by_stem.setdefault(name.rsplit('/', 1)[-1], []).append(name)
+
+    for name, slug in overrides.items():
+        if slug.lower() not in assets_by_stem:
+            problems.append(f'asset_map.json maps "{name}" to "{slug}" but no such imageset exists')
+
+    referenced = set()
+    missing: List[int] = []
+    for entity_id in sorted(entries):
+        entry = entries[entity_id]
+        entry.candidates = asset_candidates(entry, overrides_by_key)
+        for candidate in entry.candidates:
+            if candidate.lower() in assets:
+                entry.asset = candidate
+                break
+        else:
+            # asset_map.json slugs are bare; accept them in any folder
+            for candidate in entry.candidates:
+                found = assets_by_stem.get(candidate.lower())
+                if '/' not in candidate and found:
+                    entry.asset = sorted(found)[0]
+                    break
+        if entry.asset is None:
+            if entry.listed or include_unlisted:
+                missing.append(entity_id)
+        else:
+            referenced.add(entry.asset.lower())
+
+    orphaned = sorted(
+        name for name in assets
+        if name not in referenced and name.split('/', 1)[0] not in UNMAPPED_FOLDERS
+    )
+    return AssetReport(entries, missing, orphaned, problems)
+
+
+def asset_candidates(entry: AssetEntry, overrides_by_key: Dict[str, str]) -> List[str]:
+    display = entry.display_name or ''
+    builder_base = display.startswith(BUILDER_BASE_PREFIX)
+    names = [n for n in (display.removeprefix(BUILDER_BASE_PREFIX), entry.internal_name, *entry.aliases) if n]
+    slugs = list(dict.fromkeys(sanitize(name) for name in names))
+    dataset = entry.dataset or PREFIX_DATASETS.get(entry.id // 1_000_000)
+    if entry.id // 1_000_000 == EQUIPMENT_PREFIX:
+        folders: Sequence[str] = ('equipment',)
+    else:
+        folders = DATASET_FOLDERS.get(dataset or '', ())
+        if builder_base:
+            folders = ('builder_base', *(f for f in folders if f != 'builder_base'))
+
+    candidates: List[str] = []
+    for name in names:
+        override = overrides_by_key.get(sanitize(name))
+        if override:
+            candidates.append(override)
+    for slug in slugs:
+        if 103_000_000 <= entry.id < 104_000_000:
+            candidates.append(f'crafted_defenses/{slug}')
+        candidates.append(f'{folders[0]}/{slug}' if folders else slug)
+    for slug in slugs:
+        candidates.extend(f'{folder}/{slug}' for folder in folders[1:])
+        candidates.append(slug)
+    return list(dict.fromkeys(candidates))
+
+
+def trim_box(image, threshold: int = ALPHA_THRESHOLD) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box of pixels with alpha above ``threshold``."""
+    alpha = image.getchannel('A').point(lambda value: 255 if value > threshold else 0)
+    return alpha.getbbox()
+
+
+def make_thumbnail(job: Tuple[str, str, str, int, Sequence[int]]) -> Tuple[str, Optional[str]]:
+    """Worker: trim one source image and write its @Nx renditions and Contents.json.
+    Other PNGs in the imageset are left from an earlier run and removed."""
+    from PIL import Image
+
+    asset, source, imageset, points, scales = job
+    try:
+        with Image.open(source) as opened:
+            image = opened.convert('RGBA')
+        box = trim_box(image)
+        if box:
+            image = image.crop(box)
+        os.makedirs(imageset, exist_ok=True)
+        stem = Path(imageset).stem
+        images = []
+        for scale in scales:
+            size = points * scale
+            rendition = image.copy()
+            rendition.thumbnail((size, size), Image.LANCZOS)
+            filename = f'{stem}@{scale}x.png'
+            rendition.save(os.path.join(imageset, filename), optimize=True)
+            images.append({'filename': filename, 'idiom': 'universal', 'scale': f'{scale}x'})
+        written = {image['filename'] for image in images}
+        for stale in Path(imageset).glob('*.png'):
+            if stale.name not in written:
+                stale.unlink()
+        contents = {'images': images, 'info': {'author': 'xcode', 'version': 1}}
+        with open(os.path.join(imageset, 'Contents.json'), 'w', encoding='utf-8') as f:
+            json.dump(contents, f, indent=2)
+            f.write('\n')
+    except (OSError, ValueError) as exc:
+        return asset, str(exc)
+    return asset, None
+
+
+def _ensure_namespace(catalog: Path, asset: str) -> None:
+    """Create the namespace folders of ``asset`` in ``catalog`` if needed."""
+    folder = catalog
+    for part in asset.split('/')[:-1]:
+        folder = folder / part
+        contents = folder / 'Contents.json'
+        if not contents.exists():
+            folder.mkdir(parents=True, exist_ok=True)
+            contents.write_text(json.dumps({
+                'info': {'author': 'xcode', 'version': 1},
+                'properties': {'provides-namespace': True},
+            }, indent=2) + '\n', encoding='utf-8')
+
+
+def generate_thumbnails(
+    report: AssetReport,
+    output_catalog: Path = WIDGET_ASSETS,
+    source_catalog: Path = APP_ASSETS,
+    points: int = DEFAULT_THUMBNAIL_POINTS,
+    scales: Sequence[int] = THUMBNAIL_SCALES,
+    jobs: Optional[int] = None,
+) -> List[Tuple[str, Optional[str]]]:
+    """Trimmed thumbnails for every resolved asset under THUMBNAIL_NAMESPACE of
+    ``output_catalog``; returns (asset, error) pairs."""
+    try:
+        import PIL  # noqa: F401
+    except ImportError as exc:
+        raise ValueError("thumbnails need Pillow; install it with 'pip install Pillow'") from exc
+
+    sources = scan_asset_catalog(source_catalog)
+    work = []
+    for asset in sorted({entry.asset for entry in report.entries.values() if entry.asset}):
+        source = imageset_source(sources[asset.lower()])
+        if source is None:
+            continue
+        thumbnail = f'{THUMBNAIL_NAMESPACE}/{asset}'
+        _ensure_namespace(output_catalog, thumbnail)
+        imageset = output_catalog / f'{thumbnail}.imageset'
+        work.append((asset, str(source), str(imageset), points, tuple(scales)))
+    if not work:
+        return []
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+        return list(pool.map(make_thumbnail, work, chunksize=max(1, len(work) // 64)))
+
+
+def print_report(report: AssetReport, out=sys.stdout) -> None:
+    resolved = sum(1 for entry in report.entries.values() if entry.asset)
+    out.write(f'{len(report.entries)} ids, {resolved} resolved to an imageset\n')
+    if report.missing:
+        out.write(f'\nMissing assets ({len(report.missing)}):\n')
+        for entity_id in report.missing:
+            entry = report.entries[entity_id]
+            name = entry.display_name or entry.internal_name
+            out.write(f'  {entity_id:<10} {name} (tried {", ".join(entry.candidates[:3])})\n')
+    if report.orphaned:
+        out.write(f'\nOrphaned imagesets ({len(report.orphaned)}):\n')
+        for name in report.orphaned:
+            out.write(f'  {name}\n')
+    if report.problems:
+        out.write(f'\nSource mismatches ({len(report.problems)}):\n')
+        for line in report.problems:
+            out.write(f'  {line}\n')
+
+
+def write_json(path: Path, data) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def main(argv: Optional[Iterable[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Resolve entity ids to assets and build widget thumbnails.')
+    parser.add_argument('--catalog', type=Path, default=APP_ASSETS, help='asset catalog to resolve against')
+    parser.add_argument('--index', type=Path, help='write the id -> asset index as JSON here')
+    parser.add_argument('--json', type=Path, help='write the report as JSON here')
+    parser.add_argument('--thumbnails', action='store_true', help='generate trimmed widget thumbnails')
+    parser.add_argument('--thumbnail-catalog', type=Path, default=WIDGET_ASSETS)
+    parser.add_argument('--points', type=int, default=DEFAULT_THUMBNAIL_POINTS)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--all', action='store_true', help='also report ids the app does not list')
+    parser.add_argument('--strict', action='store_true', help='exit 1 when assets are missing')
+    args = parser.parse_args(argv)
+
+    report = build_asset_index(catalog=args.catalog, include_unlisted=args.all)
+    print_report(report)
+    if args.index:
+        write_json(args.index, {str(k): v.to_json() for k, v in sorted(report.entries.items())})
+    if args.json:
+        write_json(args.json, report.to_json())
+
+    if args.thumbnails:
+        try:
+            results = generate_thumbnails(
+                report, args.thumbnail_catalog, args.catalog, args.points, jobs=args.jobs
+            )
+        except ValueError as exc:
+            print(f'Error: {exc}')
+            sys.exit(1)
+        failures = [(asset, error) for asset, error in results if error]
+        print(f'\nWrote {len(results) - len(failures)} thumbnails to {args.thumbnail_catalog}')
+        for asset, error in failures:
+            print(f'  failed {asset}: {error}')
+        if failures:
+            sys.exit(1)
+
+    if args.strict and report.missing:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Fetches a whole clan from the Clash of Clans API with asyncio.
+
+One clan pull is the clan itself, a profile per member, the current war, the
+war log, the Clan War League group and its wars. Requests share a pool of
+keep-alive connections, run at most --concurrency at a time and pass a token
+bucket (--rate requests per second, --burst at once); 429 answers are retried
+after Retry-After.
+
+Responses are cached on disk with a TTL per endpoint, under keys built like
+cacheKeyForCurrentClan in DataService.swift ("<prefix>_<normalized tag>").
+Only cache misses hit the network, and every attempt, 429 retries included,
+is charged to a daily budget that mirrors
+canPerformApiRequest/recordApiRequest (UTC day, same limit).
+When the budget is spent, stale cache entries are served instead.
+
+Standard library only. --stub starts tools/clash_api_stub.py in-process so
+the fetcher can be exercised without an API key.
+
+Run:
+  CLASH_API_KEY=... python3 tools/clash_api_fetcher.py '#2JGPJ9UC8' --output clan.json
+  python3 tools/clash_api_fetcher.py '#2JGPJ9UC8' --stub --stub-latency 50
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import ssl
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_BASE_URL = 'https://cocproxy.royaleapi.dev/v1'
+DEFAULT_CACHE_DIR = ROOT / 'tools' / 'api_cache'
+# DataService.apiDailyLimit
+DAILY_LIMIT = 1000
+
+# cache key prefix -> TTL in seconds. The first two are the keys
+# DataService.swift uses; TTLs follow its refresh cooldowns.
+CACHE_TTLS = {
+    'current_clan_stats_json': 3600,
+    'current_war_json': 300,
+    'war_log_json': 3600,
+    'league_group_json': 3600,
+    'league_war_json': 300,
+    'player_json': 7200,
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status: int, reason: str, path: str) -> None:
+        super().__init__(f'{path}: HTTP {status} {reason}')
+        self.status = status
+        self.reason = reason
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+def normalize_tag(tag: str) -> str:
+    """DataService.normalizeTag: trim, drop '#', uppercase."""
+    return tag.strip().replace('#', '').upper()
+
+
+def cache_key(prefix: str, tag: str) -> str:
+    """DataService.cacheKeyForCurrentClan(prefix:) for an explicit tag."""
+    return f'{prefix}_{normalize_tag(tag) or "UNKNOWN"}'
+
+
+def retry_after_seconds(value: Optional[str], default: float = 1.0) -> float:
+    """Seconds to wait for a Retry-After header, given as seconds or an HTTP date."""
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return default
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - datetime.now(timezone.utc)).total_seconds()
+    if seconds != seconds:  # NaN
+        return default
+    return max(0.0, seconds)
+
+
+class DiskCache:
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f'{key}.json'
+
+    def get(self, key: str, ttl: Optional[float]) -> Optional[bytes]:
+        """Cached body, or None when missing or older than ``ttl`` (None = any age)."""
+        path = self._path(key)
+        try:
+            if ttl is not None and time.time() - path.stat().st_mtime > ttl:
+                return None
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, body: bytes) -> None:
+        path = self._path(key)
+        temp = path.with_suffix('.tmp')
+        temp.write_bytes(body)
+        os.replace(temp, path)
+
+
+class DailyBudget:
+    """Requests left today (UTC), persisted next to the cache."""
+
+    def __init__(self, path: Path, limit: int = DAILY_LIMIT) -> None:
+        self.path = Path(path)
+        self.limit = limit
+        self.day = self._today()
+        self.count = 0
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('date') == self.day:
+                self.count = int(data.get('count', 0))
+
+    @staticmethod
+    def _today() -> str:
+        return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+    @property
+    def remaining(self) -> int:
+        return max(self.limit - self.count, 0)
+
+    def reserve(self) -> None:
+        today = self._today()
+        if today != self.day:
+            self.day, self.count = today, 0
+        if self.count >= self.limit:
+            raise QuotaExceeded(f'Daily API limit reached ({self.limit})')
+        self.count += 1
+
+    def save(self) -> None:
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'date': self.day, 'count': self.count}, f)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        # Waiters queue on the lock, so tokens are handed out in arrival order.
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+
+    def close(self) -> None:
+        self.writer.close()
+
+
+class ConnectionPool:
+    """HTTP/1.1 keep-alive connections to one host, at most ``size`` in use."""
+
+    def __init__(self, base_url: str, size: int, timeout: float = 20.0) -> None:
+        parts = urlsplit(base_url)
+        self.secure = parts.scheme == 'https'
+        self.host = parts.hostname or 'localhost'
+        self.port = parts.port or (443 if self.secure else 80)
+        self.base_path = parts.path.rstrip('/')
+        self.timeout = timeout
+        self.opened = 0
+        self._idle: List[_Connection] = []
+        self._slots = asyncio.Semaphore(size)
+        self._ssl = ssl.create_default_context() if self.secure else None
+
+    async def _open(self) -> _Connection:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self._ssl), self.timeout
+        )
+        self.opened += 1
+        return _Connection(reader, writer)
+
+    async def get(self, path: str, headers: Dict[str, str]) -> Tuple[int, Dict[str, str], bytes]:
+        async with self._slots:
+            connection = self._idle.pop() if self._idle else None
+            while True:
+                reused = connection is not None
+                if connection is None:
+                    connection = await self._open()
+                try:
+                    status, response_headers, body, keep_alive = await asyncio.wait_for(
+                        self._exchange(connection, path, headers), self.timeout
+                    )
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    connection.close()
+                    connection = None
+                    if reused:
+                        # The server dropped an idle keep-alive connection; GET is safe to resend.
+                        continue
+                    raise
+                except BaseException:
+                    connection.close()
+                    raise
+                if keep_alive:
+                    self._idle.append(connection)
+                else:
+                    connection.close()
+                return status, response_headers, body
+
+    async def _exchange(
+        self, connection: _Connection, path: str, headers: Dict[str, str]
+    ) -> Tuple[int, Dict[str, str], bytes, bool]:
+        lines = [f'GET {self.base_path}{path} HTTP/1.1', f'Host: {self.host}']
+        lines += [f'{name}: {value}' for name, value in headers.items()]
+        connection.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await connection.writer.drain()
+
+        reader = connection.reader
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('connection closed before the response')
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        response_headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    await reader.readline()
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+            framed = True
+        elif 'content-length' in response_headers:
+            body = await reader.readexactly(int(response_headers['content-length']))
+            framed = True
+        else:
+            body = await reader.read()
+            framed = False
+        if response_headers.get('content-encoding') == 'gzip':
+            body = gzip.decompress(body)
+
+        connection_header = response_headers.get('connection', '').lower()
+        keep_alive = framed and connection_header != 'close' and (
+            version != 'HTTP/1.0' or connection_header == 'keep-alive'
+        )
+        return int(status), response_headers, body, keep_alive
+
+    def close(self) -> None:
+        for connection in self._idle:
+            connection.close()
+        self._idle.clear()
+
+
+@dataclass
+class FetchStats:
+    requests: int = 0
+    cache_hits: int = 0
+    stale_hits: int = 0
+    retries: int = 0
+    seconds: float = 0.0
+    connections: int = 0
+    by_prefix: Dict[str, int] = field(default_factory=dict)
+
+
+class ClashApiClient:
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = DEFAULT_BASE_URL,
+        cache_dir: Path = DEFAULT_CACHE_DIR,
+        concurrency: int = 8,
+        rate: float = 10.0,
+        burst: Optional[float] = None,
+        daily_limit: int = DAILY_LIMIT,
+        max_retries: int = 3,
+    ) -> None:
+        self.api_key = api_key
+        self.pool = ConnectionPool(base_url, concurrency)
+        self.limiter = TokenBucket(rate, burst)
+        self.cache = DiskCache(cache_dir)
+        self.budget = DailyBudget(Path(cache_dir) / 'api_budget.json', daily_limit)
+        self.max_retries = max_retries
+        self.stats = FetchStats()
+
+    async def __aenter__(self) -> 'ClashApiClient':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.stats.connections = self.pool.opened
+        self.pool.close()
+        self.budget.save()
+
+    async def get_json(self, path: str, prefix: str, tag: str) -> Any:
+        """GET ``path``, served from the cache while the entry is fresh."""
+        key = cache_key(prefix, tag)
+        cached = self.cache.get(key, CACHE_TTLS.get(prefix))
+        if cached is not None:
+            self.stats.cache_hits += 1
+            return json.loads(cached)
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip',
+            'Connection': 'keep-alive',
+        }
+        for attempt in range(self.max_retries + 1):
+            # every attempt is a real request, 429 retries included
+            try:
+                self.budget.reserve()
+            except QuotaExceeded:
+                stale = self.cache.get(key, None)
+                if stale is None:
+                    raise
+                self.stats.stale_hits += 1
+                return json.loads(stale)
+            await self.limiter.acquire()
+            self.stats.requests += 1
+            self.stats.by_prefix[prefix] = self.stats.by_prefix.get(prefix, 0) + 1
+            status, response_headers, body = await self.pool.get(path, headers)
+            if status == 429 and attempt < self.max_retries:
+                self.stats.retries += 1
+                await asyncio.sleep(retry_after_seconds(response_headers.get('retry-after')))
+                continue
+            break
+        if status != 200:
+            try:
+                reason = json.loads(body).get('reason', '')
+            except ValueError:
+                reason = ''
+            raise ApiError(status, reason, path)
+        self.cache.put(key, body)
+        return json.loads(body)
+
+    async def clan(self, tag: str) -> Any:
+        return await self.get_json(f'/clans/%23{normalize_tag(tag)}', 'current_clan_stats_json', tag)
+
+    async def current_war(self, tag: str) -> Any:
+        return await self.get_json(f'/clans/%23{normalize_tag(tag)}/currentwar', 'current_war_json', tag)
+
+    async def war_log(self, tag: str) -> Any:
+        return await self.get_json(f'/clans/%23{normalize_tag(tag)}/warlog', 'war_log_json', tag)
+
+    async def league_group(self, tag: str) -> Any:
+        path = f'/clans/%23{normalize_tag(tag)}/currentwar/leaguegroup'
+        return await self.get_json(path, 'league_group_json', tag)
+
+    async def league_war(self, war_tag: str) -> Any:
+        path = f'/clanwarleagues/wars/%23{normalize_tag(war_tag)}'
+        return await self.get_json(path, 'league_war_json', war_tag)
+
+    async def player(self, tag: str) -> Any:
+        return await self.get_json(f'/players/%23{normalize_tag(tag)}', 'player_json', tag)
+
+
+async def _optional(request: Any) -> Any:
+    """None for endpoints a clan may not expose (private war log, not in CWL)."""
+    try:
+        return await request
+    except ApiError as exc:
+        if exc.status in (403, 404):
+            return None
+        raise
+
+
+async def fetch_clan(client: ClashApiClient, clan_tag: str, league_wars: bool = True) -> Dict[str, Any]:
+    clan = await client.clan(clan_tag)
+    member_tags = [member['tag'] for member in clan.get('memberList', [])]
+
+    players, current_war, war_log, league_group = await asyncio.gather(
+        asyncio.gather(*(client.player(tag) for tag in member_tags)),
+        _optional(client.current_war(clan_tag)),
+        _optional(client.war_log(clan_tag)),
+        _optional(client.league_group(clan_tag)),
+    )
+
+    wars: Dict[str, Any] = {}
+    if league_wars and league_group:
+        war_tags = [
+            war_tag
+            for round_ in league_group.get('rounds', [])
+            for war_tag in round_.get('warTags', [])
+            if normalize_tag(war_tag) not in ('', '0')
+        ]
+        results = await asyncio.gather(*(_optional(client.league_war(tag)) for tag in war_tags))
+        wars = {tag: war for tag, war in zip(war_tags, results) if war is not None}
+
+    return {
+        'clan': clan,
+        'members': dict(zip(member_tags, players)),
+        'currentWar': current_war,
+        'warLog': war_log,
+        'leagueGroup': league_group,
+        'leagueWars': wars,
+    }
+
+
+async def _run(args: argparse.Namespace) -> Tuple[Dict[str, Any], FetchStats, int]:
+    async with ClashApiClient(
+        args.api_key,
+        base_url=args.base_url,
+        cache_dir=args.cache_dir,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        burst=args.burst,
+        daily_limit=args.daily_limit,
+    ) as client:
+        started = time.perf_counter()
+        result = await fetch_clan(client, args.clan_tag, league_wars=not args.no_league_wars)
+        client.stats.seconds = time.perf_counter() - started
+    return result, client.stats, client.budget.remaining
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Fetch a whole clan from the Clash API.')
+    parser.add_argument('clan_tag')
+    parser.add_argument('--api-key', default=os.environ.get('CLASH_API_KEY', ''))
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    parser.add_argument('--cache-dir', type=Path, default=DEFAULT_CACHE_DIR)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rate', type=float, default=10.0, help='requests per second')
+    parser.add_argument('--burst', type=float, default=None, help='token bucket size (default: rate)')
+    parser.add_argument('--daily-limit', type=int, default=DAILY_LIMIT)
+    parser.add_argument('--no-league-wars', action='store_true', help='skip Clan War League war details')
+    parser.add_argument('--output', type=Path, help='write the combined result as JSON here')
+    parser.add_argument('--stub', action='store_true', help='serve misc_files samples locally instead')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='stub latency per request, in ms')
+    args = parser.parse_args()
+
+    server = None
+    if args.stub:
+        from clash_api_stub import start_stub_server
+
+        server = start_stub_server(latency=args.stub_latency / 1000)
+        args.base_url = server.base_url
+        args.api_key = args.api_key or 'stub'
+    if not args.api_key:
+        print('Error: pass --api-key or set CLASH_API_KEY')
+        sys.exit(1)
+
+    try:
+        result, stats, remaining = asyncio.run(_run(args))
+    except (ApiError, QuotaExceeded, OSError) as exc:
+        print(f'Error: {exc}')
+        sys.exit(1)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    print(
+        f'{len(result["members"])} members, {len(result["leagueWars"])} league wars in {stats.seconds:.2f}s: '
+        f'{stats.requests} requests over {stats.connections} connections, '
+        f'{stats.cache_hits} cache hits, {stats.stale_hits} stale, {stats.retries} retries; '
+        f'{remaining} requests left today'
+    )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+
+
+if __name__ == '__main__':
+    main()
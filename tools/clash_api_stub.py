@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Clash of Clans API that replays the samples in the repo.
+
+Routes (under /v1, tags URL-encoded as %23TAG like the app sends them):
+  /clans/{tag}                        misc_files/clan_stats.json
+  /clans/{tag}/currentwar             misc_files/war_details_in_war.json
+  /clans/{tag}/warlog                 misc_files/war_log.json
+  /clans/{tag}/currentwar/leaguegroup misc_files/war_league_sample.json
+  /clanwarleagues/wars/{warTag}       misc_files/war_details.json
+  /players/{tag}                      json_files/player_data.json, with the
+                                      tag, name and levels of the clan member
+
+Every response echoes the requested tag, so one sample serves any clan. The
+server speaks HTTP/1.1 keep-alive, can add latency and answers 429 like the
+real API once more than --rate-limit requests arrive within a second.
+
+Run:
+  python3 tools/clash_api_stub.py --port 8765 --latency 50
+"""
+import argparse
+import copy
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import unquote, urlsplit
+
+ROOT = Path(__file__).resolve().parents[1]
+MISC_FILES = ROOT / 'misc_files'
+JSON_FILES = ROOT / 'json_files'
+
+SAMPLES = {
+    'clan': MISC_FILES / 'clan_stats.json',
+    'currentwar': MISC_FILES / 'war_details_in_war.json',
+    'warlog': MISC_FILES / 'war_log.json',
+    'leaguegroup': MISC_FILES / 'war_league_sample.json',
+    'leaguewar': MISC_FILES / 'war_details.json',
+    'player': JSON_FILES / 'player_data.json',
+}
+# member fields copied onto the player sample
+PLAYER_FIELDS = ('tag', 'name', 'role', 'townHallLevel', 'expLevel', 'trophies',
+                 'builderBaseTrophies', 'donations', 'donationsReceived')
+
+
+def load_samples() -> Dict[str, Any]:
+    samples = {}
+    for name, path in SAMPLES.items():
+        with open(path, 'r', encoding='utf-8') as f:
+            samples[name] = json.load(f)
+    return samples
+
+
+def _tag(segment: str) -> str:
+    return '#' + unquote(segment).lstrip('#').upper()
+
+
+class StubState:
+    def __init__(self, latency: float = 0.0, rate_limit: int = 0) -> None:
+        self.samples = load_samples()
+        self.members = {m['tag']: m for m in self.samples['clan'].get('memberList', [])}
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = 0
+        self.throttled = 0
+        self.paths: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._window = (0, 0)  # (second, count)
+
+    def record(self, path: str) -> bool:
+        """Count a request; False when it exceeds the per-second limit."""
+        with self._lock:
+            self.requests += 1
+            self.paths[path] = self.paths.get(path, 0) + 1
+            if not self.rate_limit:
+                return True
+            second = int(time.monotonic())
+            window_second, count = self._window
+            count = count + 1 if window_second == second else 1
+            self._window = (second, count)
+            if count > self.rate_limit:
+                self.throttled += 1
+                return False
+            return True
+
+    def route(self, path: str) -> Tuple[int, Any]:
+        parts = [p for p in path.split('/') if p]
+        if parts[:1] != ['v1'] or len(parts) < 3:
+            return 404, {'reason': 'notFound'}
+        kind, tag, rest = parts[1], _tag(parts[2]), parts[3:]
+        samples = self.samples
+
+        if kind == 'players' and not rest:
+            player = copy.deepcopy(samples['player'])
+            member = self.members.get(tag, {'tag': tag})
+            for field in PLAYER_FIELDS:
+                if field in member:
+                    player[field] = member[field]
+            return 200, player
+        if kind == 'clanwarleagues' and parts[2] == 'wars' and len(parts) == 4:
+            war = copy.deepcopy(samples['leaguewar'])
+            war['warTag'] = _tag(parts[3])
+            return 200, war
+        if kind != 'clans':
+            return 404, {'reason': 'notFound'}
+        if not rest:
+            clan = copy.deepcopy(samples['clan'])
+            clan['tag'] = tag
+            return 200, clan
+        if rest == ['currentwar']:
+            war = copy.deepcopy(samples['currentwar'])
+            war['clan']['tag'] = tag
+            return 200, war
+        if rest == ['warlog']:
+            return 200, samples['warlog']
+        if rest == ['currentwar', 'leaguegroup']:
+            return 200, samples['leaguegroup']
+        return 404, {'reason': 'notFound'}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: 'StubServer'
+
+    def do_GET(self) -> None:
+        state = self.server.state
+        path = urlsplit(self.path).path
+        if state.latency:
+            time.sleep(state.latency)
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self._send(403, {'reason': 'accessDenied', 'message': 'Invalid authorization'})
+        elif not state.record(path):
+            self._send(429, {'reason': 'requestThrottled'}, {'Retry-After': '1'})
+        else:
+            self._send(*state.route(path))
+
+    def _send(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], state: StubState, verbose: bool = False) -> None:
+        super().__init__(address, StubHandler)
+        self.state = state
+        self.verbose = verbose
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}/v1'
+
+
+def start_stub_server(
+    port: int = 0, latency: float = 0.0, rate_limit: int = 0, verbose: bool = False
+) -> StubServer:
+    """Serve on a background thread; port 0 picks a free port."""
+    server = StubServer(('127.0.0.1', port), StubState(latency, rate_limit), verbose)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Replay the misc_files samples as a local Clash API.')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='added latency per request, in ms')
+    parser.add_argument('--rate-limit', type=int, default=0, help='requests per second before 429 (0 = off)')
+    args = parser.parse_args()
+
+    server = StubServer(('127.0.0.1', args.port), StubState(args.latency / 1000, args.rate_limit), verbose=True)
+    print(f'Serving samples at {server.base_url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()